@@ -0,0 +1,169 @@
+import calendar
+import datetime
+import math
+import os
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+load_dotenv()
+
+# Per-user, per-category running statistics over expense amounts, updated atomically on every
+# write (Welford mean/variance plus an EWMA and its variance) together with the month-to-date
+# total. Alerts are decided from the document as it was *before* the write, so nothing rescans
+# history.
+
+ANOMALY_MIN_SAMPLES = int(os.environ.get('ANOMALY_MIN_SAMPLES', 5))
+ANOMALY_Z_THRESHOLD = float(os.environ.get('ANOMALY_Z_THRESHOLD', 3.0))
+EWMA_ALPHA = 0.2
+WEEKS_PER_MONTH = 52 / 12
+
+# ---------------------- Running Statistics ---------------------- #
+
+def stats_pipeline(user_id, category_id, amount, month):
+    """Update pipeline applying one expense to the stats document in O(1)."""
+    mean = {"$ifNull": ["$mean", 0]}
+    ewma = {"$ifNull": ["$ewma", amount]}
+    return [
+        {"$set": {
+            "user_id": user_id,
+            "category_id": category_id,
+            "n": {"$add": [{"$ifNull": ["$n", 0]}, 1]},
+            "_delta": {"$subtract": [amount, mean]},
+            "_ewma_delta": {"$subtract": [amount, ewma]},
+        }},
+        {"$set": {
+            "mean": {"$add": [mean, {"$divide": ["$_delta", "$n"]}]},
+            "ewma": {"$add": [ewma, {"$multiply": [EWMA_ALPHA, "$_ewma_delta"]}]},
+            "ewm_var": {"$multiply": [1 - EWMA_ALPHA, {"$add": [
+                {"$ifNull": ["$ewm_var", 0]},
+                {"$multiply": [EWMA_ALPHA, "$_ewma_delta", "$_ewma_delta"]}
+            ]}]},
+        }},
+        {"$set": {
+            "m2": {"$add": [{"$ifNull": ["$m2", 0]}, {"$multiply": ["$_delta", {"$subtract": [amount, "$mean"]}]}]},
+            # Month-to-date total; a back-dated expense from an earlier month leaves it alone
+            "month_total": {"$switch": {"branches": [
+                {"case": {"$eq": ["$month", month]}, "then": {"$add": ["$month_total", amount]}},
+                {"case": {"$or": [{"$not": ["$month"]}, {"$gt": [month, "$month"]}]}, "then": amount},
+            ], "default": "$month_total"}},
+            "month": {"$cond": [{"$or": [{"$not": ["$month"]}, {"$gt": [month, "$month"]}]}, month, "$month"]},
+            "updated_at": "$$NOW",
+        }},
+        {"$unset": ["_delta", "_ewma_delta"]}
+    ]
+
+def update_stats(db, user_id, category_id, amount, month):
+    """Apply one expense; returns the stats document as it was before this expense (or None)."""
+    return db.spend_stats.find_one_and_update(
+        {"_id": f"{user_id}:{category_id}"},
+        stats_pipeline(user_id, category_id, amount, month),
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+
+# ---------------------- Alert Rules ---------------------- #
+
+def anomaly_score(before, amount):
+    """z-score of the amount against the category's history (None until there is enough of it)."""
+    if not before or before.get("n", 0) < ANOMALY_MIN_SAMPLES:
+        return None
+    variance = before["m2"] / (before["n"] - 1)
+    # Recent behaviour (EWMA) counts too, so a category that has grown is not flagged forever
+    spread = max(math.sqrt(variance), math.sqrt(before.get("ewm_var", 0)), 0.05 * abs(before["mean"]), 1.0)
+    return (amount - max(before["mean"], before.get("ewma", before["mean"]))) / spread
+
+def burn_rate_alert(before, amount, month, allocated, today):
+    """"exceeded" or "pace" the first time this month's spend crosses the budget or its pro-rated pace."""
+    if not allocated or allocated <= 0:
+        return None
+    previous = before.get("month_total", 0) if before and before.get("month") == month else 0
+    if before and before.get("month", "") > month:
+        return None
+    current = previous + amount
+    if previous <= allocated < current:
+        return "exceeded"
+    if month != today.strftime("%Y-%m") or current > allocated:
+        return None
+    days = calendar.monthrange(today.year, today.month)[1]
+    projected_before = previous / today.day * days
+    projected = current / today.day * days
+    if projected_before <= allocated < projected:
+        return "pace"
+    return None
+
+def monthly_allocations(expenses):
+    allocations = {}
+    for item in expenses or []:
+        cid = item.get("category_id")
+        if cid:
+            factor = WEEKS_PER_MONTH if item.get("frequency") == "Weekly" else 1.0
+            allocations[cid] = allocations.get(cid, 0.0) + float(item.get("allocated_amount") or 0) * factor
+    return allocations
+
+def build_alerts(user_id, transaction, before, allocated, today):
+    amount = float(transaction["amount"])
+    category_id = transaction["category_id"]
+    month = str(transaction["transaction_date"])[:7]
+    category = transaction.get("category") or category_id
+    now = datetime.datetime.now(datetime.timezone.utc)
+    alerts = []
+
+    score = anomaly_score(before, amount)
+    if score is not None and score >= ANOMALY_Z_THRESHOLD:
+        alerts.append({
+            "kind": "anomaly",
+            "message": f"{transaction.get('description') or category} ({amount:,.2f}) is unusually large for {category}; "
+                       f"you usually spend about {before['mean']:,.2f}.",
+            "score": round(score, 2),
+        })
+
+    burn = burn_rate_alert(before, amount, month, allocated, today)
+    if burn == "exceeded":
+        alerts.append({"kind": "over_budget", "message": f"You have gone over your {category} budget of {allocated:,.2f} for {month}."})
+    elif burn == "pace":
+        alerts.append({"kind": "burn_rate", "message": f"At this pace you will overspend your {category} budget of {allocated:,.2f} this month."})
+
+    for alert in alerts:
+        alert.update({
+            "user_id": user_id,
+            "category_id": category_id,
+            "category": category,
+            "amount": amount,
+            "transaction_date": str(transaction["transaction_date"])[:10],
+            "created_at": now,
+            "dismissed": False
+        })
+    return alerts
+
+# ---------------------- Public API ---------------------- #
+
+def record_expenses(db, user_id, transactions, expenses=None, today=None):
+    """Update running stats for newly written expense transactions and store any alerts raised.
+
+    `expenses` are the user's budget lines (read once here when not given).
+    """
+    today = today or datetime.date.today()
+    debits = [t for t in transactions if t.get("amount_type") == "debit" and t.get("category_id") and isinstance(t.get("transaction_date"), str)]
+    if not debits:
+        return []
+    if expenses is None:
+        budget = db.budgets.find_one({"user_id": user_id}, {"budget_data.expenses": 1}) or {}
+        expenses = budget.get("budget_data", {}).get("expenses", [])
+    allocations = monthly_allocations(expenses)
+
+    alerts = []
+    for transaction in debits:
+        month = transaction["transaction_date"][:7]
+        before = update_stats(db, user_id, transaction["category_id"], float(transaction["amount"]), month)
+        alerts.extend(build_alerts(user_id, transaction, before, allocations.get(transaction["category_id"]), today))
+    if alerts:
+        db.spend_alerts.insert_many(alerts)
+    return alerts
+
+def recent_alerts(db, user_id, limit=5, days=30):
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    cursor = db.spend_alerts.find(
+        {"user_id": user_id, "dismissed": False, "created_at": {"$gte": since}},
+        {"_id": 0, "kind": 1, "message": 1, "category_id": 1, "amount": 1, "transaction_date": 1}
+    ).sort("created_at", -1).limit(limit)
+    return list(cursor)
@@ -0,0 +1,467 @@
+import datetime
+import gzip
+import hmac
+import os
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+from flask import Blueprint, jsonify, request
+from pymongo import DESCENDING, MongoClient, UpdateOne
+from werkzeug.exceptions import HTTPException
+from anomaly import record_expenses
+import archive
+from categories import PREDEFINED_CATEGORIES, catalog_entry, category_id, load_catalog, resolve_category_ids
+from currency import convert, convert_rows, currency_code, user_currency
+from versioning import bump_data_version, get_data_version
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', 1024))
+GZIP_LEVEL = 6
+# Shared with the Streamlit app (its secrets.toml); requests without it are refused
+API_SECRET = os.environ.get('API_SECRET', '')
+
+# The frontend's reads and writes of a user's data all go through here. Reads carry a weak ETag
+# derived from the user's data version, so an unchanged view costs a 304; every write bumps the
+# version and returns it.
+api = Blueprint("api", __name__, url_prefix="/api/users/<user_id>")
+
+# One pooled client for the whole blueprint (these endpoints serve every page load)
+client = MongoClient(MONGO_URI)
+db = client['finance_ai']
+
+TRANSACTION_FIELDS = ["transaction_date", "amount", "currency", "amount_type", "category", "category_id", "transaction_mode", "description", "type"]
+HOLDING_FIELDS = ["cash_holdings", "online_holdings", "stock_investments", "savings"]
+SUBSCRIPTION_FIELDS = ["cost", "usage", "priority"]
+
+# ---------------------- Auth ---------------------- #
+
+@api.before_request
+def require_service_secret():
+    """The user_id in the URL is not a credential; only the app, holding API_SECRET, may call these."""
+    supplied = request.headers.get("Authorization", "").encode("utf-8")
+    if not API_SECRET or not hmac.compare_digest(supplied, f"Bearer {API_SECRET}".encode("utf-8")):
+        return jsonify({"error": "Unauthorized"}), 401
+
+# ---------------------- Helpers ---------------------- #
+
+def serialize(value):
+    """Make Mongo documents JSON-safe: ObjectIds as strings, datetimes as ISO 8601."""
+    if isinstance(value, dict):
+        return {key: serialize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [serialize(item) for item in value]
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+def conditional(user_id, load, tag=None):
+    """Answer a read with 304 when the client's ETag matches the user's current data version.
+
+    The version is read before the data, so a write landing in between only makes the ETag older.
+    `tag` adds a component for data that changes without a version bump (the nightly forecast).
+    """
+    version = get_data_version(db, user_id)
+    if tag is None:
+        etag = f"v{version}"
+        if request.if_none_match.contains_weak(etag):
+            return "", 304, {"ETag": f'W/"{etag}"'}
+        body = load()
+    else:
+        body = load()
+        etag = f"v{version}-{tag(body)}"
+        if request.if_none_match.contains_weak(etag):
+            return "", 304, {"ETag": f'W/"{etag}"'}
+    response = jsonify(serialize(body))
+    response.set_etag(etag, weak=True)
+    return response
+
+def written(user_id, status=200, **extra):
+    return jsonify({"version": bump_data_version(db, user_id), **extra}), status
+
+def json_body():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise ValueError("A JSON object body is required")
+    return payload
+
+@api.errorhandler(ValueError)
+@api.errorhandler(InvalidId)
+def bad_request(e):
+    return jsonify({"error": str(e)}), 400
+
+@api.errorhandler(Exception)
+def server_error(e):
+    if isinstance(e, HTTPException):
+        return e
+    return jsonify({"error": str(e)}), 500
+
+@api.after_request
+def compress(response):
+    """gzip large JSON bodies (transaction lists) for clients that accept it."""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.headers.get("Content-Encoding")
+        or "gzip" not in request.headers.get("Accept-Encoding", "")
+    ):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+# ---------------------- Reads ---------------------- #
+
+@api.route('/version', methods=['GET'])
+def version(user_id):
+    return jsonify({"version": get_data_version(db, user_id)})
+
+@api.route('/profile', methods=['GET'])
+def profile(user_id):
+    return conditional(user_id, lambda: db.user_profiles.find_one({"user_id": user_id}, {"_id": 0}))
+
+@api.route('/budget', methods=['GET'])
+def budget(user_id):
+    def load():
+        doc = db.budgets.find_one({"user_id": user_id}, {"_id": 0})
+        return doc or {"user_id": user_id, "budget_data": {"income": 0, "savings": 0, "expenses": []}}
+    return conditional(user_id, load)
+
+@api.route('/transactions', methods=['GET'])
+def transactions(user_id):
+    def load():
+        # History spans the hot collection and the archive
+        rows = list(archive.find_transactions(db, {"user_id": user_id}, {"_id": 0, "user_id": 0}))
+        for row in rows:
+            # Auto-added subscription charges store a datetime; send every date in one format
+            if isinstance(row.get("transaction_date"), datetime.datetime):
+                row["transaction_date"] = row["transaction_date"].strftime("%Y-%m-%d")
+        # Amounts in the user's currency; each row keeps its own currency and original amount
+        return convert_rows(rows, user_currency(db, user_id))
+    return conditional(user_id, load)
+
+@api.route('/spend-by-category', methods=['GET'])
+def spend_by_category(user_id):
+    """Debit totals per category id, optionally for [start, end)."""
+    start, end = request.args.get('start'), request.args.get('end')
+
+    def load():
+        rows = archive.spend_by_category(db, user_id, start, end, user_currency(db, user_id))
+        return [{"category_id": row["_id"], "amount": row["amount"]} for row in rows]
+    return conditional(user_id, load)
+
+@api.route('/monthly-budgets', methods=['GET'])
+def monthly_budgets(user_id):
+    return conditional(user_id, lambda: list(db.monthly_budgets.find({"user_id": user_id}, {"_id": 0}).sort("month", DESCENDING)))
+
+@api.route('/debts', methods=['GET'])
+def debts(user_id):
+    return conditional(user_id, lambda: list(db.debts.find({"user_id": user_id})))
+
+@api.route('/subscriptions', methods=['GET'])
+def subscriptions(user_id):
+    return conditional(user_id, lambda: list(db.subscriptions.find({"user_id": user_id})))
+
+@api.route('/forecast', methods=['GET'])
+def forecast(user_id):
+    # Rewritten nightly without a version bump, so the ETag also covers when it was generated
+    return conditional(
+        user_id,
+        lambda: db.cash_flow_forecasts.find_one({"user_id": user_id}, {"_id": 0}),
+        tag=lambda doc: int(doc["generated_at"].timestamp()) if doc else 0
+    )
+
+@api.route('/alerts', methods=['GET'])
+def alerts(user_id):
+    limit = int(request.args.get('limit', 5))
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=int(request.args.get('days', 30)))
+
+    def load():
+        cursor = db.spend_alerts.find(
+            {"user_id": user_id, "dismissed": False, "created_at": {"$gte": since}}
+        ).sort("created_at", -1).limit(limit)
+        return list(cursor)
+    return conditional(user_id, load)
+
+# ---------------------- Profile ---------------------- #
+
+@api.route('/profile', methods=['PUT'])
+def save_profile(user_id):
+    """Onboarding: store the starting balances and the categories the user tracks."""
+    payload = json_body()
+    values = {field: float(payload.get(field) or 0) for field in HOLDING_FIELDS}
+    custom_categories = [str(name).strip() for name in payload.get("custom_categories", []) if str(name).strip()]
+    predefined_ids = {category_id(name) for name in PREDEFINED_CATEGORIES}
+    catalog = {category_id(name): catalog_entry(name) for name in custom_categories if category_id(name) not in predefined_ids}
+    db.user_profiles.update_one(
+        {"user_id": user_id},
+        {
+            "$set": dict(
+                values,
+                currency=payload.get("currency", ""),
+                total_savings=values["savings"] + values["stock_investments"],
+                custom_categories=custom_categories,
+                category_catalog=list(catalog.values())
+            ),
+            "$setOnInsert": {"created_at": datetime.datetime.now()}
+        },
+        upsert=True
+    )
+    return written(user_id)
+
+@api.route('/holdings', methods=['PATCH'])
+def adjust_holdings(user_id):
+    """Apply changes (deltas) to the holdings in one atomic update."""
+    payload = json_body()
+    changes = {field: float(payload[field]) for field in HOLDING_FIELDS if payload.get(field)}
+    if changes:
+        db.user_profiles.update_one({"user_id": user_id}, [
+            {"$set": {field: {"$add": [{"$ifNull": [f"${field}", 0]}, delta]} for field, delta in changes.items()}},
+            {"$set": {"total_savings": {"$add": ["$stock_investments", "$savings"]}}}
+        ])
+    return written(user_id)
+
+def apply_to_holdings(user_id, amount, amount_type, transaction_mode, category=None):
+    profile = db.user_profiles.find_one({"user_id": user_id})
+    if not profile:
+        return
+
+    cash = float(profile.get("cash_holdings", 0))
+    online = float(profile.get("online_holdings", 0))
+    stock = float(profile.get("stock_investments", 0))
+    savings = float(profile.get("savings", 0))
+
+    if transaction_mode == "cash" and category != "Savings":
+        if amount_type == "credit":
+            cash += amount
+        else:
+            cash = max(0, cash - amount)
+
+    elif transaction_mode == "online":
+        if amount_type == "credit":
+            online += amount
+        else:
+            online = max(0, online - amount)
+
+    elif transaction_mode == "stock":
+        if amount_type == "debit":
+            stock += amount
+            online = max(0, online - amount)
+        else:
+            online += amount
+            stock = max(0, stock - amount)
+
+    elif category == "Savings" and transaction_mode == "cash":
+        savings += amount
+
+    db.user_profiles.update_one(
+        {"user_id": user_id},
+        {"$set": {
+            "cash_holdings": cash,
+            "online_holdings": online,
+            "stock_investments": stock,
+            "savings": savings,
+            "total_savings": stock + savings
+        }}
+    )
+
+# ---------------------- Categories ---------------------- #
+
+@api.route('/categories', methods=['POST'])
+def add_category(user_id):
+    name = str(json_body().get("name") or "").strip()
+    if not name:
+        raise ValueError("Category name is required")
+    profile = db.user_profiles.find_one({"user_id": user_id}, {"custom_categories": 1}) or {}
+    if category_id(name) in {category_id(existing) for existing in profile.get("custom_categories", [])}:
+        return jsonify({"error": "Category already exists"}), 409
+    update = {"$addToSet": {"custom_categories": name}}
+    if category_id(name) not in load_catalog(db, user_id):
+        update["$push"] = {"category_catalog": catalog_entry(name)}
+    db.user_profiles.update_one({"user_id": user_id}, update, upsert=True)
+    return written(user_id, 201)
+
+# ---------------------- Transactions ---------------------- #
+
+@api.route('/transactions', methods=['POST'])
+def add_transaction(user_id):
+    """Record a manual transaction, update spend stats/alerts and the holdings it moves."""
+    payload = json_body()
+    transaction = {field: payload[field] for field in TRANSACTION_FIELDS if field in payload}
+    transaction["amount"] = float(transaction.get("amount", 0))
+    if transaction.get("amount_type") not in ("credit", "debit"):
+        raise ValueError("amount_type must be credit or debit")
+    if not isinstance(transaction.get("transaction_date"), str):
+        raise ValueError("transaction_date (YYYY-MM-DD) is required")
+    category = transaction.get("category") or "Miscellaneous"
+    transaction["category"] = category
+    if not transaction.get("category_id"):
+        transaction["category_id"] = resolve_category_ids(db, user_id, [category])[category]
+    transaction["user_id"] = user_id
+    # Stored in the currency it was made in; stats and holdings are kept in the user's currency
+    reporting = user_currency(db, user_id)
+    transaction["currency"] = currency_code(transaction.get("currency") or reporting)
+    amount = float(convert([transaction["amount"]], [transaction["currency"]], [transaction["transaction_date"]], reporting)[0])
+
+    db.transactions.insert_one(transaction)
+    record_expenses(db, user_id, [dict(transaction, amount=amount)])
+    apply_to_holdings(user_id, amount, transaction["amount_type"], transaction.get("transaction_mode"), category=category)
+    return written(user_id, 201)
+
+@api.route('/subscription-charges', methods=['POST'])
+def charge_subscriptions(user_id):
+    """Add this month's expense for every subscription that has not been charged yet."""
+    today = datetime.datetime.utcnow()
+    start_date = datetime.datetime(today.year, today.month, 1)
+    end_date = datetime.datetime(today.year + 1, 1, 1) if today.month == 12 else datetime.datetime(today.year, today.month + 1, 1)
+
+    subs = list(db.subscriptions.find({"user_id": user_id}, {"name": 1, "cost": 1}))
+    charged = {
+        doc["description"] for doc in db.transactions.find({
+            "user_id": user_id,
+            "description": {"$in": [f"Subscription: {sub['name']}" for sub in subs]},
+            "amount_type": "expense",
+            "transaction_date": {"$gte": start_date, "$lt": end_date}
+        }, {"description": 1})
+    }
+    # Subscription costs are entered in the user's currency
+    reporting = user_currency(db, user_id)
+    charges = [
+        {
+            "user_id": user_id,
+            "amount": sub['cost'],
+            "currency": reporting,
+            "amount_type": "expense",
+            "category": "Subscription",
+            "category_id": "subscription",
+            "description": f"Subscription: {sub['name']}",
+            "transaction_date": today
+        }
+        for sub in subs if f"Subscription: {sub['name']}" not in charged
+    ]
+    if not charges:
+        return jsonify({"added": 0, "version": get_data_version(db, user_id)})
+    db.transactions.insert_many(charges)
+    return written(user_id, added=len(charges))
+
+# ---------------------- Budget ---------------------- #
+
+@api.route('/budget', methods=['PATCH'])
+def save_budget_totals(user_id):
+    payload = json_body()
+    db.budgets.update_one(
+        {"user_id": user_id},
+        {
+            "$set": {"budget_data.income": float(payload.get("income", 0)), "budget_data.savings": float(payload.get("savings", 0))},
+            "$setOnInsert": {"budget_data.expenses": []}
+        },
+        upsert=True
+    )
+    return written(user_id)
+
+@api.route('/budget/expenses', methods=['POST'])
+def save_budget_expenses(user_id):
+    """Apply the edited category lines of the budget grid with one bulk_write.
+
+    Each change is {category, allocated_amount, frequency, new}; new lines are appended (once),
+    existing ones updated in place.
+    """
+    changes = json_body().get("changes") or []
+    # Every line goes through the catalog, so aliases match the ids transactions are stored under
+    ids = resolve_category_ids(db, user_id, [change["category"] for change in changes]) if changes else {}
+
+    operations = [UpdateOne(
+        {"user_id": user_id},
+        {"$setOnInsert": {"budget_data": {"income": 0, "savings": 0, "expenses": []}}},
+        upsert=True
+    )]
+    for change in changes:
+        if change.get("new"):
+            operations.append(UpdateOne(
+                {"user_id": user_id, "budget_data.expenses.category": {"$ne": change["category"]}},
+                {"$push": {"budget_data.expenses": {
+                    "category": change["category"],
+                    "category_id": ids[change["category"]],
+                    "allocated_amount": float(change["allocated_amount"]),
+                    "frequency": change["frequency"]
+                }}}
+            ))
+        else:
+            operations.append(UpdateOne(
+                {"user_id": user_id},
+                {"$set": {
+                    "budget_data.expenses.$[item].allocated_amount": float(change["allocated_amount"]),
+                    "budget_data.expenses.$[item].frequency": change["frequency"],
+                    "budget_data.expenses.$[item].category_id": ids[change["category"]]
+                }},
+                array_filters=[{"item.category": change["category"]}]
+            ))
+    db.budgets.bulk_write(operations, ordered=True)
+    return written(user_id, saved=len(changes))
+
+# ---------------------- Subscriptions & Debts ---------------------- #
+
+@api.route('/subscriptions', methods=['POST'])
+def add_subscription(user_id):
+    payload = json_body()
+    subscription = {
+        "user_id": user_id,
+        "name": str(payload.get("name") or "").strip(),
+        "cost": float(payload.get("cost", 0)),
+        "usage": payload.get("usage"),
+        "priority": payload.get("priority"),
+        "created_at": datetime.datetime.now()
+    }
+    if not subscription["name"]:
+        raise ValueError("Subscription name is required")
+    inserted = db.subscriptions.insert_one(subscription)
+    return written(user_id, 201, id=str(inserted.inserted_id))
+
+@api.route('/subscriptions/<sub_id>', methods=['PATCH'])
+def update_subscription(user_id, sub_id):
+    payload = json_body()
+    changes = {field: payload[field] for field in SUBSCRIPTION_FIELDS if field in payload}
+    if "cost" in changes:
+        changes["cost"] = float(changes["cost"])
+    result = db.subscriptions.update_one({"_id": ObjectId(sub_id), "user_id": user_id}, {"$set": changes})
+    if not result.matched_count:
+        return jsonify({"error": "Subscription not found"}), 404
+    return written(user_id)
+
+@api.route('/subscriptions/<sub_id>', methods=['DELETE'])
+def delete_subscription(user_id, sub_id):
+    result = db.subscriptions.delete_one({"_id": ObjectId(sub_id), "user_id": user_id})
+    if not result.deleted_count:
+        return jsonify({"error": "Subscription not found"}), 404
+    return written(user_id)
+
+@api.route('/debts', methods=['POST'])
+def add_debt(user_id):
+    payload = json_body()
+    debt = {
+        "user_id": user_id,
+        "name": str(payload.get("name") or "").strip(),
+        "amount": float(payload.get("amount", 0)),
+        "interest_rate": float(payload.get("interest_rate", 0)),
+        "priority": payload.get("priority", "Medium"),
+        "created_at": datetime.datetime.now()
+    }
+    if not debt["name"]:
+        raise ValueError("Debt name is required")
+    inserted = db.debts.insert_one(debt)
+    return written(user_id, 201, id=str(inserted.inserted_id))
+
+# ---------------------- Alerts ---------------------- #
+
+@api.route('/alerts/<alert_id>/dismiss', methods=['POST'])
+def dismiss_alert(user_id, alert_id):
+    db.spend_alerts.update_one({"_id": ObjectId(alert_id), "user_id": user_id}, {"$set": {"dismissed": True}})
+    return written(user_id)
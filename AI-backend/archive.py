@@ -0,0 +1,255 @@
+import argparse
+import datetime
+import heapq
+import itertools
+import os
+from dateutil.relativedelta import relativedelta
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import CollectionInvalid
+from currency import convert_totals
+from indexes import ensure_indexes
+from versioning import bump_data_version
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+# Whole months of transactions kept in the hot `transactions` collection (the current month included)
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', 24))
+ARCHIVE_USER_BATCH = int(os.environ.get('ARCHIVE_USER_BATCH', 200))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 5000))
+# Forecasts read 6 complete months, summaries 3 and month close the last one, all from the hot tier
+MIN_HOT_MONTHS = 8
+
+# Transactions older than the horizon move from `transactions` to `transactions_archive`
+# (zstd-compressed) after their totals are folded into `monthly_aggregates`, one document per
+# user, month, amount type and category. Reads that need full history go through
+# find_transactions / spend_by_category below, which span both tiers; chat retrieval, forecasts,
+# summaries and month close only ever look at recent months and read the hot tier directly.
+
+TIERS = ("transactions", "transactions_archive")
+
+# ---------------------- Cutoff ---------------------- #
+
+def archive_cutoff(today=None, months=ARCHIVE_AFTER_MONTHS):
+    """First day of the oldest month that stays hot, as a YYYY-MM-DD string and a datetime."""
+    today = today or datetime.date.today()
+    start = datetime.datetime(today.year, today.month, 1) - relativedelta(months=months - 1)
+    return start.strftime("%Y-%m-%d"), start
+
+def date_range(field, start=None, end=None):
+    """Match [start, end) for both date encodings (auto-added subscription charges store a datetime).
+
+    Either bound may be None for an open range, but not both.
+    """
+    text, moment = {}, {}
+    if start:
+        text["$gte"], moment["$gte"] = start.strftime("%Y-%m-%d"), start
+    if end:
+        text["$lt"], moment["$lt"] = end.strftime("%Y-%m-%d"), end
+    return [{field: text}, {field: moment}]
+
+def cold_filter(user_ids, cutoff):
+    text, moment = cutoff
+    return {"user_id": {"$in": list(user_ids)}, "$or": [
+        {"transaction_date": {"$lt": text}},
+        {"transaction_date": {"$lt": moment}},
+    ]}
+
+def month_of(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m")
+    return str(value)[:7]
+
+# ---------------------- Archiving ---------------------- #
+
+def ensure_archive(db):
+    """Create the archive with zstd block compression; cold rows are written once and rarely read."""
+    try:
+        db.create_collection("transactions_archive", storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}})
+    except CollectionInvalid:
+        pass
+
+def fold_pipeline(user_id, months):
+    """Totals of the user's archived rows in these months, merged into monthly_aggregates.
+
+    The *_pipeline builders are shared with query_catalog.py, so the plan check explains exactly these.
+    """
+    clauses = []
+    for month in months:
+        start = datetime.datetime.strptime(month, "%Y-%m")
+        clauses.extend(date_range("transaction_date", start, start + relativedelta(months=1)))
+    return [
+        {"$match": {"user_id": user_id, "$or": clauses}},
+        {"$group": {
+            "_id": {
+                "month": {"$cond": [
+                    {"$eq": [{"$type": "$transaction_date"}, "date"]},
+                    {"$dateToString": {"format": "%Y-%m", "date": "$transaction_date"}},
+                    {"$substrBytes": ["$transaction_date", 0, 7]}
+                ]},
+                "amount_type": "$amount_type",
+                "category_id": "$category_id",
+                "currency": "$currency"
+            },
+            "total": {"$sum": "$amount"},
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": user_id,
+            "month": "$_id.month",
+            "amount_type": {"$ifNull": ["$_id.amount_type", "unknown"]},
+            "category_id": {"$ifNull": ["$_id.category_id", "uncategorized"]},
+            # Totals stay in the currency they were made in; "" marks rows from before currencies were
+            # recorded (DEFAULT_CURRENCY until backfill_currencies.py stamps and refolds them)
+            "currency": {"$ifNull": ["$_id.currency", ""]},
+            "total": 1,
+            "count": 1
+        }},
+        {"$merge": {
+            "into": "monthly_aggregates",
+            "on": ["user_id", "month", "amount_type", "category_id", "currency"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+def fold_months(db, user_id, months):
+    """Rebuild the user's monthly_aggregates for these months from the archive."""
+    db.transactions_archive.aggregate(fold_pipeline(user_id, months))
+
+def archive_user(db, user_id, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move the user's cold transactions in batches: copy, fold, then delete.
+
+    Each step is idempotent (the copy keeps existing archive rows and the fold replaces whole
+    months), so an interrupted run is finished by the next one.
+    """
+    moved = 0
+    while True:
+        docs = list(db.transactions.find(cold_filter([user_id], cutoff), {"_id": 1, "transaction_date": 1}).limit(batch_size))
+        if not docs:
+            return moved
+        ids = [doc["_id"] for doc in docs]
+        db.transactions.aggregate([
+            {"$match": {"_id": {"$in": ids}}},
+            {"$merge": {"into": "transactions_archive", "on": "_id", "whenMatched": "keepExisting", "whenNotMatched": "insert"}}
+        ])
+        fold_months(db, user_id, sorted({month_of(doc["transaction_date"]) for doc in docs}))
+        db.transactions.delete_many({"_id": {"$in": ids}})
+        bump_data_version(db, user_id, rewrite=True)
+        moved += len(ids)
+        if len(docs) < batch_size:
+            return moved
+
+def run_archive(db, months=ARCHIVE_AFTER_MONTHS, today=None):
+    """Archive every user's transactions older than `months` whole months; returns rows moved."""
+    if months < MIN_HOT_MONTHS:
+        raise ValueError(f"At least {MIN_HOT_MONTHS} months must stay hot")
+    ensure_archive(db)
+    ensure_indexes(db)
+    cutoff = archive_cutoff(today, months)
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    db.job_runs.update_one(
+        {"_id": "archive"},
+        {"$set": {"status": "running", "cutoff": cutoff[0], "started_at": started_at}},
+        upsert=True
+    )
+
+    moved = 0
+    user_ids = [doc["user_id"] for doc in db.user_profiles.find({"user_id": {"$type": "string"}}, {"user_id": 1}).sort("user_id", 1)]
+    for offset in range(0, len(user_ids), ARCHIVE_USER_BATCH):
+        batch = user_ids[offset:offset + ARCHIVE_USER_BATCH]
+        # Only users with something to move get a query of their own
+        for user_id in db.transactions.distinct("user_id", cold_filter(batch, cutoff)):
+            moved += archive_user(db, user_id, cutoff)
+
+    db.job_runs.update_one(
+        {"_id": "archive"},
+        {"$set": {"status": "completed", "moved": moved, "finished_at": datetime.datetime.now(datetime.timezone.utc)}}
+    )
+    return moved
+
+# ---------------------- Reads Across Tiers ---------------------- #
+
+def date_sort_key(value):
+    # Mongo's sort order across types: missing/null, then strings, then dates
+    if value is None:
+        return (0, "")
+    if isinstance(value, str):
+        return (1, value)
+    return (2, value)
+
+def find_transactions(db, query, projection=None, sort_by_date=False, batch_size=0):
+    """Transactions matching `query` from the hot and archived tiers.
+
+    With `sort_by_date` each tier is sorted by transaction_date on the server and the two
+    cursors are merged as they stream, so memory stays flat however long the history is.
+    """
+    cursors = [db[tier].find(query, projection, batch_size=batch_size) for tier in TIERS]
+    if not sort_by_date:
+        return itertools.chain(*cursors)
+    return heapq.merge(
+        *(cursor.sort("transaction_date", 1) for cursor in cursors),
+        key=lambda doc: date_sort_key(doc.get("transaction_date"))
+    )
+
+def spend_by_category_pipeline(user_id, start=None, end=None):
+    """Debit totals per category id, currency and month over hot rows and the folded archive."""
+    match = {"user_id": user_id, "amount_type": "debit"}
+    folded = {"user_id": user_id, "amount_type": "debit"}
+    if start and end:
+        match["transaction_date"] = {"$gte": start, "$lt": end}
+        last_day = datetime.datetime.strptime(end, "%Y-%m-%d") - datetime.timedelta(days=1)
+        folded["month"] = {"$gte": start[:7], "$lte": last_day.strftime("%Y-%m")}
+    return [
+        {"$match": match},
+        {"$project": {
+            "category_id": 1,
+            "amount": 1,
+            "currency": 1,
+            "month": {"$cond": [
+                {"$eq": [{"$type": "$transaction_date"}, "date"]},
+                {"$dateToString": {"format": "%Y-%m", "date": "$transaction_date"}},
+                {"$substrBytes": ["$transaction_date", 0, 7]}
+            ]}
+        }},
+        {"$unionWith": {"coll": "monthly_aggregates", "pipeline": [
+            {"$match": folded},
+            {"$project": {"category_id": 1, "currency": 1, "month": 1, "amount": "$total"}}
+        ]}},
+        {"$group": {
+            "_id": {"category_id": "$category_id", "currency": "$currency", "month": "$month"},
+            "amount": {"$sum": "$amount"}
+        }}
+    ]
+
+def spend_by_category(db, user_id, start=None, end=None, to=None):
+    """Debit totals per category id: hot rows plus the folded totals of archived months.
+
+    Archived months count whole, so a [start, end) range includes every archived month it touches.
+    Totals are grouped per currency and month and converted to `to` (when given) at monthly rates.
+    """
+    rows = db.transactions.aggregate(spend_by_category_pipeline(user_id, start, end))
+    rows = [dict(row["_id"], amount=row["amount"]) for row in rows]
+    if to:
+        convert_totals(rows, to, amount="amount")
+    totals = {}
+    for row in rows:
+        totals[row.get("category_id")] = totals.get(row.get("category_id"), 0) + row["amount"]
+    return [{"_id": cid, "amount": amount} for cid, amount in totals.items()]
+
+def archived_hashes(db, user_id, hashes):
+    """Content hashes of statement rows that were imported before and have since been archived."""
+    cursor = db.transactions_archive.find({"user_id": user_id, "content_hash": {"$in": list(hashes)}}, {"content_hash": 1})
+    return {doc["content_hash"] for doc in cursor}
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Move transactions older than the hot window into the archive")
+    arg_parser.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="Whole months to keep hot, the current one included")
+    args = arg_parser.parse_args()
+
+    client = MongoClient(MONGO_URI)
+    moved = run_archive(client['finance_ai'], args.months)
+    print(f"Archived {moved} transactions")
+    client.close()
@@ -0,0 +1,92 @@
+import atexit
+import datetime
+import json
+import os
+import queue
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Debug dumps are off unless a path is configured
+AUDIT_LOG_PATH = os.environ.get("AUDIT_LOG_PATH")
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", 100))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 2.0))
+AUDIT_MAX_QUEUE = int(os.environ.get("AUDIT_MAX_QUEUE", 10000))
+
+
+class AuditSink:
+    """Buffers audit records in memory and appends them to a JSON-lines file from a background thread."""
+
+    def __init__(self, path, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL,
+                 max_queue=AUDIT_MAX_QUEUE):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def record(self, kind, user_id, request_id, data):
+        if not self.enabled:
+            return
+        self._ensure_started()
+        entry = {
+            "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "kind": kind,
+            "user_id": user_id,
+            "request_id": request_id,
+            "data": data
+        }
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            # Never block a request on the audit trail
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            self._write(batch)
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            with self._write_lock, open(self.path, "a") as audit_file:
+                for entry in batch:
+                    audit_file.write(json.dumps(entry, default=str) + "\n")
+        except OSError as e:
+            print(f"Error writing audit log: {e}")
+
+
+audit = AuditSink(AUDIT_LOG_PATH)
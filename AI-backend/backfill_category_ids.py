@@ -0,0 +1,74 @@
+import os
+from collections import defaultdict
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateMany
+from categories import resolve_category_ids
+from versioning import bump_data_version
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+
+# One-off migration: registers every category name a user has used in their catalog and
+# stamps category_id on transactions and budget lines written before the catalog existed.
+# Safe to re-run; only transactions without a category_id, and budget lines whose id is not
+# their catalog id, are touched.
+
+def legacy_transaction_categories(db):
+    pipeline = [
+        {"$match": {"category_id": {"$exists": False}, "category": {"$type": "string"}}},
+        {"$group": {"_id": {"user_id": "$user_id", "category": "$category"}}}
+    ]
+    names = defaultdict(set)
+    for row in db.transactions.aggregate(pipeline, allowDiskUse=True):
+        names[row["_id"]["user_id"]].add(row["_id"]["category"])
+    return names
+
+def backfill_user(db, user_id, transaction_categories):
+    profile = db.user_profiles.find_one({"user_id": user_id}, {"custom_categories": 1}) or {}
+    budget = db.budgets.find_one({"user_id": user_id}, {"budget_data.expenses": 1}) or {}
+    expenses = budget.get("budget_data", {}).get("expenses", [])
+
+    names = set(transaction_categories) | set(profile.get("custom_categories", []))
+    names |= {item["category"] for item in expenses if item.get("category")}
+    category_ids = resolve_category_ids(db, user_id, sorted(names))
+
+    operations = [
+        UpdateMany(
+            {"user_id": user_id, "category": name, "category_id": {"$exists": False}},
+            {"$set": {"category_id": category_ids[name]}}
+        )
+        for name in transaction_categories
+    ]
+    if operations:
+        db.transactions.bulk_write(operations, ordered=False)
+
+    # Also repairs budget lines stamped with a plain slug instead of their catalog id
+    if any(item.get("category_id") != category_ids[item["category"]] for item in expenses if item.get("category")):
+        updated = [
+            dict(item, category_id=category_ids[item["category"]]) if item.get("category") else item
+            for item in expenses
+        ]
+        # Only applies if the budget was not edited while we were working on it
+        db.budgets.update_one(
+            {"user_id": user_id, "budget_data.expenses": expenses},
+            {"$set": {"budget_data.expenses": updated}}
+        )
+    bump_data_version(db, user_id, rewrite=True)
+
+def backfill(db):
+    transaction_categories = legacy_transaction_categories(db)
+    user_ids = set(transaction_categories)
+    user_ids |= {doc["user_id"] for doc in db.budgets.find({}, {"user_id": 1}) if doc.get("user_id")}
+    user_ids |= {doc["user_id"] for doc in db.user_profiles.find({}, {"user_id": 1}) if doc.get("user_id")}
+
+    for user_id in sorted(user_ids, key=str):
+        backfill_user(db, user_id, transaction_categories.get(user_id, set()))
+    return len(user_ids)
+
+
+if __name__ == "__main__":
+    client = MongoClient(MONGO_URI)
+    count = backfill(client['finance_ai'])
+    print(f"Backfilled category ids for {count} users")
+    client.close()
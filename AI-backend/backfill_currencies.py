@@ -0,0 +1,51 @@
+import os
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from archive import fold_months
+from currency import DEFAULT_CURRENCY, user_currencies
+from versioning import bump_data_version
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+
+# One-off migration: stamps `currency` on transactions written before currencies were recorded,
+# using each user's profile currency at the time it runs, so a later change of profile currency
+# converts the old amounts instead of relabelling them. Archived months folded without a
+# currency are rebuilt from the stamped archive rows. Safe to re-run; only rows without a
+# currency are touched.
+
+MISSING_CURRENCY = {"$in": [None, ""]}
+
+def legacy_users(db):
+    user_ids = set(db.transactions.distinct("user_id", {"currency": MISSING_CURRENCY}))
+    user_ids |= set(db.transactions_archive.distinct("user_id", {"currency": MISSING_CURRENCY}))
+    return sorted(user_ids, key=str)
+
+def backfill_user(db, user_id, currency):
+    stamp = {"$set": {"currency": currency}}
+    changed = db.transactions.update_many({"user_id": user_id, "currency": MISSING_CURRENCY}, stamp).modified_count
+    changed += db.transactions_archive.update_many({"user_id": user_id, "currency": MISSING_CURRENCY}, stamp).modified_count
+
+    months = db.monthly_aggregates.distinct("month", {"user_id": user_id, "currency": ""})
+    if months:
+        db.monthly_aggregates.delete_many({"user_id": user_id, "currency": "", "month": {"$in": months}})
+        fold_months(db, user_id, sorted(months))
+    if changed or months:
+        bump_data_version(db, user_id, rewrite=True)
+    return changed
+
+def backfill(db):
+    user_ids = legacy_users(db)
+    currencies = user_currencies(db, {"$in": user_ids})
+    stamped = 0
+    for user_id in user_ids:
+        stamped += backfill_user(db, user_id, currencies.get(user_id, DEFAULT_CURRENCY))
+    return len(user_ids), stamped
+
+
+if __name__ == "__main__":
+    client = MongoClient(MONGO_URI)
+    users, stamped = backfill(client['finance_ai'])
+    print(f"Stamped currencies on {stamped} transactions for {users} users")
+    client.close()
@@ -1,18 +1,28 @@
 from typing import List, Optional
+import threading
 from pydantic import BaseModel
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-import json
 from dotenv import load_dotenv
 import os
 from pymongo import MongoClient
+from llm_gateway import gateway, estimate_tokens, request_key
+from audit import audit
+from versioning import bump_data_version
+from categories import load_catalog, resolve_category_ids
+from budget_rules import parse_budget_rules
 
 load_dotenv()
 
 API_KEY = os.environ.get("GROQ_API_KEY")
 MODEL_NAME = os.environ.get('MODEL_NAME')
 MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+# Descriptions the rule-based parser understands with at least this confidence skip the LLM
+BUDGET_RULES_MIN_CONFIDENCE = float(os.environ.get('BUDGET_RULES_MIN_CONFIDENCE', 0.9))
+
+_parse_stats = {"rules": 0, "llm": 0}
+_parse_stats_lock = threading.Lock()
 
 # ---------------------- Pydantic Models ---------------------- #
 
@@ -29,7 +39,8 @@ def load_model():
     llm = ChatGroq(
         model_name=MODEL_NAME,
         temperature=0.7,
-        api_key=API_KEY
+        api_key=API_KEY,
+        max_retries=0
     )
 
     parser = JsonOutputParser(pydantic_object=Budget)
@@ -52,17 +63,31 @@ def load_model():
 
 # ---------------------- Budget Parser ---------------------- #
 
-def parse_budget(description: str) -> dict:
-    chain_ = load_model()
-    result = chain_.invoke({"input": description})
-    save_json_to_file(result, 'budget_data.json')
+def parse_budget(description: str, user_id=None, request_id=None) -> dict:
+    catalog = None
+    if user_id:
+        client = get_mongodb_connection()
+        catalog = load_catalog(client['finance_ai'], user_id)
+        client.close()
+    result, confidence = parse_budget_rules(description, catalog)
+    path = "rules"
+    if confidence < BUDGET_RULES_MIN_CONFIDENCE:
+        chain_ = load_model()
+        result = gateway.invoke(
+            lambda: chain_.invoke({"input": description}),
+            key=request_key(MODEL_NAME, "budget", description),
+            estimated_tokens=estimate_tokens(description, max_output_tokens=512),
+            model=MODEL_NAME
+        )
+        path = "llm"
+    with _parse_stats_lock:
+        _parse_stats[path] += 1
+    audit.record("budget_parsed", user_id, request_id, dict(result, parse_path=path, rules_confidence=confidence))
     return result
 
-# ---------------------- File Utils ---------------------- #
-
-def save_json_to_file(data, filename):
-    with open(filename, 'w') as json_file:
-        json.dump(data, json_file, indent=2)
+def get_parse_stats():
+    with _parse_stats_lock:
+        return dict(_parse_stats)
 
 # ---------------------- MongoDB Utils ---------------------- #
 
@@ -81,42 +106,66 @@ def get_user_budget(user_id):
     return budget
 
 # ---------------------- Budget Merger ---------------------- #
-def merge_budget_data(existing: dict, new: dict) -> dict:
-    merged = existing.copy()
-
-    # Merge expenses
-    existing_expenses = {item['category']: item for item in merged.get('expenses', [])}
-    
-    for new_item in new.get('expenses', []):
+def build_merge_pipeline(new: dict, category_ids: dict) -> list:
+    """Update pipeline that upserts each new category into budget_data.expenses server-side."""
+    # Last occurrence wins when the model repeats a category (or two spellings of one)
+    new_expenses = {}
+    for item in new.get('expenses', []):
+        cid = category_ids[item['category']]
+        new_expenses[cid] = dict(item, category_id=cid)
+
+    pipeline = [{"$set": {
+        "budget_data.income": {"$ifNull": ["$budget_data.income", 0]},
+        "budget_data.savings": {"$ifNull": ["$budget_data.savings", 0]},
+        "budget_data.expenses": {"$ifNull": ["$budget_data.expenses", []]}
+    }}]
+
+    for cid, new_item in new_expenses.items():
         cat = new_item['category']
-        if cat in existing_expenses:
-            existing_expenses[cat]['allocated_amount'] = new_item['allocated_amount']
-        else:
-            existing_expenses[cat] = new_item
-
-    merged['expenses'] = list(existing_expenses.values())
-    return merged
+        pipeline.append({"$set": {"budget_data.expenses": {"$concatArrays": [
+            # Existing category: only the allocation (and a frequency the parser read) changes, other fields are kept
+            {"$map": {
+                "input": "$budget_data.expenses",
+                "as": "item",
+                "in": {"$cond": [
+                    {"$or": [
+                        {"$eq": ["$$item.category_id", {"$literal": cid}]},
+                        {"$eq": ["$$item.category", {"$literal": cat}]}
+                    ]},
+                    {"$mergeObjects": ["$$item", {
+                        "allocated_amount": new_item['allocated_amount'],
+                        "category_id": {"$literal": cid}
+                    }, {"frequency": {"$literal": new_item['frequency']}} if new_item.get('frequency') else {}]},
+                    "$$item"
+                ]}
+            }},
+            # New category: appended at the end
+            {"$cond": [
+                {"$or": [
+                    {"$in": [{"$literal": cid}, {"$ifNull": ["$budget_data.expenses.category_id", []]}]},
+                    {"$in": [{"$literal": cat}, {"$ifNull": ["$budget_data.expenses.category", []]}]}
+                ]},
+                [],
+                [{"$literal": new_item}]
+            ]}
+        ]}}})
+
+    return pipeline
 
 # ---------------------- Save to DB ---------------------- #
 
-def save_in_db(user_id, response):
+def save_in_db(user_id, response, request_id=None):
     client = get_mongodb_connection()
     db = client['finance_ai']
     budgets_collection = db['budgets']
 
-    user_doc = budgets_collection.find_one({'user_id': user_id})
-
-    if user_doc and 'budget_data' in user_doc:
-        existing_budget = user_doc['budget_data']
-        merged_budget = merge_budget_data(existing_budget, response)
-    else:
-        merged_budget = response  # No existing budget
-
+    category_ids = resolve_category_ids(db, user_id, [item['category'] for item in response.get('expenses', [])])
     budgets_collection.update_one(
         {'user_id': user_id},
-        {'$set': {'budget_data': merged_budget}},
+        build_merge_pipeline(response, category_ids),
         upsert=True
     )
+    bump_data_version(db, user_id)
 
-    save_json_to_file(merged_budget, 'merged_budget.json')  # Optional debug output
+    audit.record("budget_merged", user_id, request_id, response)
     client.close()
\ No newline at end of file
@@ -0,0 +1,146 @@
+import re
+from categories import PREDEFINED_CATEGORIES, catalog_entry, category_id, match_catalog
+
+# Deterministic parser for formulaic budget descriptions such as
+# "I earn 50000, save 10000, rent 15000, food 8000 and 20% on travel".
+# It returns the same {"expenses": [{"category", "allocated_amount"}]} shape as the LLM
+# chain together with a confidence; budget.parse_budget falls back to the LLM when it is low.
+# Currency marks are replaced by CURRENCY_MARK so a clause still knows its number is money.
+
+CURRENCY_PATTERN = re.compile(r"(?:₹|\$|€|£|\brs\.?|\binr\b|\busd\b|\beur\b|\bgbp\b|\brupees?\b|\bdollars?\b)")
+AMOUNT_PATTERN = re.compile(
+    r"(?<![\w.])(\d+(?:,\d{2,3})*(?:\.\d+)?)\s*(%|percent\b|k\b|thousand\b|lakhs?\b|lacs?\b|l\b|m\b|million\b|crores?\b|cr\b)?"
+)
+# Commas inside numbers ("6,500") and decimal points do not end a clause
+CURRENCY_MARK = "¤"
+CLAUSE_SPLIT = re.compile(r";|\n|,(?!\d)|(?<!\d)\.|\.(?!\d)|\band\b|\bplus\b|\balso\b")
+
+MULTIPLIERS = {
+    "k": 1e3, "thousand": 1e3,
+    "l": 1e5, "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5,
+    "m": 1e6, "million": 1e6,
+    "cr": 1e7, "crore": 1e7, "crores": 1e7,
+}
+
+INCOME_WORDS = {
+    "earn", "earns", "earning", "earnings", "income", "salary", "take-home", "takehome",
+    "make", "makes", "making", "paid", "wage", "wages"
+}
+SAVINGS_WORDS = {"save", "saving", "savings"}
+# Words that change an existing allocation or make the clause conditional; the LLM handles these
+MODIFIER_WORDS = {
+    "increase", "decrease", "reduce", "cut", "raise", "more", "less", "than", "by", "if", "but",
+    "instead", "remove", "delete", "except", "double", "half", "halve", "minus", "extra", "not", "don't", "no"
+}
+FILLER_WORDS = {
+    "i", "i'd", "i'm", "i'll", "my", "me", "we", "our", "a", "an", "the", "is", "are", "be", "should", "would", "like", "want", "wanna",
+    "to", "for", "on", "in", "of", "at", "as", "about", "around", "approx", "approximately", "roughly",
+    "spend", "spending", "spent", "allocate", "allocated", "allocation", "put", "keep", "set", "give", "budget",
+    "budgeted", "assign", "reserve", "towards", "toward", "per", "month", "monthly", "months", "every", "each",
+    "pm", "p.m", "mo", "get", "have", "need", "needs", "it", "that", "this", "with", "up", "aside", "amount",
+    "can", "will", "plan", "planning", "go", "goes", "going", "into", "please", "also", "just", "only", "total",
+}
+# Words that say a bare number is an amount of money ("spend 8000 food") rather than a count ("2 kids")
+AMOUNT_CONTEXT_WORDS = {
+    "spend", "spending", "spent", "allocate", "allocated", "allocation", "budget", "budgeted", "assign",
+    "reserve", "put", "keep", "set", "give", "pay", "costs", "cost", "for", "on", "towards", "toward"
+}
+# "3000 a week on food": how often the amount recurs, as (pattern, frequency, months per occurrence).
+# Weekly lines keep their frequency (the budget grid has it); daily and yearly ones become monthly.
+FREQUENCY_PATTERNS = [
+    (re.compile(r"\b(?:a|per|every|each|/)\s*(?:week|wk)\b|\bweekly\b|\bpw\b"), "Weekly", 1.0),
+    (re.compile(r"\b(?:a|per|every|each|/)\s*day\b|\bdaily\b"), "Monthly", 365 / 12),
+    (re.compile(r"\b(?:a|per|every|each|/)\s*(?:year|yr|annum)\b|\byearly\b|\bannual(?:ly)?\b|\bp\.?a\b"), "Monthly", 1 / 12),
+]
+WEEKS_PER_MONTH = 52 / 12
+MAX_CATEGORY_WORDS = 3
+LONG_CATEGORY_CONFIDENCE = 0.6
+# Category words that match no predefined or catalog category may be misread text; let the LLM decide
+UNKNOWN_CATEGORY_CONFIDENCE = 0.5
+
+# ---------------------- Clause Parsing ---------------------- #
+
+def parse_amount(number, unit):
+    value = float(number.replace(",", ""))
+    unit = (unit or "").lower()
+    if unit in ("%", "percent"):
+        return value, True
+    return value * MULTIPLIERS.get(unit, 1), False
+
+def clause_frequency(text):
+    """(text without its frequency phrase, frequency, factor to a monthly amount)."""
+    for pattern, frequency, factor in FREQUENCY_PATTERNS:
+        if pattern.search(text):
+            return pattern.sub(" ", text), frequency, factor
+    return text, "Monthly", 1.0
+
+def parse_clause(text, catalog):
+    """Return (kind, category words, amount, is_percent, frequency, confidence) for one clause, or None if empty."""
+    text, frequency, factor = clause_frequency(text)
+    amounts = list(AMOUNT_PATTERN.finditer(text))
+    words = re.findall(r"[a-z][a-z'&-]*", AMOUNT_PATTERN.sub(" ", text))
+    if not amounts and not words:
+        return None
+    if len(amounts) != 1 or MODIFIER_WORDS & set(words):
+        return "unknown", words, None, False, frequency, 0.0
+
+    match = amounts[0]
+    amount, is_percent = parse_amount(match.group(1), match.group(2))
+    if is_percent and (factor != 1.0 or frequency != "Monthly"):
+        return "unknown", words, amount, is_percent, frequency, 0.0
+    if not is_percent and frequency == "Monthly":
+        amount *= factor
+    if INCOME_WORDS & set(words):
+        # Income is only used for percentages of a month's pay
+        monthly = amount * WEEKS_PER_MONTH if frequency == "Weekly" and not is_percent else amount
+        return "income", [], monthly, is_percent, "Monthly", 1.0
+    if SAVINGS_WORDS & set(words):
+        return "expense", ["savings"], amount, is_percent, frequency, 1.0
+
+    category = [word for word in words if word not in FILLER_WORDS]
+    before = [word for word in re.findall(r"[a-z][a-z'&-]*", text[:match.start()]) if word not in FILLER_WORDS]
+    # "rent 15000 food" - category words on both sides of the amount are ambiguous
+    if not category or (before and len(before) < len(category)):
+        return "unknown", words, amount, is_percent, frequency, 0.0
+    # "2 kids": a bare number straight before a noun, with nothing saying it is money, is a count
+    after = re.match(r"\s*([a-z][a-z'&-]*)", text[match.end():])
+    has_context = CURRENCY_MARK in text or match.group(2) or AMOUNT_CONTEXT_WORDS & set(words)
+    if not has_context and after and after.group(1) not in FILLER_WORDS:
+        return "unknown", words, amount, is_percent, frequency, 0.0
+
+    confidence = 1.0 if len(category) <= MAX_CATEGORY_WORDS else LONG_CATEGORY_CONFIDENCE
+    if match_catalog(catalog, " ".join(category)) is None:
+        confidence = min(confidence, UNKNOWN_CATEGORY_CONFIDENCE)
+    return "expense", category, amount, is_percent, frequency, confidence
+
+# ---------------------- Public API ---------------------- #
+
+def parse_budget_rules(description, catalog=None):
+    """Parse a budget description without the LLM; returns (result, confidence between 0 and 1).
+
+    `catalog` is the user's category catalog ({id: entry}); the predefined categories when omitted.
+    """
+    if catalog is None:
+        catalog = {category_id(name): catalog_entry(name) for name in PREDEFINED_CATEGORIES}
+    text = CURRENCY_PATTERN.sub(f" {CURRENCY_MARK} ", (description or "").lower())
+    clauses = [parsed for parsed in (parse_clause(clause, catalog) for clause in CLAUSE_SPLIT.split(text)) if parsed]
+    income = next((amount for kind, _, amount, is_percent, _, _ in clauses if kind == "income" and not is_percent), None)
+
+    expenses = {}
+    confidence = 1.0 if clauses else 0.0
+    for kind, words, amount, is_percent, frequency, clause_confidence in clauses:
+        confidence = min(confidence, clause_confidence)
+        if kind != "expense":
+            continue
+        if is_percent:
+            if income is None:
+                confidence = 0.0
+                continue
+            amount = income * amount / 100
+        # Title Case names, like the LLM prompt asks for; repeated categories keep the last amount
+        name = " ".join(word.capitalize() for word in words)
+        expenses[name] = {"category": name, "allocated_amount": round(amount, 2), "frequency": frequency}
+
+    if not expenses:
+        confidence = 0.0
+    return {"expenses": list(expenses.values())}, confidence
@@ -0,0 +1,77 @@
+import re
+
+# Kept identical to Frontend/utils/categories.py
+PREDEFINED_CATEGORIES = [
+    "Food", "Travel", "Rent", "Salary", "Shopping",
+    "Healthcare", "Utilities", "Miscellaneous", "Savings", "Subscription"
+]
+
+# Also mirrored in Frontend/utils/categories.py
+BUILTIN_ALIASES = {
+    "groceries": "food",
+    "grocery": "food",
+    "others": "miscellaneous",
+    "other": "miscellaneous",
+    "misc": "miscellaneous",
+    "bills": "utilities",
+    "medical": "healthcare",
+    "subscriptions": "subscription",
+}
+
+def category_id(name):
+    return re.sub(r"[^a-z0-9]+", "_", str(name or "").lower()).strip("_") or "uncategorized"
+
+def catalog_entry(name):
+    return {"id": category_id(name), "name": str(name).strip(), "aliases": []}
+
+def profile_catalog(profile):
+    """{id: entry} for the predefined categories plus those stored on a user profile document."""
+    catalog = {category_id(name): catalog_entry(name) for name in PREDEFINED_CATEGORIES}
+    for entry in (profile or {}).get("category_catalog", []):
+        catalog[entry["id"]] = entry
+    return catalog
+
+def load_catalog(db, user_id):
+    return profile_catalog(db.user_profiles.find_one({"user_id": user_id}, {"category_catalog": 1}))
+
+def match_catalog(catalog, name):
+    """Return the catalog id for `name`, or None when it is not known yet."""
+    key = category_id(name)
+    if key in catalog:
+        return key
+    for entry in catalog.values():
+        if key in entry.get("aliases", []):
+            return entry["id"]
+    return BUILTIN_ALIASES.get(key)
+
+def resolve_category_ids(db, user_id, names):
+    """Map category names to catalog ids with one read, registering unseen categories in one write."""
+    catalog = load_catalog(db, user_id)
+    resolved = {}
+    new_entries = {}
+    for name in names:
+        if name in resolved:
+            continue
+        cid = match_catalog(catalog, name)
+        if cid is None:
+            cid = category_id(name)
+            new_entries.setdefault(cid, catalog_entry(name))
+        resolved[name] = cid
+
+    if new_entries:
+        # Appends only ids the stored catalog does not have yet, so concurrent resolves (or the
+        # same id under another display name) never leave duplicate ids behind
+        db.user_profiles.update_one(
+            {"user_id": user_id},
+            [{"$set": {"category_catalog": {"$concatArrays": [
+                {"$ifNull": ["$category_catalog", []]},
+                {"$filter": {
+                    "input": {"$literal": list(new_entries.values())},
+                    "cond": {"$not": [{"$in": ["$$this.id", {"$ifNull": ["$category_catalog.id", []]}]}]}
+                }}
+            ]}}}]
+        )
+    return resolved
+
+def category_names(catalog):
+    return {cid: entry["name"] for cid, entry in catalog.items()}
@@ -0,0 +1,201 @@
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from categories import resolve_category_ids
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+
+# Hashed bag-of-words: unigrams and bigrams are folded into N_FEATURES buckets and one
+# always-present bias bucket (index N_FEATURES) so every description has at least one feature.
+N_FEATURES = 2 ** 14
+BIAS_FEATURE = N_FEATURES
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+DEFAULT_CATEGORY = "miscellaneous"
+NB_MIN_CONFIDENCE = 0.6
+NB_MIN_EXAMPLES = 5
+SMOOTHING = 0.5
+MODEL_CACHE_SIZE = 256
+MODEL_CACHE_TTL = 300
+
+# Merchant / keyword dictionary for the predefined categories
+KEYWORD_RULES = {
+    "food": ["swiggy", "zomato", "restaurant", "cafe", "coffee", "starbucks", "pizza", "burger", "grocery",
+             "groceries", "bigbasket", "blinkit", "zepto", "dmart", "mcdonalds", "kfc", "dominos", "bakery",
+             "milk", "bread", "rice", "vegetables", "fruits", "snacks", "tea"],
+    "travel": ["uber", "ola", "rapido", "irctc", "railway", "flight", "airlines", "indigo", "airbnb", "hotel",
+               "taxi", "metro", "fuel", "petrol", "diesel", "bus", "makemytrip", "toll", "parking"],
+    "rent": ["rent", "landlord", "lease", "maintenance"],
+    "salary": ["salary", "payroll", "wages", "stipend", "bonus"],
+    "shopping": ["amazon", "flipkart", "myntra", "ajio", "mall", "clothing", "shoes", "apparel", "ikea",
+                 "meesho", "nykaa", "decathlon"],
+    "healthcare": ["pharmacy", "hospital", "clinic", "doctor", "medical", "medicine", "apollo", "diagnostic",
+                   "dental", "pharmeasy", "netmeds"],
+    "utilities": ["electricity", "water", "gas", "internet", "broadband", "wifi", "recharge", "airtel", "jio",
+                  "vodafone", "bescom", "dth", "postpaid", "prepaid"],
+    "subscription": ["netflix", "spotify", "hotstar", "youtube", "subscription", "icloud", "adobe", "disney"],
+    "savings": ["sip", "mutual", "ppf", "savings"],
+}
+
+# ---------------------- Features ---------------------- #
+
+def feature_index(token):
+    return zlib.crc32(token.encode("utf-8")) % N_FEATURES
+
+def description_grams(description):
+    tokens = TOKEN_PATTERN.findall(str(description or "").lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+def description_features(description):
+    return [feature_index(gram) for gram in description_grams(description)]
+
+def featurize(descriptions):
+    """CSR-style (indptr, indices) arrays for a batch; each row starts with the bias feature."""
+    indices = []
+    indptr = [0]
+    for description in descriptions:
+        indices.append(BIAS_FEATURE)
+        indices.extend(description_features(description))
+        indptr.append(len(indices))
+    return np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int64)
+
+# Keywords are matched on the grams themselves; hashed buckets would let any colliding word force a category
+KEYWORD_CATEGORIES = {keyword: category for category, keywords in KEYWORD_RULES.items() for keyword in keywords}
+
+# ---------------------- Model ---------------------- #
+
+class NaiveBayesModel:
+    """Multinomial naive Bayes over hashed features, built from per-user correction counts."""
+
+    def __init__(self, classes, log_prior, log_likelihood, vocabulary, examples):
+        self.classes = classes
+        self.log_prior = log_prior
+        self.log_likelihood = log_likelihood
+        self.vocabulary = vocabulary
+        self.examples = examples
+
+    @classmethod
+    def from_counts(cls, doc):
+        stored = (doc or {}).get("classes", {})
+        classes = sorted(stored)
+        if not classes:
+            return None
+        counts = np.zeros((len(classes), N_FEATURES + 1), dtype=np.float64)
+        docs = np.zeros(len(classes), dtype=np.float64)
+        for row, category in enumerate(classes):
+            docs[row] = stored[category].get("docs", 0)
+            tokens = stored[category].get("tokens", {})
+            if tokens:
+                columns = np.fromiter((int(feature) for feature in tokens), dtype=np.int64, count=len(tokens))
+                counts[row, columns] = np.fromiter(tokens.values(), dtype=np.float64, count=len(tokens))
+        vocabulary = counts.any(axis=0)
+        vocabulary[BIAS_FEATURE] = False
+        counts += SMOOTHING
+        log_likelihood = np.log(counts / counts[:, :N_FEATURES].sum(axis=1, keepdims=True))
+        log_likelihood[:, BIAS_FEATURE] = 0.0
+        log_prior = np.log((docs + 1) / (docs.sum() + len(classes)))
+        return cls(classes, log_prior.astype(np.float32), log_likelihood.astype(np.float32), vocabulary, int(docs.sum()))
+
+    def predict(self, indptr, indices):
+        """Return (class index per row, posterior of that class) for a featurized batch.
+
+        Rows with no feature the user has ever labelled get confidence 0 so the prior alone never decides.
+        """
+        contributions = self.log_likelihood[:, indices]
+        scores = np.add.reduceat(contributions, indptr[:-1], axis=1) + self.log_prior[:, None]
+        scores -= scores.max(axis=0, keepdims=True)
+        posterior = np.exp(scores)
+        posterior /= posterior.sum(axis=0, keepdims=True)
+        best = posterior.argmax(axis=0)
+        known = np.add.reduceat(self.vocabulary[indices], indptr[:-1]) > 0
+        return best, np.where(known, posterior[best, np.arange(posterior.shape[1])], 0.0)
+
+# ---------------------- Model Cache ---------------------- #
+
+_models = OrderedDict()
+_models_lock = threading.Lock()
+
+def load_model(db, user_id):
+    now = time.monotonic()
+    with _models_lock:
+        cached = _models.get(user_id)
+        if cached and now - cached[1] < MODEL_CACHE_TTL:
+            _models.move_to_end(user_id)
+            return cached[0]
+
+    model = NaiveBayesModel.from_counts(db.categorizer_models.find_one({"_id": user_id}))
+    with _models_lock:
+        _models[user_id] = (model, now)
+        _models.move_to_end(user_id)
+        while len(_models) > MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+    return model
+
+def invalidate(user_id):
+    with _models_lock:
+        _models.pop(user_id, None)
+
+# ---------------------- Public API ---------------------- #
+
+def keyword_categories(descriptions, default=DEFAULT_CATEGORY):
+    """Most frequent keyword category per description (`default` when no keyword matched)."""
+    result = []
+    for description in descriptions:
+        votes = Counter(KEYWORD_CATEGORIES[gram] for gram in description_grams(description) if gram in KEYWORD_CATEGORIES)
+        result.append(votes.most_common(1)[0][0] if votes else default)
+    return result
+
+def categorize(db, user_id, descriptions, default=DEFAULT_CATEGORY):
+    """Category id for each description: the user's learned model when confident, else keywords, else default."""
+    if not descriptions:
+        return []
+    result = np.array(keyword_categories(descriptions, default), dtype=object)
+    indptr, indices = featurize(descriptions)
+
+    model = load_model(db, user_id)
+    if model is not None and model.examples >= NB_MIN_EXAMPLES:
+        best, confidence = model.predict(indptr, indices)
+        confident = confidence >= NB_MIN_CONFIDENCE
+        result = np.where(confident, np.array(model.classes, dtype=object)[best], result)
+    return result.tolist()
+
+def learn(db, user_id, descriptions, category_ids):
+    """Record labelled descriptions (user corrections, explicit categories) in the user's model."""
+    increments = {}
+    for description, category in zip(descriptions, category_ids):
+        features = description_features(description)
+        if not category or not features:
+            continue
+        key = f"classes.{category}"
+        increments[f"{key}.docs"] = increments.get(f"{key}.docs", 0) + 1
+        for feature in features:
+            field = f"{key}.tokens.{feature}"
+            increments[field] = increments.get(field, 0) + 1
+    if increments:
+        db.categorizer_models.update_one({"_id": user_id}, {"$inc": increments}, upsert=True)
+        invalidate(user_id)
+
+def suggest_categories(user_id, descriptions):
+    client = MongoClient(MONGO_URI)
+    try:
+        return categorize(client['finance_ai'], user_id, descriptions)
+    finally:
+        client.close()
+
+def record_feedback(user_id, descriptions, categories):
+    """Learn from categories the user picked (or corrected) for the given descriptions."""
+    client = MongoClient(MONGO_URI)
+    db = client['finance_ai']
+    try:
+        category_ids = resolve_category_ids(db, user_id, categories)
+        learn(db, user_id, descriptions, [category_ids[name] for name in categories])
+    finally:
+        client.close()
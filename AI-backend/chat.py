@@ -4,15 +4,23 @@ from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, HumanMessage
 from prompt_schema import ChatPrompt, User
 from prompt_utils import prompt_render
+from llm_gateway import gateway, estimate_tokens, request_key, langchain_usage
+from tracing import traced
+from retrieval import transaction_context
+from debt_payoff import payoff_summary
+from forecast import get_forecast
+from anomaly import recent_alerts
+from financial_summary import get_financial_summary
+from versioning import get_data_version
+import chat_cache
 import datetime
-import pandas as pd
 import os
-from dateutil.relativedelta import relativedelta
 
 load_dotenv()
 
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 
+@traced()
 def get_full_user_profile(user_id: str):
     try:
         # Connect to MongoDB
@@ -38,51 +46,28 @@ def get_full_user_profile(user_id: str):
         stocks = profiles.get("stock_investments", 0)
         total_savings = profiles.get("total_savings", 0)
         currency = profiles.get("currency", "")
-        # ---------- Transactions, Subscriptions, Debts ----------
-        current_month = datetime.datetime.now().strftime('%Y-%m')
-        transactions = list(db.transactions.find({
-            "user_id": user_id,
-            "transaction_date": {"$regex": f"^{current_month}"}
-        }))
-
+        # ---------- Subscriptions, Debts ----------
         subscriptions = list(db.subscriptions.find({"user_id": user_id}))
         debts = list(db.debts.find({"user_id": user_id}))
 
-        df = pd.DataFrame(transactions)
-        if df.empty:
-            df = pd.DataFrame(columns=["amount", "amount_type", "category", "description"])
-
-        # ---------- Categories ----------
-        ESSENTIAL_CATEGORIES = ["Rent", "Utilities", "Healthcare"]
-        VARIABLE_CATEGORIES = ["Dining", "Shopping", "Entertainment"]
-
         # ---------- Calculations ----------
-        total_income = df[df["amount_type"] == "credit"]["amount"].sum()
-        fixed_expenses = df[df["category"].isin(ESSENTIAL_CATEGORIES)]["amount"].sum()
-
-        variable_expenses = df[df["category"].isin(VARIABLE_CATEGORIES)]
-        variable_expenses_summary = variable_expenses.groupby("category")["amount"].sum().to_dict()
-
-        total_subscription_cost = sum(sub.get('cost', 0) for sub in subscriptions)
-        total_debt = sum(debt.get('amount', 0) for debt in debts)
-
-        weighted_interest_rate = (
-            sum(debt['amount'] * debt.get('interest_rate', 0) for debt in debts) / total_debt
-            if total_debt > 0 else 0
+        # Materialized nightly by financial_summary.py; computed live when the stored one is stale
+        summary = get_financial_summary(db, user_id, get_data_version(db, user_id))
+
+        # Payoff outlook at the budgeted debt payment (or the minimums when nothing is budgeted)
+        DEBT_CATEGORIES = ["debt", "debts", "loan", "loans", "emi", "debt_repayment", "loan_repayment"]
+        debt_budget = sum(
+            item.get("allocated_amount", 0) for item in budget_data.get("expenses", [])
+            if item.get("category_id") in DEBT_CATEGORIES
         )
+        debt_payoff = payoff_summary(debts, debt_budget or None)
 
-        def calculate_trend(user_id, amount_type):
-            pipeline = [
-                {"$match": {"user_id": user_id, "amount_type": amount_type}},
-                {"$group": {
-                    "_id": {"$substr": ["$transaction_date", 0, 7]},
-                    "total": {"$sum": "$amount"}
-                }},
-                {"$sort": {"_id": -1}},
-                {"$limit": 3}
-            ]
-            results = db.transactions.aggregate(pipeline)
-            return [{"month": r["_id"], "total": r["total"]} for r in results]
+        # Precomputed nightly by forecast.py; only the next few months are useful in the prompt
+        forecast = get_forecast(db, user_id, months=6)
+        cash_flow_forecast = {
+            "assumptions": forecast["assumptions"],
+            "months": [{key: month[key] for key in ("month", "net", "balance")} for month in forecast["months"]]
+        } if forecast else None
 
         # ---------- Final JSON ----------
         user_data_json = {
@@ -95,18 +80,9 @@ def get_full_user_profile(user_id: str):
                 "currency": currency,
                 "budget": budget_data
             },
-            "financial_summary": {
-                "total_income": total_income,
-                "fixed_expenses": fixed_expenses,
-                "variable_expenses": variable_expenses_summary,
-                "total_subscription_cost": total_subscription_cost,
-                "total_debt": total_debt,
-                "weighted_interest_rate": weighted_interest_rate,
-                "monthly_trends": {
-                    "income_trend": calculate_trend(user_id, "credit"),
-                    "expense_trend": calculate_trend(user_id, "debit")
-                }
-            },
+            "financial_summary": dict(summary, debt_payoff=debt_payoff),
+            "cash_flow_forecast": cash_flow_forecast,
+            "spend_alerts": recent_alerts(db, user_id),
             "subscriptions": subscriptions,
             "debts": debts
         }
@@ -117,26 +93,7 @@ def get_full_user_profile(user_id: str):
         print(f"Error during user profile processing: {ex}")
         return None
 
-def get_date_range_last_month_to_today():
-    today = datetime.datetime.now()
-    first_day_last_month = today.replace(day=1)
-    return first_day_last_month.strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
-
-def get_transactions_between_last_month_and_today(user_id):
-    client = MongoClient(os.environ.get("MONGO_URI"))
-    db = client['finance_ai']
-    start_date, end_date = get_date_range_last_month_to_today()
-    
-    transactions = list(db.transactions.find({
-        "user_id": user_id,
-        "transaction_date": {
-            "$gte": start_date,
-            "$lte": end_date
-        }
-    }))
-    
-    return transactions
-
+@traced()
 def store_message(user_id:str,role:str,message:str):
     client = MongoClient(os.environ.get("MONGO_URI"))
     db = client['finance_ai']
@@ -152,6 +109,7 @@ def store_message(user_id:str,role:str,message:str):
     messages_collection.insert_one(message_data)
     client.close()    
 
+@traced()
 def get_recent_messages(user_id:str):
     client = MongoClient(os.environ.get("MONGO_URI"))
     db = client['finance_ai']
@@ -165,25 +123,41 @@ def get_recent_messages(user_id:str):
 def load_model(query:str,user_id:str):
     llm = ChatGroq(
         model="meta-llama/llama-4-maverick-17b-128e-instruct",
-        api_key=GROQ_API_KEY
+        api_key=GROQ_API_KEY,
+        max_retries=0
     )
     user_data = get_full_user_profile(user_id=user_id)
     # print(user_data)
     user = User(data=user_data)
     recent_messages = get_recent_messages(user_id)
-    recent_expenses = get_transactions_between_last_month_and_today(user_id)
-    # print(recent_expenses)
-    system_prompt = prompt_render(ChatPrompt(user=user,recent_messages=recent_messages,user_expenses=recent_expenses))
+    # Only the rows relevant to this question (plus totals for the period it asks about)
+    relevant_expenses = transaction_context(user_id, query)
+    system_prompt = prompt_render(ChatPrompt(user=user,recent_messages=recent_messages,user_expenses=relevant_expenses))
     messages = [
         SystemMessage(content=system_prompt),
         HumanMessage(content=query)
     ]
-    return llm.invoke(messages)
+    return gateway.invoke(
+        lambda: llm.invoke(messages),
+        key=request_key(llm.model_name, system_prompt, query),
+        estimated_tokens=estimate_tokens(system_prompt, query),
+        usage=langchain_usage,
+        model=llm.model_name
+    )
 
 
 def Chat(query:str,user_id:str) -> str:
     store_message(user_id, "user", query)
+    client = MongoClient(os.environ.get("MONGO_URI"))
+    version = get_data_version(client['finance_ai'], user_id)
+    client.close()
+    # A near-identical question asked since the user's data last changed gets the same answer
+    cached = chat_cache.lookup(user_id, version, query)
+    if cached is not None:
+        store_message(user_id, "assistant", cached)
+        return cached
     response  = load_model(query,user_id=user_id)
+    chat_cache.store(user_id, version, query, response.content)
     store_message(user_id, "assistant", response.content)
     return response.content
     
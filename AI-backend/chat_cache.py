@@ -0,0 +1,145 @@
+import datetime
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from dotenv import load_dotenv
+from categorizer import KEYWORD_CATEGORIES, description_features
+from categories import BUILTIN_ALIASES, PREDEFINED_CATEGORIES, category_id
+from retrieval import detect_time_range
+
+load_dotenv()
+
+# Answers to near-identical chat questions are reused while the user's data version (and the
+# day, since "this month" moves) is unchanged. Questions are compared by cosine similarity of
+# hashed unigram/bigram vectors, the same local features the retrieval index uses.
+CHAT_CACHE_THRESHOLD = float(os.environ.get('CHAT_CACHE_THRESHOLD', 0.8))
+CHAT_CACHE_ENTRIES = int(os.environ.get('CHAT_CACHE_ENTRIES', 32))  # per user, least recently used evicted
+CHAT_CACHE_USERS = int(os.environ.get('CHAT_CACHE_USERS', 256))
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Words a rephrasing may add or drop; every other word must appear in both questions
+FILLER_WORDS = frozenset("""
+a an the and or but so just also please kindly can could would will you me i my mine our we us
+what whats how is are was were be been do did does have has had tell show give let look at it its this that
+to of for on in about with up out some any all much many there here
+""".split())
+
+# The prompt includes recent turns but the cache key does not, so questions that lean on them
+# ("and compare it with last month?") are never cached or answered from the cache
+REFERENCE_WORDS = frozenset("""
+it its that this those these them they same compare compared comparison vs versus previous above earlier
+again else why
+""".split())
+# "this month", "those weeks" name a period, not an earlier answer
+PERIOD_REFERENCE = re.compile(r"\b(?:this|that|these|those)\s+(?:day|week|weekend|month|quarter|year)s?\b")
+FOLLOW_UP_OPENERS = ("and ", "also ", "what about ", "how about ", "then ", "so ")
+CATEGORY_TERMS = frozenset(
+    {category_id(name) for name in PREDEFINED_CATEGORIES} | set(BUILTIN_ALIASES) | set(KEYWORD_CATEGORIES)
+)
+
+_users = OrderedDict()
+_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0, "exact_hits": 0, "follow_ups": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats, users=len(_users), entries=sum(len(entries) for _, _, entries in _users.values()))
+    stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+    return stats
+
+# ---------------------- Query Vectors ---------------------- #
+
+def normalize(query):
+    return " ".join(WORD_PATTERN.findall(str(query).lower()))
+
+def embed(text):
+    """L2-normalized sparse vector {feature: weight} of the text's hashed unigrams and bigrams."""
+    counts = Counter(description_features(text))
+    weights = {feature: 1 + math.log(count) for feature, count in counts.items()}
+    norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+    return {feature: weight / norm for feature, weight in weights.items()}
+
+def similarity(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(feature, 0.0) for feature, weight in a.items())
+
+def signature(text, today):
+    """What must match exactly: the period the question asks about and its key terms.
+
+    "spend on food" and "spend on rent" are close as vectors but need different answers.
+    """
+    return detect_time_range(text, today), frozenset(text.split()) - FILLER_WORDS
+
+def is_follow_up(text):
+    """True when the question refers back to earlier turns instead of naming what it asks about."""
+    words = set(PERIOD_REFERENCE.sub(" ", text).split())
+    if text.startswith(FOLLOW_UP_OPENERS):
+        return True
+    return bool(words & REFERENCE_WORDS) and not words & CATEGORY_TERMS
+
+# ---------------------- Lookups ---------------------- #
+
+def user_entries(user_id, version, today):
+    """The user's entries, emptied when their data version or the day changed. Hold _lock."""
+    cached = _users.get(user_id)
+    if cached is None or cached[:2] != (version, today):
+        if cached is not None and cached[2]:
+            _stats["invalidations"] += 1
+        cached = _users[user_id] = (version, today, OrderedDict())
+    _users.move_to_end(user_id)
+    while len(_users) > CHAT_CACHE_USERS:
+        _users.popitem(last=False)
+    return cached[2]
+
+def lookup(user_id, version, query, today=None):
+    """A cached answer for this question at this data version, or None."""
+    today = today or datetime.date.today()
+    text = normalize(query)
+    if not text:
+        return None
+    if is_follow_up(text):
+        with _lock:
+            _stats["follow_ups"] += 1
+        return None
+    vector, sig = embed(text), signature(text, today)
+    with _lock:
+        _stats["lookups"] += 1
+        entries = user_entries(user_id, version, today)
+        best, best_score = None, CHAT_CACHE_THRESHOLD
+        if text in entries:
+            best, best_score = text, 1.0
+            _stats["exact_hits"] += 1
+        else:
+            for key, entry in entries.items():
+                if entry["signature"] != sig:
+                    continue
+                score = similarity(vector, entry["vector"])
+                if score >= best_score:
+                    best, best_score = key, score
+        if best is None:
+            return None
+        _stats["hits"] += 1
+        entries.move_to_end(best)
+        return entries[best]["answer"]
+
+def store(user_id, version, query, answer, today=None):
+    today = today or datetime.date.today()
+    text = normalize(query)
+    if not text or not answer or is_follow_up(text):
+        return
+    entry = {"vector": embed(text), "signature": signature(text, today), "answer": answer}
+    with _lock:
+        cached = _users.get(user_id)
+        # The data changed while the answer was generated; it describes the old version
+        if cached is not None and cached[:2] != (version, today):
+            return
+        entries = user_entries(user_id, version, today)
+        entries[text] = entry
+        entries.move_to_end(text)
+        _stats["stores"] += 1
+        while len(entries) > CHAT_CACHE_ENTRIES:
+            entries.popitem(last=False)
+            _stats["evictions"] += 1
@@ -0,0 +1,248 @@
+import argparse
+import datetime
+import os
+import sys
+from bson import ObjectId
+from dateutil.relativedelta import relativedelta
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from archive import archive_cutoff
+from indexes import INDEXES, ensure_indexes
+from query_catalog import QUERIES
+
+load_dotenv()
+
+# A throwaway database on a local mongod; it is dropped and reseeded on every run
+PLAN_CHECK_URI = os.environ.get('PLAN_CHECK_URI', 'mongodb://localhost:27017/')
+PLAN_CHECK_DB = "finance_ai_plan_check"
+SEED_USERS = 200
+SEED_MONTHS = 6
+SEED_ARCHIVED_MONTHS = 6
+TRANSACTIONS_PER_MONTH = 20
+SEED_CATEGORIES = ["food", "rent", "transport", "shopping", "utilities", "entertainment", "health", "salary"]
+SEED_SUBSCRIPTIONS = ["Netflix", "Spotify", "Gym"]
+
+# Explains every shape in query_catalog.py against seeded data and the indexes in indexes.py.
+# Exits non-zero when a plan scans a collection, sorts in memory, or examines more than the
+# shape's max_ratio documents (or index keys) per document returned.
+
+# ---------------------- Seed Data ---------------------- #
+
+def month_transactions(user_id, month):
+    docs = []
+    for i in range(TRANSACTIONS_PER_MONTH):
+        category = SEED_CATEGORIES[i % len(SEED_CATEGORIES)]
+        docs.append({
+            "user_id": user_id,
+            "transaction_date": f"{month}-{i + 1:02d}",
+            "amount": float(100 + i),
+            "amount_type": "debit" if i % 10 < 7 else "credit",
+            "category": category.title(),
+            "category_id": category,
+            "description": f"{category} {i}",
+            "transaction_mode": "online"
+        })
+    # Auto-added subscription charges carry a datetime
+    first = datetime.datetime.strptime(month, "%Y-%m")
+    docs.extend(
+        {"user_id": user_id, "amount": 199.0, "amount_type": "expense", "category": "Subscription",
+         "category_id": "subscription", "description": f"Subscription: {name}", "transaction_date": first}
+        for name in SEED_SUBSCRIPTIONS
+    )
+    return docs
+
+def seed_user(user_id, months, archived_months, today):
+    """Documents for one user, by collection."""
+    docs = {"transactions": [], "transactions_archive": [], "monthly_aggregates": [], "chat_memory": [], "spend_alerts": []}
+    for month in months:
+        docs["transactions"].extend(month_transactions(user_id, month))
+    # Older months already moved to the archive tier, some from statement imports
+    for month in archived_months:
+        archived = month_transactions(user_id, month)
+        for i, doc in enumerate(archived[:5]):
+            doc["content_hash"] = f"{user_id}:{month}:{i}"
+        docs["transactions_archive"].extend(archived)
+        totals = {}
+        for doc in archived:
+            key = (doc["amount_type"], doc["category_id"])
+            totals[key] = totals.get(key, 0.0) + doc["amount"]
+        docs["monthly_aggregates"].extend(
+            {"user_id": user_id, "month": month, "amount_type": amount_type, "category_id": category_id, "total": total}
+            for (amount_type, category_id), total in totals.items()
+        )
+    # Written before the category catalog existed
+    docs["transactions"].extend(
+        {"user_id": user_id, "amount": 50.0, "amount_type": "debit", "category": "Food", "transaction_date": f"{months[0]}-0{day}"}
+        for day in (1, 2)
+    )
+    now = datetime.datetime.combine(today, datetime.time(12))
+    for i in range(40):
+        docs["chat_memory"].append({
+            "user_id": user_id, "role": "user" if i % 2 == 0 else "assistant",
+            "message": f"message {i}", "created_at": now - datetime.timedelta(hours=i)
+        })
+    for i in range(24):
+        docs["spend_alerts"].append({
+            "user_id": user_id, "kind": "anomaly", "category_id": "food", "amount": 900.0,
+            "message": f"alert {i}", "dismissed": i % 3 == 0,
+            "created_at": now - datetime.timedelta(days=i * 2)
+        })
+    docs["subscriptions"] = [{"user_id": user_id, "name": name, "cost": 199.0, "usage": "Weekly", "priority": "High"} for name in SEED_SUBSCRIPTIONS]
+    docs["debts"] = [
+        {"user_id": user_id, "name": f"Loan {i}", "amount": 10000.0 * (i + 1), "interest_rate": 10.0 + i,
+         "created_at": now - datetime.timedelta(days=30 * i)}
+        for i in range(3)
+    ]
+    docs["budgets"] = [{"user_id": user_id, "budget_data": {"income": 50000, "savings": 10000, "expenses": [
+        {"category": category.title(), "category_id": category, "allocated_amount": 1000, "frequency": "Monthly"}
+        for category in SEED_CATEGORIES
+    ]}}]
+    docs["user_profiles"] = [{"user_id": user_id, "cash_holdings": 1000, "online_holdings": 5000}]
+    docs["monthly_budgets"] = [{"user_id": user_id, "month": month, "budget_data": []} for month in months[:-1]]
+    docs["cash_flow_forecasts"] = [{"user_id": user_id, "data_version": 1, "base_month": months[-1], "generated_at": now}]
+    docs["financial_summaries"] = [{"user_id": user_id, "summary": {}, "data_version": 1, "month": months[-1]}]
+    docs["data_versions"] = [{"_id": user_id, "version": 1}]
+    docs["recommendations"] = [{"_id": user_id, "content": "", "data_version": 1}]
+    docs["categorizer_models"] = [{"_id": user_id, "counts": {}}]
+    docs["spend_stats"] = [{"_id": f"{user_id}:{category}", "n": 10, "mean": 100.0, "m2": 50.0} for category in SEED_CATEGORIES]
+    return docs
+
+def seed(db, today):
+    """Fill the database and return the sample values the query builders take."""
+    all_months = [(today.replace(day=1) - relativedelta(months=offset)).strftime("%Y-%m") for offset in reversed(range(SEED_ARCHIVED_MONTHS + SEED_MONTHS))]
+    archived_months, months = all_months[:SEED_ARCHIVED_MONTHS], all_months[SEED_ARCHIVED_MONTHS:]
+    users = [{"_id": ObjectId(), "username": f"user{i}@example.com", "password": "x"} for i in range(SEED_USERS)]
+    db.users.insert_many(users)
+    user_ids = sorted(str(user["_id"]) for user in users)
+    for user_id in user_ids:
+        for collection, docs in seed_user(user_id, months, archived_months, today).items():
+            db[collection].insert_many(docs)
+    db.job_runs.insert_one({"_id": f"month_close:{months[-2]}", "status": "completed"})
+
+    user_id = user_ids[SEED_USERS // 2]
+    month_first = datetime.datetime.strptime(months[-1], "%Y-%m")
+    next_month_first = month_first + relativedelta(months=1)
+    recent = db.transactions.find({"user_id": user_id}, {"_id": 1}).sort("_id", -1).skip(TRANSACTIONS_PER_MONTH).limit(1)
+    return {
+        "user_id": user_id,
+        "user_ids": user_ids[40:60],
+        "lower_user_id": user_ids[50],
+        "upper_user_id": user_ids[100],
+        "username": users[0]["username"],
+        "user_object_id": users[0]["_id"],
+        "month_first": month_first,
+        "next_month_first": next_month_first,
+        "month_start": month_first.strftime("%Y-%m-%d"),
+        "month_end": next_month_first.strftime("%Y-%m-%d"),
+        "previous_month": months[-2],
+        "previous_month_start": f"{months[-2]}-01",
+        "history_start": f"{months[-4]}-01",
+        "export_start": f"{months[1]}-01",
+        "export_end": f"{months[-1]}-01",
+        "category_ids": SEED_CATEGORIES[:2],
+        "subscription_descriptions": [f"Subscription: {name}" for name in SEED_SUBSCRIPTIONS],
+        "recent_transaction_id": next(recent)["_id"],
+        "subscription_id": db.subscriptions.find_one({"user_id": user_id})["_id"],
+        "alert_id": db.spend_alerts.find_one({"user_id": user_id})["_id"],
+        "alerts_since": datetime.datetime.combine(today, datetime.time(12)) - datetime.timedelta(days=30),
+        "spend_stats_id": f"{user_id}:food",
+        "legacy_category": "Food",
+        "job_id": f"month_close:{months[-2]}",
+        # A cutoff one month short of the hot data, so the oldest seeded month is due for archiving
+        "cold_cutoff": archive_cutoff(today, SEED_MONTHS - 1),
+        "archive_month_start": datetime.datetime.strptime(archived_months[1], "%Y-%m"),
+        "archive_month_end": datetime.datetime.strptime(archived_months[2], "%Y-%m"),
+        "archive_start": f"{archived_months[0]}-01",
+        "archive_end": f"{months[0]}-01",
+        "content_hashes": [f"{user_id}:{archived_months[0]}:{i}" for i in range(3)] + ["not-archived"],
+    }
+
+# ---------------------- Plans ---------------------- #
+
+def leading_find(pipeline):
+    """The part of a pipeline an index can serve: its leading $match, $sort and $limit."""
+    shape = {}
+    for stage in pipeline:
+        (operator, value), = stage.items()
+        key = {"$match": "filter", "$sort": "sort", "$limit": "limit"}.get(operator)
+        if key is None or key in shape:
+            break
+        shape[key] = value
+    return shape
+
+def explain(db, collection, shape):
+    if "pipeline" in shape:
+        shape = leading_find(shape["pipeline"])
+    command = {"find": collection, "filter": shape.get("filter", {})}
+    for key in ("projection", "sort", "limit"):
+        if shape.get(key) is not None:
+            command[key] = shape[key]
+    return db.command({"explain": command, "verbosity": "executionStats"})
+
+def plan_nodes(plan):
+    """Every stage of a winning plan, root first."""
+    plan = plan.get("queryPlan", plan)
+    nodes = [plan]
+    children = list(plan.get("inputStages", []))
+    if "inputStage" in plan:
+        children.append(plan["inputStage"])
+    for child in children:
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+def check_plan(entry, result):
+    """(stage names, index names, examined per returned, problems) for one explained query."""
+    nodes = plan_nodes(result["queryPlanner"]["winningPlan"])
+    stages = [node["stage"] for node in nodes]
+    index_names = {node["indexName"] for node in nodes if "indexName" in node}
+    stats = result["executionStats"]
+    examined = max(stats["totalDocsExamined"], stats["totalKeysExamined"])
+    ratio = examined / max(stats["nReturned"], 1)
+
+    problems = []
+    if "COLLSCAN" in stages and not entry["full_scan"]:
+        problems.append("collection scan")
+    if "SORT" in stages:
+        problems.append("in-memory sort")
+    if not entry["full_scan"] and ratio > entry["max_ratio"]:
+        problems.append(f"examined {examined} for {stats['nReturned']} returned")
+    return stages, index_names, ratio, problems
+
+def run_checks(db, params):
+    """Print one line per query shape; returns the number of shapes with problems."""
+    failures = 0
+    used = set()
+    for name, entry in sorted(QUERIES.items()):
+        result = explain(db, entry["collection"], entry["build"](params))
+        stages, index_names, ratio, problems = check_plan(entry, result)
+        used |= {(entry["collection"], index_name) for index_name in index_names}
+        status = "FAIL" if problems else "ok"
+        print(f"{status:4} {name:45} {' > '.join(stages):40} {ratio:6.2f}  {'; '.join(problems)}")
+        if problems:
+            failures += 1
+            print(f"     used by {entry['source']}")
+
+    for collection in INDEXES:
+        for index_name in db[collection].index_information():
+            if index_name != "_id_" and (collection, index_name) not in used:
+                print(f"note {collection}.{index_name} is not used by any catalogued query")
+    return failures
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Explain every catalogued query against a seeded database and fail on bad plans")
+    arg_parser.add_argument("--uri", default=PLAN_CHECK_URI, help="MongoDB to seed (default: PLAN_CHECK_URI or localhost)")
+    arg_parser.add_argument("--keep", action="store_true", help="Leave the seeded database in place afterwards")
+    args = arg_parser.parse_args()
+
+    client = MongoClient(args.uri)
+    client.drop_database(PLAN_CHECK_DB)
+    db = client[PLAN_CHECK_DB]
+    try:
+        ensure_indexes(db)
+        failures = run_checks(db, seed(db, datetime.date.today()))
+    finally:
+        if not args.keep:
+            client.drop_database(PLAN_CHECK_DB)
+        client.close()
+    print(f"{len(QUERIES)} query shapes checked, {failures} with problems")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,44 @@
+import contextvars
+import time
+from pymongo import monitoring
+
+# Counts and times the Mongo commands issued while handling one request, so responses can report
+# them in a Server-Timing header. Registered globally: import this before any MongoClient is created.
+
+_stats = contextvars.ContextVar("command_stats", default=None)
+
+class CommandStats(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.record(event)
+
+    def failed(self, event):
+        self.record(event)
+
+    @staticmethod
+    def record(event):
+        stats = _stats.get()
+        if stats is None:
+            return
+        stats["count"] += 1
+        stats["ms"] += event.duration_micros / 1000
+        stats["commands"][event.command_name] = stats["commands"].get(event.command_name, 0) + 1
+
+monitoring.register(CommandStats())
+
+def begin():
+    """Start counting for the current request; returns the token for `end`."""
+    return _stats.set({"count": 0, "ms": 0.0, "commands": {}, "started": time.perf_counter()})
+
+def current():
+    return _stats.get()
+
+def end(token):
+    _stats.reset(token)
+
+def server_timing(stats):
+    """Server-Timing header value: total handler time plus Mongo time and command count."""
+    total_ms = (time.perf_counter() - stats["started"]) * 1000
+    return f'app;dur={total_ms:.1f}, db;dur={stats["ms"]:.1f};desc="{stats["count"]} commands"'
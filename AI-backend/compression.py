@@ -0,0 +1,35 @@
+import gzip
+import io
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Largest request body accepted after decompression (guards against gzip bombs)
+MAX_INFLATED_BYTES = int(os.environ.get('MAX_INFLATED_BYTES', 32 * 1024 * 1024))
+
+class GzipRequestMiddleware:
+    """WSGI middleware that inflates request bodies sent with Content-Encoding: gzip."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        if environ.get("HTTP_CONTENT_ENCODING", "").strip().lower() == "gzip":
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            compressed = environ["wsgi.input"].read(length) if length else environ["wsgi.input"].read()
+            try:
+                body = gzip.GzipFile(fileobj=io.BytesIO(compressed)).read(MAX_INFLATED_BYTES + 1)
+            except (OSError, EOFError):
+                return self.reject(start_response, "400 Bad Request", b'{"error": "Malformed gzip body"}')
+            if len(body) > MAX_INFLATED_BYTES:
+                return self.reject(start_response, "413 Request Entity Too Large", b'{"error": "Request body too large"}')
+            environ["wsgi.input"] = io.BytesIO(body)
+            environ["CONTENT_LENGTH"] = str(len(body))
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.app(environ, start_response)
+
+    @staticmethod
+    def reject(start_response, status, body):
+        start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+        return [body]
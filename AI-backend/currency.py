@@ -0,0 +1,159 @@
+import csv
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Transactions keep the currency they were made in; reads convert amounts to the user's reporting
+# currency (user_profiles.currency). Rates come from a local CSV of date-effective rows
+# `effective_date,currency,rate`, where `rate` is units of FX_BASE_CURRENCY per unit of `currency`
+# from that date until the currency's next row. The table is loaded once and reloaded when the
+# file changes; conversion looks rates up for whole arrays with np.searchsorted.
+FX_BASE_CURRENCY = os.environ.get('FX_BASE_CURRENCY', 'INR')
+FX_RATES_FILE = os.environ.get('FX_RATES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fx_rates.csv'))
+# Used when a profile has no currency set, and for rows written before currencies were recorded
+# that backfill_currencies.py has not stamped yet (the app only showed amounts in rupees then)
+DEFAULT_CURRENCY = os.environ.get('DEFAULT_CURRENCY', 'INR')
+
+_table = {"mtime": None, "rates": {}}
+_table_lock = threading.Lock()
+
+# ---------------------- Codes ---------------------- #
+
+def currency_code(label):
+    """ISO code from a profile label such as "INR - Indian Rupee" (or a bare code)."""
+    code = str(label or "").split(" - ")[0].strip().upper()
+    return code or DEFAULT_CURRENCY
+
+def user_currency(db, user_id):
+    profile = db.user_profiles.find_one({"user_id": user_id}, {"currency": 1}) or {}
+    return currency_code(profile.get("currency"))
+
+def user_currencies(db, user_match):
+    """Reporting currency per user for every profile matching `user_match` (an id or a filter)."""
+    return {
+        doc["user_id"]: currency_code(doc.get("currency"))
+        for doc in db.user_profiles.find({"user_id": user_match}, {"user_id": 1, "currency": 1})
+    }
+
+# ---------------------- Rate Table ---------------------- #
+
+def load_rates(path=FX_RATES_FILE):
+    """{code: (effective dates, rates)} sorted by date, reloaded when the file changes."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _table_lock:
+        if _table["mtime"] != mtime:
+            rows = {}
+            with open(path, newline="", encoding="utf-8") as source:
+                for row in csv.DictReader(source):
+                    rows.setdefault(row["currency"].strip().upper(), []).append((row["effective_date"].strip(), float(row["rate"])))
+            rates = {}
+            for code, entries in rows.items():
+                entries.sort()
+                rates[code] = (
+                    np.array([day for day, _ in entries], dtype="datetime64[D]"),
+                    np.array([rate for _, rate in entries], dtype=np.float64)
+                )
+            _table.update(mtime=mtime, rates=rates)
+        return _table["rates"]
+
+def known_currencies():
+    return {FX_BASE_CURRENCY} | set(load_rates())
+
+def base_rates(codes, dates):
+    """Units of the base currency per unit of each code on each date.
+
+    Dates before a currency's first row use its first rate; missing dates use its latest.
+    """
+    rates = np.ones(len(codes), dtype=np.float64)
+    table = load_rates()
+    for code in np.unique(codes):
+        if code == FX_BASE_CURRENCY or code not in table:
+            continue
+        effective, values = table[code]
+        mask = codes == code
+        days = dates[mask]
+        index = np.searchsorted(effective, days, side="right") - 1
+        index = np.where(np.isnat(days), len(values) - 1, np.clip(index, 0, len(values) - 1))
+        rates[mask] = values[index]
+    return rates
+
+# ---------------------- Conversion ---------------------- #
+
+def as_days(dates):
+    """datetime64[D] array from dates, datetimes or YYYY-MM(-DD) strings (unparseable ones are NaT)."""
+    try:
+        return np.array(dates, dtype="datetime64[D]")
+    except (TypeError, ValueError):
+        pass
+    # Only reached when some value is malformed
+    days = np.empty(len(dates), dtype="datetime64[D]")
+    for i, value in enumerate(dates):
+        try:
+            days[i] = np.datetime64(str(value)[:10] if isinstance(value, str) else value, "D")
+        except (TypeError, ValueError):
+            days[i] = np.datetime64("NaT")
+    return days
+
+def currency_codes(currencies, targets):
+    """Normalized codes for a whole column; missing ones are DEFAULT_CURRENCY and codes without rates become the row's target."""
+    codes = np.array(currencies, dtype=object)
+    codes = np.where(codes.astype(bool), codes, DEFAULT_CURRENCY)
+    labels, inverse = np.unique(codes.astype(str), return_inverse=True)
+    known = known_currencies()
+    normalized = np.array([code if code in known else "" for code in map(currency_code, labels)], dtype=object)[inverse]
+    # A target without rates leaves its rows as they are
+    usable = np.isin(targets.astype(str), list(known))
+    return np.where(normalized.astype(bool) & usable, normalized, targets)
+
+def convert(amounts, currencies, dates, to):
+    """Convert whole arrays of amounts at the rates effective on their dates.
+
+    `to` is one currency code, or one per amount (batch jobs covering many users). Missing
+    currencies (rows backfill_currencies.py has not stamped yet) are taken as DEFAULT_CURRENCY,
+    never as `to`, so changing the profile currency does not relabel old amounts.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    if len(amounts) == 0:
+        return amounts
+    targets = np.empty(len(amounts), dtype=object)
+    targets[:] = to
+    codes = currency_codes(currencies, targets)
+    if (codes == targets).all():
+        return amounts
+    days = as_days(dates)
+    return amounts * base_rates(codes, days) / base_rates(targets, days)
+
+def convert_rows(rows, to, amount="amount", date="transaction_date"):
+    """Convert the `amount` of a list of documents in place; each keeps `currency` and `original_amount`."""
+    if not rows:
+        return rows
+    currencies = [row.get("currency") for row in rows]
+    originals = np.array([float(row.get(amount) or 0) for row in rows])
+    converted = convert(originals, currencies, [row.get(date) for row in rows], to)
+    for row, code, original, value in zip(rows, currencies, originals.tolist(), converted.round(2).tolist()):
+        row["currency"] = code or DEFAULT_CURRENCY
+        row["original_amount"] = original
+        row[amount] = value
+    return rows
+
+def convert_totals(rows, to, amount="total", month="month", currency="currency"):
+    """Convert grouped totals in place; a month's total converts at the rate effective on its first day.
+
+    `to` is one currency code or one per row.
+    """
+    if rows:
+        converted = convert(
+            [row[amount] for row in rows],
+            [row.get(currency) for row in rows],
+            [f"{row[month]}-01" if row.get(month) else None for row in rows],
+            to
+        )
+        for row, value in zip(rows, converted.tolist()):
+            row[amount] = value
+    return rows
@@ -0,0 +1,197 @@
+import datetime
+import os
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+
+MAX_MONTHS = 600
+# Minimum due each month on every open debt: that month's interest plus this share of the balance
+MIN_PRINCIPAL_SHARE = 0.01
+STRATEGIES = ("avalanche", "snowball", "custom")
+PRIORITY_RANK = {"High": 0, "Medium": 1, "Low": 2}
+SWEEP_LEVELS = 25
+EPSILON = 0.005
+
+# ---------------------- Orders ---------------------- #
+
+def strategy_order(strategy, balances, rates, priorities=None, custom_order=None):
+    """Debt indices in the order extra money is applied for a strategy."""
+    if strategy == "avalanche":
+        return np.lexsort((balances, -rates))
+    if strategy == "snowball":
+        return np.lexsort((-rates, balances))
+    if strategy == "custom":
+        # The debt's own priority (then rate) decides, after any explicitly ordered debts
+        ranks = np.array([PRIORITY_RANK.get(p, 1) for p in priorities]) if priorities else np.ones(len(balances))
+        by_priority = np.lexsort((balances, -rates, ranks))
+        ranked = [i for i in (custom_order or []) if 0 <= i < len(balances)]
+        return np.array(ranked + [i for i in by_priority if i not in ranked], dtype=np.int64)
+    raise ValueError(f"Unknown payoff strategy: {strategy}")
+
+# ---------------------- Simulation ---------------------- #
+
+def simulate(balances, annual_rates, orders, payments, max_months=MAX_MONTHS, keep_schedule=False):
+    """Simulate every scenario (one payment order and monthly payment each) month by month.
+
+    balances and annual_rates have shape (D,), orders (S, D) and payments (S,). Returns per-scenario
+    payoff month (-1 if never), total interest, per-debt payoff months and interest, and optionally the
+    (months, S, D) balance and payment schedules.
+    """
+    orders = np.asarray(orders, dtype=np.int64)
+    payments = np.asarray(payments, dtype=np.float64)
+    scenarios, debts = orders.shape
+    balance = np.broadcast_to(np.asarray(balances, dtype=np.float64), (scenarios, debts)).copy()
+    monthly_rate = np.asarray(annual_rates, dtype=np.float64) / 100 / 12
+
+    interest_paid = np.zeros((scenarios, debts))
+    debt_payoff = np.where(balance > EPSILON, -1, 0)
+    payoff = np.full(scenarios, -1)
+    balance_history, payment_history = [], []
+
+    for month in range(1, max_months + 1):
+        open_debts = balance > EPSILON
+        if not open_debts.any():
+            break
+        interest = balance * monthly_rate
+        balance += interest
+        interest_paid += interest
+
+        minimum = np.minimum(balance, interest + MIN_PRINCIPAL_SHARE * balance) * open_debts
+        minimum_total = minimum.sum(axis=1)
+        # A payment below the minimums is spread across debts pro rata
+        scale = np.where(minimum_total > payments, payments / np.maximum(minimum_total, EPSILON), 1.0)
+        paid = minimum * scale[:, None]
+        extra = np.maximum(payments - paid.sum(axis=1), 0)
+
+        # Extra money fills remaining balances in each scenario's order (cumulative sum over the sorted debts)
+        remaining = np.take_along_axis(balance - paid, orders, axis=1)
+        before = np.cumsum(remaining, axis=1) - remaining
+        allocated = np.clip(extra[:, None] - before, 0, remaining)
+        np.put_along_axis(paid, orders, np.take_along_axis(paid, orders, axis=1) + allocated, axis=1)
+
+        balance -= paid
+        balance[balance <= EPSILON] = 0.0
+        debt_payoff = np.where((debt_payoff < 0) & (balance == 0), month, debt_payoff)
+        payoff = np.where((payoff < 0) & ~(balance > 0).any(axis=1), month, payoff)
+        if keep_schedule:
+            balance_history.append(balance.copy())
+            payment_history.append(paid)
+
+    result = {
+        "payoff_month": payoff,
+        "total_interest": interest_paid.sum(axis=1),
+        "debt_payoff_month": debt_payoff,
+        "debt_interest": interest_paid,
+    }
+    if keep_schedule:
+        result["balances"] = np.array(balance_history)
+        result["payments"] = np.array(payment_history)
+    return result
+
+# ---------------------- Plans ---------------------- #
+
+def month_label(start, offset):
+    index = start.year * 12 + start.month - 1 + offset
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def minimum_payment(debts):
+    balances = np.array([float(d.get("amount", 0)) for d in debts])
+    rates = np.array([float(d.get("interest_rate", 0)) for d in debts]) / 100 / 12
+    return float((balances * rates + MIN_PRINCIPAL_SHARE * balances * (1 + rates)).sum())
+
+def payoff_plan(debts, monthly_payment, custom_order=None, sweep=True, today=None):
+    """Compare payoff strategies for a list of debt documents at one monthly payment.
+
+    Also sweeps a range of payment levels (all strategies at once) so the page can show what
+    paying more buys.
+    """
+    debts = [d for d in debts if float(d.get("amount", 0)) > 0]
+    today = today or datetime.date.today()
+    if not debts:
+        return {"strategies": {}, "sweep": [], "minimum_payment": 0.0}
+
+    balances = np.array([float(d.get("amount", 0)) for d in debts])
+    rates = np.array([float(d.get("interest_rate", 0)) for d in debts])
+    priorities = [d.get("priority") for d in debts]
+    names = [d.get("name") for d in debts]
+    # custom_order lists debt names; debts it leaves out follow in priority order
+    custom_indices = [names.index(name) for name in custom_order if name in names] if custom_order else None
+    orders = np.array([strategy_order(s, balances, rates, priorities, custom_indices) for s in STRATEGIES])
+
+    plan = simulate(balances, rates, orders, np.full(len(STRATEGIES), float(monthly_payment)), keep_schedule=True)
+    strategies = {}
+    for s, name in enumerate(STRATEGIES):
+        months = int(plan["payoff_month"][s])
+        horizon = months if months > 0 else len(plan["balances"])
+        strategies[name] = {
+            "months": months if months > 0 else None,
+            "payoff_date": month_label(today, months) if months > 0 else None,
+            "total_interest": round(float(plan["total_interest"][s]), 2),
+            "order": [debts[i].get("name") for i in orders[s]],
+            "debts": [
+                {
+                    "name": debt.get("name"),
+                    "payoff_date": month_label(today, int(plan["debt_payoff_month"][s, d])) if plan["debt_payoff_month"][s, d] > 0 else None,
+                    "interest": round(float(plan["debt_interest"][s, d]), 2)
+                }
+                for d, debt in enumerate(debts)
+            ],
+            "schedule": [
+                {
+                    "month": month_label(today, m + 1),
+                    "payment": round(float(plan["payments"][m, s].sum()), 2),
+                    "balance": round(float(plan["balances"][m, s].sum()), 2)
+                }
+                for m in range(horizon)
+            ]
+        }
+
+    result = {"strategies": strategies, "sweep": [], "minimum_payment": round(minimum_payment(debts), 2)}
+    if sweep:
+        result["sweep"] = payment_sweep(balances, rates, orders, result["minimum_payment"], float(monthly_payment))
+    return result
+
+def payment_sweep(balances, rates, orders, minimum, monthly_payment, levels=SWEEP_LEVELS):
+    """Months to payoff and interest for every strategy across a range of monthly payments."""
+    top = max(monthly_payment, minimum) * 2
+    payments = np.linspace(max(minimum, 1.0), top, levels)
+    # Scenario s * levels + l runs strategy s at payment level l
+    sweep = simulate(balances, rates, np.repeat(orders, levels, axis=0), np.tile(payments, len(orders)))
+    rows = []
+    for level, payment in enumerate(payments):
+        row = {"monthly_payment": round(float(payment), 2)}
+        for s, name in enumerate(STRATEGIES):
+            months = int(sweep["payoff_month"][s * levels + level])
+            row[f"{name}_months"] = months if months > 0 else None
+            row[f"{name}_interest"] = round(float(sweep["total_interest"][s * levels + level]), 2)
+        rows.append(row)
+    return rows
+
+def payoff_summary(debts, monthly_payment=None):
+    """Compact avalanche/snowball comparison for the chat context."""
+    if not debts:
+        return None
+    payment = monthly_payment or minimum_payment(debts)
+    plan = payoff_plan(debts, payment, sweep=False)
+    if not plan["strategies"]:
+        # Every debt is paid off (or was recorded at 0)
+        return None
+    return {
+        "monthly_payment": round(float(payment), 2),
+        **{
+            name: {key: plan["strategies"][name][key] for key in ("months", "payoff_date", "total_interest")}
+            for name in ("avalanche", "snowball")
+        }
+    }
+
+def user_payoff_plan(user_id, monthly_payment, custom_order=None):
+    client = MongoClient(MONGO_URI)
+    try:
+        debts = list(client['finance_ai'].debts.find({"user_id": user_id}, {"_id": 0, "user_id": 0}).sort("created_at", 1))
+    finally:
+        client.close()
+    return payoff_plan(debts, monthly_payment, custom_order=custom_order)
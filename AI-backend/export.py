@@ -0,0 +1,139 @@
+import csv
+import datetime
+import importlib.util
+import io
+import os
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from archive import date_range, find_transactions
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 5000))
+
+# Amounts are exported as recorded, next to the currency they were made in
+EXPORT_FIELDS = ["transaction_date", "amount", "currency", "amount_type", "category", "category_id", "transaction_mode", "description"]
+
+# ---------------------- Query ---------------------- #
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d") if value else None
+
+def export_query(user_id, start_date=None, end_date=None, category_ids=None):
+    """Filter for [start_date, end_date) (YYYY-MM-DD, either may be omitted) and the given categories."""
+    query = {"user_id": user_id}
+    start, end = parse_date(start_date), parse_date(end_date)
+    if start or end:
+        query["$or"] = date_range("transaction_date", start, end)
+    if category_ids:
+        query["category_id"] = {"$in": list(category_ids)}
+    return query
+
+def export_row(doc):
+    row = {field: doc.get(field) for field in EXPORT_FIELDS}
+    # Auto-added subscription charges store a datetime rather than a YYYY-MM-DD string
+    if isinstance(row["transaction_date"], (datetime.date, datetime.datetime)):
+        row["transaction_date"] = row["transaction_date"].strftime("%Y-%m-%d")
+    if row["amount"] is not None:
+        row["amount"] = float(row["amount"])
+    return row
+
+def iter_batches(query, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of export rows from a projected cursor; only one batch is held in memory."""
+    client = MongoClient(MONGO_URI)
+    try:
+        projection = {field: 1 for field in EXPORT_FIELDS}
+        projection["_id"] = 0
+        batch = []
+        for doc in find_transactions(client['finance_ai'], query, projection, sort_by_date=True, batch_size=batch_size):
+            batch.append(export_row(doc))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        client.close()
+
+# ---------------------- Writers ---------------------- #
+
+def stream_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the response as they are produced."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_parquet(batches):
+    # pyarrow is only needed for Parquet exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("transaction_date", pa.string()),
+        ("amount", pa.float64()),
+        ("currency", pa.string()),
+        ("amount_type", pa.string()),
+        ("category", pa.string()),
+        ("category_id", pa.string()),
+        ("transaction_mode", pa.string()),
+        ("description", pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    for batch in batches:
+        # One row group per batch, flushed to the client straight away
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv"),
+    "parquet": (stream_parquet, "application/vnd.apache.parquet"),
+}
+
+def export_transactions(user_id, fmt="csv", start_date=None, end_date=None, category_ids=None):
+    """Return (chunk generator, mimetype) for a streamed export of the user's transactions."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    # Checked before streaming starts; once the 200 headers are out an ImportError would only
+    # truncate the download
+    if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise ValueError("Parquet export needs pyarrow installed on the server")
+    writer, mimetype = EXPORT_FORMATS[fmt]
+    batches = iter_batches(export_query(user_id, start_date, end_date, category_ids))
+    return writer(batches), mimetype
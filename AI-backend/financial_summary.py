@@ -0,0 +1,220 @@
+import argparse
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dateutil.relativedelta import relativedelta
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from currency import convert_totals, user_currencies
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+SUMMARY_WORKERS = int(os.environ.get('SUMMARY_WORKERS', os.cpu_count() or 1))
+SUMMARY_PARTITION_SIZE = int(os.environ.get('SUMMARY_PARTITION_SIZE', 2000))
+
+ESSENTIAL_CATEGORIES = ["rent", "utilities", "healthcare"]
+VARIABLE_CATEGORIES = ["dining", "shopping", "entertainment"]
+TREND_MONTHS = 3
+
+# ---------------------- Aggregations ---------------------- #
+# Each pipeline is grouped by user_id, so the same code serves one user (chat) or a range of users (batch).
+
+def month_bounds(month):
+    start = datetime.datetime.strptime(month, "%Y-%m")
+    return start.strftime("%Y-%m-%d"), (start + relativedelta(months=1)).strftime("%Y-%m-%d")
+
+# The *_pipeline builders are shared with query_catalog.py, so the plan check explains exactly these
+
+def category_totals_pipeline(user_match, month):
+    start, end = month_bounds(month)
+    return [
+        {"$match": {"user_id": user_match, "transaction_date": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "amount_type": "$amount_type", "category_id": "$category_id", "currency": "$currency"},
+            "total": {"$sum": "$amount"}
+        }}
+    ]
+
+def category_totals(db, user_match, month):
+    return db.transactions.aggregate(category_totals_pipeline(user_match, month), allowDiskUse=True)
+
+def monthly_trends_pipeline(user_match):
+    """Monthly totals per user, amount type and currency, newest month first.
+
+    Currencies are converted in Python (see collect_summaries), so the last TREND_MONTHS are
+    picked there rather than with $slice.
+    """
+    return [
+        {"$match": {"user_id": user_match, "transaction_date": {"$type": "string"}, "amount_type": {"$in": ["credit", "debit"]}}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "amount_type": "$amount_type", "month": {"$substrBytes": ["$transaction_date", 0, 7]}, "currency": "$currency"},
+            "total": {"$sum": "$amount"}
+        }},
+        {"$sort": {"_id.month": -1}},
+        {"$group": {
+            "_id": {"user_id": "$_id.user_id", "amount_type": "$_id.amount_type"},
+            "months": {"$push": {"month": "$_id.month", "currency": "$_id.currency", "total": "$total"}}
+        }}
+    ]
+
+def monthly_trends(db, user_match):
+    return db.transactions.aggregate(monthly_trends_pipeline(user_match), allowDiskUse=True)
+
+def latest_months(entries, count=TREND_MONTHS):
+    """Fold converted per-currency entries (newest first) into the last `count` monthly totals."""
+    totals = {}
+    for entry in entries:
+        if entry["month"] not in totals and len(totals) == count:
+            break
+        totals[entry["month"]] = totals.get(entry["month"], 0) + entry["total"]
+    return [{"month": month, "total": total} for month, total in totals.items()]
+
+def subscription_totals_pipeline(user_match):
+    return [
+        {"$match": {"user_id": user_match}},
+        {"$group": {"_id": "$user_id", "cost": {"$sum": "$cost"}}}
+    ]
+
+def subscription_totals(db, user_match):
+    return db.subscriptions.aggregate(subscription_totals_pipeline(user_match))
+
+def debt_totals_pipeline(user_match):
+    return [
+        {"$match": {"user_id": user_match}},
+        {"$group": {
+            "_id": "$user_id",
+            "total": {"$sum": "$amount"},
+            "weighted": {"$sum": {"$multiply": ["$amount", {"$ifNull": ["$interest_rate", 0]}]}}
+        }}
+    ]
+
+def debt_totals(db, user_match):
+    return db.debts.aggregate(debt_totals_pipeline(user_match))
+
+# ---------------------- Summary ---------------------- #
+
+def summarize(category_rows, trends, subscription_cost, total_debt, weighted_debt):
+    """The financial_summary block of the chat profile, from pre-aggregated inputs."""
+    total_income = sum(row["total"] for row in category_rows if row["amount_type"] == "credit")
+    fixed_expenses = sum(row["total"] for row in category_rows if row["category_id"] in ESSENTIAL_CATEGORIES)
+    variable_expenses = {}
+    for row in category_rows:
+        if row["category_id"] in VARIABLE_CATEGORIES:
+            variable_expenses[row["category_id"]] = variable_expenses.get(row["category_id"], 0) + row["total"]
+
+    return {
+        "total_income": total_income,
+        "fixed_expenses": fixed_expenses,
+        "variable_expenses": variable_expenses,
+        "total_subscription_cost": subscription_cost,
+        "total_debt": total_debt,
+        "weighted_interest_rate": weighted_debt / total_debt if total_debt > 0 else 0,
+        "monthly_trends": {
+            "income_trend": trends.get("credit", []),
+            "expense_trend": trends.get("debit", [])
+        }
+    }
+
+def collect_summaries(db, user_match, month):
+    """Run the four aggregations for every user matching `user_match` and summarize each user."""
+    inputs = {}
+
+    def user_inputs(user_id):
+        return inputs.setdefault(user_id, {"categories": [], "trends": {}, "subscriptions": 0, "debt": 0, "weighted": 0})
+
+    # Every total is converted to its user's currency in one vectorized pass per aggregation
+    currencies = user_currencies(db, user_match)
+    category_rows = [
+        dict(row["_id"], total=row["total"], month=month)
+        for row in category_totals(db, user_match, month)
+    ]
+    convert_totals(category_rows, [currencies.get(row["user_id"]) or "" for row in category_rows])
+    for row in category_rows:
+        user_inputs(row["user_id"])["categories"].append(
+            {"amount_type": row.get("amount_type"), "category_id": row.get("category_id"), "total": row["total"]}
+        )
+    trends = list(monthly_trends(db, user_match))
+    entries = [dict(entry, user_id=row["_id"]["user_id"]) for row in trends for entry in row["months"]]
+    convert_totals(entries, [currencies.get(entry["user_id"]) or "" for entry in entries])
+    offset = 0
+    for row in trends:
+        converted = entries[offset:offset + len(row["months"])]
+        offset += len(row["months"])
+        user_inputs(row["_id"]["user_id"])["trends"][row["_id"]["amount_type"]] = latest_months(converted)
+    for row in subscription_totals(db, user_match):
+        user_inputs(row["_id"])["subscriptions"] = row["cost"]
+    for row in debt_totals(db, user_match):
+        user_inputs(row["_id"]).update(debt=row["total"], weighted=row["weighted"])
+
+    return {
+        user_id: summarize(data["categories"], data["trends"], data["subscriptions"], data["debt"], data["weighted"])
+        for user_id, data in inputs.items()
+    }
+
+def current_month():
+    return datetime.date.today().strftime("%Y-%m")
+
+def get_financial_summary(db, user_id, version):
+    """The stored summary when it was built from this data version this month, else computed live."""
+    month = current_month()
+    stored = db.financial_summaries.find_one({"user_id": user_id}, {"summary": 1, "data_version": 1, "month": 1})
+    if stored and stored.get("data_version") == version and stored.get("month") == month:
+        return stored["summary"]
+    return collect_summaries(db, user_id, month).get(user_id) or summarize([], {}, 0, 0, 0)
+
+# ---------------------- Batch Job ---------------------- #
+
+def summarize_partition(bounds):
+    """Worker: summarize users with lower <= user_id < upper (upper None = no limit) and store them."""
+    lower, upper, month = bounds
+    client = MongoClient(MONGO_URI)
+    db = client['finance_ai']
+    try:
+        user_match = {"$gte": lower} if upper is None else {"$gte": lower, "$lt": upper}
+        user_ids = [doc["user_id"] for doc in db.user_profiles.find({"user_id": user_match}, {"user_id": 1})]
+        # Versions are read before the data, so a concurrent write leaves the summary marked stale
+        versions = {doc["_id"]: doc.get("version", 0) for doc in db.data_versions.find({"_id": {"$in": user_ids}})}
+        summaries = collect_summaries(db, user_match, month)
+        generated_at = datetime.datetime.now(datetime.timezone.utc)
+        operations = [
+            UpdateOne(
+                {"user_id": user_id},
+                {"$set": {
+                    "summary": summaries.get(user_id) or summarize([], {}, 0, 0, 0),
+                    "month": month,
+                    "data_version": versions.get(user_id, 0),
+                    "generated_at": generated_at
+                }},
+                upsert=True
+            )
+            for user_id in user_ids
+        ]
+        if operations:
+            db.financial_summaries.bulk_write(operations, ordered=False)
+        return len(operations)
+    finally:
+        client.close()
+
+def partition_bounds(db, month, size=SUMMARY_PARTITION_SIZE):
+    """Split the user_id space into contiguous ranges of about `size` users."""
+    user_ids = [doc["user_id"] for doc in db.user_profiles.find({"user_id": {"$type": "string"}}, {"user_id": 1}).sort("user_id", 1)]
+    starts = user_ids[::size]
+    return [(start, starts[i + 1] if i + 1 < len(starts) else None, month) for i, start in enumerate(starts)]
+
+def run_summaries(db, month=None, workers=SUMMARY_WORKERS):
+    partitions = partition_bounds(db, month or current_month())
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(summarize_partition, partitions))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Materialize financial summaries for every user")
+    arg_parser.add_argument("--month", default=None, help="Month to summarize as YYYY-MM (default: this month)")
+    arg_parser.add_argument("--workers", type=int, default=SUMMARY_WORKERS)
+    args = arg_parser.parse_args()
+
+    client = MongoClient(MONGO_URI)
+    written = run_summaries(client['finance_ai'], month=args.month, workers=args.workers)
+    print(f"Wrote {written} financial summaries")
+    client.close()
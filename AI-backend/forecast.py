@@ -0,0 +1,210 @@
+import argparse
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from currency import convert_totals, currency_code
+from debt_payoff import minimum_payment, simulate, strategy_order
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+FORECAST_BATCH_SIZE = int(os.environ.get('FORECAST_BATCH_SIZE', 500))
+FORECAST_WORKERS = int(os.environ.get('FORECAST_WORKERS', os.cpu_count() or 1))
+
+FORECAST_HORIZON = 12
+HISTORY_MONTHS = 6
+
+# ---------------------- Projection ---------------------- #
+
+def month_labels(base_month, count):
+    start = datetime.datetime.strptime(base_month, "%Y-%m")
+    return [(start + relativedelta(months=i)).strftime("%Y-%m") for i in range(count)]
+
+def history_months(history, base_month):
+    """Complete months from the first month in `history` to the last one before the current month."""
+    if not history:
+        return 1
+    last = datetime.datetime.strptime(base_month, "%Y-%m") - relativedelta(months=2)
+    first = datetime.datetime.strptime(min(row["month"] for row in history), "%Y-%m")
+    span = (last.year - first.year) * 12 + last.month - first.month + 1
+    return min(max(span, 1), HISTORY_MONTHS)
+
+def compute_forecast(inputs):
+    """Project monthly cash flow for one user from plain inputs (runs in a worker process).
+
+    Income and spend per category are averaged over every complete month in the history
+    window (from the user's first month in it), including months without spend in that
+    category; subscriptions are charged every month and debts at their minimum payments.
+    """
+    horizon = inputs["horizon"]
+    history = inputs["history"]
+    months_seen = history_months(history, inputs["base_month"])
+
+    income = sum(row["total"] for row in history if row["amount_type"] == "credit") / months_seen
+    category_spend = {}
+    for row in history:
+        if row["amount_type"] == "debit":
+            cid = row["category_id"] or "uncategorized"
+            category_spend[cid] = category_spend.get(cid, 0.0) + row["total"] / months_seen
+    subscriptions = sum(float(sub.get("cost", 0)) for sub in inputs["subscriptions"])
+
+    debts = [d for d in inputs["debts"] if float(d.get("amount", 0)) > 0]
+    debt_payments = np.zeros(horizon)
+    if debts:
+        balances = np.array([float(d["amount"]) for d in debts])
+        rates = np.array([float(d.get("interest_rate", 0)) for d in debts])
+        order = strategy_order("avalanche", balances, rates)
+        schedule = simulate(balances, rates, [order], [minimum_payment(debts)], max_months=horizon, keep_schedule=True)
+        paid = schedule["payments"].sum(axis=2)[:, 0]
+        debt_payments[:len(paid)] = paid
+
+    income_path = np.full(horizon, income)
+    expense_path = np.full(horizon, sum(category_spend.values()))
+    subscription_path = np.full(horizon, subscriptions)
+    net = income_path - expense_path - subscription_path - debt_payments
+    balance = inputs["start_balance"] + np.cumsum(net)
+
+    return {
+        "user_id": inputs["user_id"],
+        "data_version": inputs["data_version"],
+        "base_month": inputs["base_month"],
+        "start_balance": round(inputs["start_balance"], 2),
+        "assumptions": {
+            "history_months": months_seen,
+            "monthly_income": round(income, 2),
+            "monthly_subscriptions": round(subscriptions, 2),
+            "category_spend": {cid: round(amount, 2) for cid, amount in category_spend.items()}
+        },
+        "months": [
+            {
+                "month": label,
+                "income": round(float(income_path[i]), 2),
+                "expenses": round(float(expense_path[i]), 2),
+                "subscriptions": round(float(subscription_path[i]), 2),
+                "debt_payments": round(float(debt_payments[i]), 2),
+                "net": round(float(net[i]), 2),
+                "balance": round(float(balance[i]), 2)
+            }
+            for i, label in enumerate(month_labels(inputs["base_month"], horizon))
+        ]
+    }
+
+# ---------------------- Inputs ---------------------- #
+
+def stale_users(db, base_month):
+    """(user_id, data_version) for every user whose stored forecast is missing or out of date."""
+    versions = {doc["_id"]: doc.get("version", 0) for doc in db.data_versions.find({}, {"version": 1})}
+    stored = {
+        doc["user_id"]: (doc.get("data_version"), doc.get("base_month"))
+        for doc in db.cash_flow_forecasts.find({}, {"user_id": 1, "data_version": 1, "base_month": 1})
+    }
+    users = []
+    for profile in db.user_profiles.find({"user_id": {"$type": "string"}}, {"user_id": 1}).sort("user_id", 1):
+        user_id = profile["user_id"]
+        version = versions.get(user_id, 0)
+        if stored.get(user_id) != (version, base_month):
+            users.append((user_id, version))
+    return users
+
+def history_pipeline(user_ids, start, end):
+    """Monthly totals per user, amount type, category and currency (shared with query_catalog.py)."""
+    return [
+        {"$match": {"user_id": {"$in": user_ids}, "transaction_date": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "month": {"$substrBytes": ["$transaction_date", 0, 7]},
+                "amount_type": "$amount_type",
+                "category_id": "$category_id",
+                "currency": "$currency"
+            },
+            "total": {"$sum": "$amount"}
+        }}
+    ]
+
+def load_inputs(db, users, base_month, horizon):
+    """Gather every input for a batch of users with one query per collection."""
+    user_ids = [user_id for user_id, _ in users]
+    # History is the complete months before the current one (base_month is next month)
+    current = datetime.datetime.strptime(base_month, "%Y-%m") - relativedelta(months=1)
+    start = (current - relativedelta(months=HISTORY_MONTHS)).strftime("%Y-%m-%d")
+    end = current.strftime("%Y-%m-%d")
+
+    profiles = {doc["user_id"]: doc for doc in db.user_profiles.find(
+        {"user_id": {"$in": user_ids}}, {"user_id": 1, "cash_holdings": 1, "online_holdings": 1, "currency": 1}
+    )}
+    subscriptions, debts, history = {}, {}, {}
+    for doc in db.subscriptions.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "cost": 1}):
+        subscriptions.setdefault(doc["user_id"], []).append(doc)
+    for doc in db.debts.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "amount": 1, "interest_rate": 1}):
+        debts.setdefault(doc["user_id"], []).append(doc)
+    rows = db.transactions.aggregate(history_pipeline(user_ids, start, end), allowDiskUse=True)
+    rows = [dict(row["_id"], total=float(row["total"])) for row in rows]
+    # The whole batch's history is converted to each user's currency in one pass
+    convert_totals(rows, [currency_code(profiles.get(row["user_id"], {}).get("currency")) for row in rows])
+    for row in rows:
+        history.setdefault(row["user_id"], []).append({
+            "month": row["month"], "amount_type": row["amount_type"],
+            "category_id": row.get("category_id"), "total": row["total"]
+        })
+
+    for user_id, version in users:
+        profile = profiles.get(user_id, {})
+        yield {
+            "user_id": user_id,
+            "data_version": version,
+            "base_month": base_month,
+            "horizon": horizon,
+            "start_balance": float(profile.get("cash_holdings", 0)) + float(profile.get("online_holdings", 0)),
+            "subscriptions": subscriptions.get(user_id, []),
+            "debts": debts.get(user_id, []),
+            "history": history.get(user_id, [])
+        }
+
+# ---------------------- Job ---------------------- #
+
+def run_forecasts(db, base_month=None, horizon=FORECAST_HORIZON, batch_size=FORECAST_BATCH_SIZE, workers=FORECAST_WORKERS):
+    """Recompute forecasts for users whose data version (or the base month) changed since the last run.
+
+    The version is read before the inputs, so a write that lands mid-run leaves the stored
+    forecast one version behind and it is picked up again on the next run.
+    """
+    base_month = base_month or (datetime.date.today().replace(day=1) + relativedelta(months=1)).strftime("%Y-%m")
+    users = stale_users(db, base_month)
+    generated_at = datetime.datetime.now(datetime.timezone.utc)
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for offset in range(0, len(users), batch_size):
+            inputs = list(load_inputs(db, users[offset:offset + batch_size], base_month, horizon))
+            results = executor.map(compute_forecast, inputs, chunksize=max(1, len(inputs) // (workers * 4)))
+            operations = [
+                UpdateOne({"user_id": result["user_id"]}, {"$set": dict(result, generated_at=generated_at)}, upsert=True)
+                for result in results
+            ]
+            if operations:
+                db.cash_flow_forecasts.bulk_write(operations, ordered=False)
+                written += len(operations)
+    return written
+
+def get_forecast(db, user_id, months=FORECAST_HORIZON):
+    """Stored forecast for a user, trimmed to the first `months` months (None if not computed yet)."""
+    doc = db.cash_flow_forecasts.find_one({"user_id": user_id}, {"_id": 0})
+    if doc:
+        doc["months"] = doc["months"][:months]
+    return doc
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Recompute cash-flow forecasts for users whose data changed")
+    arg_parser.add_argument("--month", default=None, help="First forecast month as YYYY-MM (default: next month)")
+    arg_parser.add_argument("--workers", type=int, default=FORECAST_WORKERS)
+    args = arg_parser.parse_args()
+
+    client = MongoClient(MONGO_URI)
+    written = run_forecasts(client['finance_ai'], base_month=args.month, workers=args.workers)
+    print(f"Wrote {written} cash-flow forecasts")
+    client.close()
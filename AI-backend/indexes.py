@@ -0,0 +1,101 @@
+import os
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+
+# Every index the app relies on, by collection. The backend creates them at startup and
+# check_query_plans.py builds them on its seeded database, so each query shape in
+# query_catalog.py is checked against exactly these.
+INDEXES = {
+    "users": [
+        IndexModel("username", unique=True),
+    ],
+    "transactions": [
+        IndexModel("user_id"),
+        # Serves category filters, and the export's category filter sorted by date (merged per category)
+        IndexModel([("user_id", ASCENDING), ("category_id", ASCENDING), ("transaction_date", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("transaction_date", ASCENDING)]),
+        # The chat retrieval index catches up by _id
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)]),
+        # Statement imports dedupe on this (see statement_import.py)
+        IndexModel(
+            [("user_id", ASCENDING), ("content_hash", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"content_hash": {"$exists": True}}
+        ),
+    ],
+    "transactions_archive": [
+        # Full-history reads and the export's date-sorted merge (see archive.py)
+        IndexModel([("user_id", ASCENDING), ("transaction_date", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("category_id", ASCENDING), ("transaction_date", ASCENDING)]),
+        # Statement imports also skip rows already archived
+        IndexModel(
+            [("user_id", ASCENDING), ("content_hash", ASCENDING)],
+            partialFilterExpression={"content_hash": {"$exists": True}}
+        ),
+    ],
+    "monthly_aggregates": [
+        # The archive's $merge matches on these fields, which needs a unique index; amount_type
+        # comes before month so spend totals for a range of months read only debit keys
+        IndexModel([("user_id", ASCENDING), ("amount_type", ASCENDING), ("month", ASCENDING), ("category_id", ASCENDING), ("currency", ASCENDING)], unique=True),
+    ],
+    "subscriptions": [
+        IndexModel("user_id"),
+    ],
+    "debts": [
+        IndexModel("user_id"),
+        # The payoff planner reads debts in the order they were added
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "budgets": [
+        IndexModel("user_id", unique=True),
+    ],
+    "user_profiles": [
+        IndexModel("user_id", unique=True),
+    ],
+    "monthly_budgets": [
+        # One snapshot per user per month
+        IndexModel([("user_id", ASCENDING), ("month", DESCENDING)], unique=True),
+    ],
+    "chat_memory": [
+        IndexModel("user_id"),
+        # The chat reads the latest messages first
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "cash_flow_forecasts": [
+        IndexModel("user_id", unique=True),
+    ],
+    "financial_summaries": [
+        IndexModel("user_id", unique=True),
+    ],
+    "spend_alerts": [
+        # Only undismissed alerts are listed, newest first
+        IndexModel([("user_id", ASCENDING), ("dismissed", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+}
+
+# Indexes replaced by the ones above
+RETIRED_INDEXES = {
+    "monthly_budgets": ["user_id_1"],
+    "transactions": ["user_id_1_category_id_1"],
+    "spend_alerts": ["user_id_1_created_at_-1"],
+    "monthly_aggregates": ["user_id_1_amount_type_1_month_1_category_id_1"],
+}
+
+def ensure_indexes(db):
+    for collection, names in RETIRED_INDEXES.items():
+        existing = db[collection].index_information()
+        for name in names:
+            if name in existing:
+                db[collection].drop_index(name)
+    for collection, models in INDEXES.items():
+        db[collection].create_indexes(models)
+
+if __name__ == "__main__":
+    client = MongoClient(MONGO_URI)
+    ensure_indexes(client['finance_ai'])
+    print("Indexes are up to date")
+    client.close()
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+import tracing
+
+load_dotenv()
+
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 30))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("LLM_TOKENS_PER_MINUTE", 15000))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 1.0))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 30.0))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 60.0))
+LLM_MAX_OUTPUT_TOKENS = int(os.environ.get("LLM_MAX_OUTPUT_TOKENS", 1024))
+# How long a coalesced caller waits on the leader's call before giving up
+LLM_FOLLOWER_TIMEOUT = float(os.environ.get("LLM_FOLLOWER_TIMEOUT", 120.0))
+
+# Groq bills an image at roughly this many prompt tokens
+IMAGE_TOKEN_ESTIMATE = 1500
+
+RETRYABLE_ERROR_NAMES = ("APIConnectionError", "APITimeoutError")
+
+# ---------------------- Errors ---------------------- #
+
+class LLMUnavailableError(Exception):
+    """Raised when the provider cannot be reached within the configured limits."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# ---------------------- Token Bucket ---------------------- #
+
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets taken together under one lock."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.condition = threading.Condition()
+
+    def acquire(self, tokens, timeout):
+        # A single call larger than the whole bucket would otherwise wait forever
+        tokens = min(tokens, self.tokens.capacity)
+        deadline = time.monotonic() + timeout
+        waited = 0.0
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait == 0:
+                    self.requests.tokens -= 1
+                    self.tokens.tokens -= tokens
+                    return waited
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise LLMUnavailableError("LLM rate limit queue is full, try again shortly", retry_after=wait)
+                started = time.monotonic()
+                self.condition.wait(min(wait, remaining))
+                waited += time.monotonic() - started
+
+    def adjust(self, tokens):
+        # Charge (or refund) the difference between the estimate and the reported usage
+        with self.condition:
+            self.tokens.refill(time.monotonic())
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens - tokens)
+            self.condition.notify_all()
+
+# ---------------------- Single Flight ---------------------- #
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+# ---------------------- Gateway ---------------------- #
+
+class LLMGateway:
+    def __init__(self, limiter, max_retries=LLM_MAX_RETRIES, backoff_base=LLM_BACKOFF_BASE,
+                 backoff_max=LLM_BACKOFF_MAX, queue_timeout=LLM_QUEUE_TIMEOUT,
+                 follower_timeout=LLM_FOLLOWER_TIMEOUT):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.follower_timeout = follower_timeout
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "upstream_calls": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "failures": 0,
+            "throttled_seconds": 0.0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def invoke(self, fn, key, estimated_tokens, usage=None, model=None):
+        """Run `fn` through the limiter, retrying and coalescing calls that share `key`.
+
+        This is the only retry layer, so provider clients are built with max_retries=0.
+        """
+        with tracing.span(f"llm {model or 'call'}", tracing.KIND_CLIENT, **{
+            "gen_ai.system": "groq",
+            "gen_ai.request.model": model,
+            "llm.estimated_tokens": estimated_tokens,
+        }) as span:
+            return self._invoke(fn, key, estimated_tokens, usage, span)
+
+    def _invoke(self, fn, key, estimated_tokens, usage, span):
+        self._count("calls")
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+
+        span.set("llm.coalesced", not leader)
+        if not leader:
+            self._count("coalesced")
+            if not flight.event.wait(self.follower_timeout):
+                self._count("failures")
+                raise LLMUnavailableError("Timed out waiting for an identical LLM call in progress", retry_after=self.backoff_max)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._call_with_retry(fn, estimated_tokens, usage, span)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def _call_with_retry(self, fn, estimated_tokens, usage, span):
+        attempt = 0
+        throttled = 0.0
+        while True:
+            waited = self.limiter.acquire(estimated_tokens, self.queue_timeout)
+            throttled += waited
+            span.set("llm.throttled_seconds", round(throttled, 3))
+            span.set("llm.attempts", attempt + 1)
+            self._count("throttled_seconds", waited)
+            self._count("upstream_calls")
+            try:
+                result = fn()
+            except Exception as e:
+                retryable, retry_after = classify_error(e)
+                if not retryable:
+                    self._count("failures")
+                    raise
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise LLMUnavailableError(f"LLM provider unavailable: {e}", retry_after=retry_after) from e
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                if retry_after:
+                    delay = max(delay, retry_after)
+                attempt += 1
+                self._count("retries")
+                time.sleep(delay)
+                continue
+
+            input_tokens, output_tokens, _ = token_counts(result)
+            span.set("gen_ai.usage.input_tokens", input_tokens)
+            span.set("gen_ai.usage.output_tokens", output_tokens)
+            if usage is not None:
+                actual = usage(result)
+                if actual:
+                    self.limiter.adjust(actual - estimated_tokens)
+            return result
+
+# ---------------------- Helpers ---------------------- #
+
+def classify_error(exc):
+    """Return (retryable, retry_after_seconds) for an exception raised by a provider client."""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            retry_after = None
+
+    if status == 429 or (isinstance(status, int) and 500 <= status < 600):
+        return True, retry_after
+    if type(exc).__name__ in RETRYABLE_ERROR_NAMES:
+        return True, retry_after
+    return False, None
+
+def estimate_tokens(*texts, images=0, max_output_tokens=LLM_MAX_OUTPUT_TOKENS):
+    # ~4 characters per token is close enough for budgeting against provider limits
+    prompt_chars = sum(len(text) for text in texts if text)
+    return prompt_chars // 4 + images * IMAGE_TOKEN_ESTIMATE + max_output_tokens
+
+def request_key(*parts):
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def langchain_usage(message):
+    metadata = getattr(message, "usage_metadata", None) or {}
+    return metadata.get("total_tokens")
+
+def groq_usage(response):
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+def token_counts(result):
+    """(input, output, total) tokens reported by a LangChain message or a Groq response."""
+    metadata = getattr(result, "usage_metadata", None)
+    if metadata:
+        return metadata.get("input_tokens"), metadata.get("output_tokens"), metadata.get("total_tokens")
+    usage = getattr(result, "usage", None)
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None), getattr(usage, "total_tokens", None)
+
+
+gateway = LLMGateway(RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE))
@@ -1,23 +1,119 @@
-from flask import Flask, request, jsonify
+# These register Mongo command listeners, so they must come before any module that creates a client
+import command_stats
+import tracing
+import profiler
+from flask import Flask, request, jsonify, Response, g
 from reciept import receipt_model,save_receipt_in_mongodb
-from budget import parse_budget,save_in_db
+from budget import parse_budget,save_in_db,get_parse_stats
 from datetime import datetime
+import uuid
 from chat import Chat
+import chat_cache
+from statement_import import import_statement
+from export import export_transactions
+from categorizer import suggest_categories, record_feedback
+from debt_payoff import user_payoff_plan
+from recommender import get_recommendations
+import json
+from llm_gateway import gateway, LLMUnavailableError
+from api import api, db as api_db
+from indexes import ensure_indexes
+from compression import GzipRequestMiddleware
+import base64
 
 app = Flask(__name__)
+app.register_blueprint(api)
+# The frontend gzips large JSON bodies
+app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)
+
+try:
+    ensure_indexes(api_db)
+except Exception as e:
+    print(f"Error creating indexes: {e}")
+
+@app.before_request
+def start_command_stats():
+    g.command_stats_token = command_stats.begin()
+
+@app.after_request
+def add_server_timing(response):
+    stats = command_stats.current()
+    if stats is not None:
+        response.headers["Server-Timing"] = command_stats.server_timing(stats)
+    return response
+
+@app.teardown_request
+def end_command_stats(exc):
+    token = g.pop("command_stats_token", None)
+    if token is not None:
+        command_stats.end(token)
+
+@app.before_request
+def start_trace():
+    rule = request.url_rule.rule if request.url_rule else request.path
+    g.trace = tracing.begin_request(request.headers.get("traceparent"), f"{request.method} {rule}", {
+        "http.request.method": request.method,
+        "http.route": rule,
+        "url.path": request.path,
+    })
+
+@app.after_request
+def record_trace_status(response):
+    if "trace" in g:
+        g.trace_status = response.status_code
+    return response
+
+@app.teardown_request
+def end_trace(exc):
+    handle = g.pop("trace", None)
+    if handle is not None:
+        tracing.end_request(handle, g.pop("trace_status", None), error=exc)
+
+@app.before_request
+def start_profile():
+    g.profile = profiler.start(request.path, request.headers.get("X-Profile"))
+
+@app.after_request
+def finish_profile(response):
+    filename = profiler.finish(g.get("profile"), request.method, request.path, response.status_code)
+    if filename:
+        response.headers["X-Profile-File"] = filename
+    return response
+
+@app.teardown_request
+def end_profile(exc):
+    # No response was made (an exception escaped); `finish` is a no-op if after_request already ran
+    profiler.finish(g.pop("profile", None), request.method, request.path, 500)
+
+@app.errorhandler(LLMUnavailableError)
+def llm_unavailable(e):
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    if e.retry_after:
+        response.headers["Retry-After"] = str(max(1, int(e.retry_after)))
+    return response
 
 @app.route('/parse-receipt', methods=['POST'])
 def parse_reciept():
-    data = request.json
-    image_url = data.get('image_url')
+    upload = request.files.get('image')
+    if upload is not None:
+        # Multipart upload: the image travels as raw bytes and becomes a data URL only here
+        data = request.form
+        mimetype = upload.mimetype or "image/jpeg"
+        image_url = f"data:{mimetype};base64,{base64.b64encode(upload.read()).decode('utf-8')}"
+    else:
+        data = request.json or {}
+        image_url = data.get('image_url')
     user_id = data.get('user_id')
     category = data.get('category')
     if not image_url:
-        return jsonify({"error": "Image URL is required"}), 400
+        return jsonify({"error": "An image upload or image URL is required"}), 400
     try:
         llm_response = receipt_model(image_url)
         save_receipt_in_mongodb(user_id=user_id,llm_response=llm_response,date=datetime.now().strftime("%Y-%m-%d"),category=category)
         return jsonify({"message": "Receipt parsed successfully"}), 200
+    except LLMUnavailableError:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -27,10 +123,13 @@ def generate_budget():
     data = request.json
     user_id = data.get('user_id')
     description = data.get('description')
+    request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
     try:
-        response = parse_budget(description)
-        save_in_db(user_id,response)
+        response = parse_budget(description, user_id=user_id, request_id=request_id)
+        save_in_db(user_id, response, request_id=request_id)
         return jsonify({"message": "Budget generated successfully"}), 200
+    except LLMUnavailableError:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -44,8 +143,109 @@ def chat():
     try:
         response = Chat(query=query,user_id=user_id)
         return jsonify({"response":response}), 200
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+@app.route('/import-statement',methods=['POST'])
+def import_statement_route():
+    user_id = request.form.get('user_id')
+    upload = request.files.get('file')
+    if not user_id or upload is None:
+        return jsonify({"error": "user_id and a statement file are required"}), 400
+    fmt = (request.form.get('format') or upload.filename.rsplit('.', 1)[-1]).lower()
+    try:
+        mapping = json.loads(request.form.get('column_mapping') or "{}")
+        result = import_statement(
+            user_id, upload.stream, fmt, mapping=mapping,
+            date_format=request.form.get('date_format') or None, currency=request.form.get('currency') or None
+        )
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+@app.route('/export-transactions',methods=['GET'])
+def export_transactions_route():
+    user_id = request.args.get('user_id')
+    fmt = request.args.get('format', 'csv').lower()
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+    try:
+        chunks, mimetype = export_transactions(
+            user_id,
+            fmt=fmt,
+            start_date=request.args.get('start'),
+            end_date=request.args.get('end'),
+            category_ids=request.args.getlist('category')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    filename = f"transactions.{fmt}"
+    return Response(chunks, mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename={filename}"})
+    
+@app.route('/categorize',methods=['POST'])
+def categorize_route():
+    data = request.json
+    user_id = data.get('user_id')
+    descriptions = data.get('descriptions') or []
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+    try:
+        return jsonify({"category_ids": suggest_categories(user_id, descriptions)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+@app.route('/categorizer-feedback',methods=['POST'])
+def categorizer_feedback():
+    data = request.json
+    user_id = data.get('user_id')
+    descriptions = data.get('descriptions') or []
+    categories = data.get('categories') or []
+    if not user_id or len(descriptions) != len(categories):
+        return jsonify({"error": "user_id and matching descriptions/categories are required"}), 400
+    try:
+        record_feedback(user_id, descriptions, categories)
+        return jsonify({"message": "Feedback recorded"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+@app.route('/debt-payoff',methods=['POST'])
+def debt_payoff():
+    data = request.json
+    user_id = data.get('user_id')
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+    try:
+        monthly_payment = float(data.get('monthly_payment') or 0)
+        return jsonify(user_payoff_plan(user_id, monthly_payment, custom_order=data.get('custom_order'))), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+@app.route('/get-recommendations',methods=['POST'])
+def get_recommendations_route():
+    data = request.json
+    user_id = data.get('user_id')
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+    try:
+        result = get_recommendations(user_id)
+        if result is None:
+            # First request for this user: generation has started in the background
+            return jsonify({"status": "pending"}), 202
+        return jsonify(result), 200
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+@app.route('/metrics',methods=['GET'])
+def metrics():
+    return jsonify({"llm_gateway": gateway.get_stats(), "budget_parser": get_parse_stats(), "profiler": profiler.get_stats(), "tracing": tracing.get_stats(), "chat_cache": chat_cache.get_stats()}), 200
+    
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,223 @@
+import argparse
+import datetime
+import os
+from dateutil.relativedelta import relativedelta
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from versioning import bump_data_versions
+from categories import category_id, match_catalog, profile_catalog
+from currency import convert_totals, currency_code
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONTH_CLOSE_BATCH_SIZE = int(os.environ.get('MONTH_CLOSE_BATCH_SIZE', 500))
+WEEKS_PER_MONTH = 52 / 12
+
+# ---------------------- Month Helpers ---------------------- #
+
+def previous_month(today=None):
+    today = today or datetime.date.today()
+    return (today.replace(day=1) - relativedelta(months=1)).strftime("%Y-%m")
+
+def month_bounds(month):
+    start = datetime.datetime.strptime(month, "%Y-%m")
+    end = start + relativedelta(months=1)
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+# ---------------------- Aggregation ---------------------- #
+
+def spend_by_user_pipeline(month, after_user_id=None):
+    """Debit totals per category id over the closed month, grouped per user and ordered by user.
+
+    Shared with query_catalog.py, which also checks the $lookup into user_profiles.
+    """
+    start, end = month_bounds(month)
+    user_filter = {"$type": "string"}
+    if after_user_id:
+        user_filter["$gt"] = after_user_id
+
+    pipeline = [
+        {"$match": {
+            "user_id": user_filter,
+            "amount_type": "debit",
+            "transaction_date": {"$gte": start, "$lt": end}
+        }},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "category_id": "$category_id", "currency": "$currency"},
+            "total": {"$sum": "$amount"}
+        }},
+        {"$group": {
+            "_id": "$_id.user_id",
+            "categories": {"$push": {"k": "$_id.category_id", "v": "$total", "currency": "$_id.currency"}}
+        }},
+        {"$sort": {"_id": 1}},
+        # The user's reporting currency, to convert totals made in other currencies
+        {"$lookup": {
+            "from": "user_profiles",
+            "localField": "_id",
+            "foreignField": "user_id",
+            "pipeline": [{"$project": {"_id": 0, "currency": 1}}],
+            "as": "profile"
+        }}
+    ]
+    return pipeline
+
+def spend_by_user(db, month, after_user_id=None):
+    """One aggregation over the closed month; see spend_by_user_pipeline."""
+    return db.transactions.aggregate(spend_by_user_pipeline(month, after_user_id), allowDiskUse=True)
+
+def budgets_pipeline(after_user_id=None):
+    """Every budget's expense lines ordered by user, with the user's category catalog to resolve them."""
+    user_filter = {"$type": "string"}
+    if after_user_id:
+        user_filter["$gt"] = after_user_id
+    return [
+        {"$match": {"user_id": user_filter}},
+        {"$sort": {"user_id": 1}},
+        {"$project": {"_id": 0, "user_id": 1, "budget_data.expenses": 1}},
+        {"$lookup": {
+            "from": "user_profiles",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "pipeline": [{"$project": {"_id": 0, "category_catalog": 1}}],
+            "as": "profile"
+        }}
+    ]
+
+def line_category_id(catalog, item):
+    """Resolve a budget line like budget.py does, so aliases and legacy slugs meet the spend ids."""
+    return (
+        match_catalog(catalog, item.get("category"))
+        or match_catalog(catalog, item.get("category_id"))
+        or item.get("category_id")
+        or category_id(item.get("category"))
+    )
+
+def build_snapshot(user_id, month, expenses, spent, closed_at, catalog):
+    # Lines resolving to the same id (e.g. "Groceries" and "Food") share one spend total, so they
+    # are merged; weekly allocations are scaled to the month before the variance is taken
+    lines = {}
+    for item in expenses:
+        cid = line_category_id(catalog, item)
+        frequency = item.get("frequency") or "Monthly"
+        allocated = float(item.get("allocated_amount") or 0)
+        monthly = allocated * WEEKS_PER_MONTH if frequency == "Weekly" else allocated
+        line = lines.get(cid)
+        if line is None:
+            lines[cid] = {"category": item.get("category"), "category_id": cid, "allocated_amount": allocated,
+                          "frequency": frequency, "monthly_amount": monthly}
+        elif line["frequency"] == frequency:
+            line["allocated_amount"] += allocated
+            line["monthly_amount"] += monthly
+        else:
+            line["monthly_amount"] += monthly
+            line.update(allocated_amount=line["monthly_amount"], frequency="Monthly")
+
+    budget_data = []
+    for cid, line in lines.items():
+        actual = abs(spent.get(cid, 0))
+        budget_data.append(dict(
+            line,
+            allocated_amount=round(line["allocated_amount"], 2),
+            monthly_amount=round(line["monthly_amount"], 2),
+            actual_spent=actual,
+            variance=round(line["monthly_amount"] - actual, 2)
+        ))
+    return {
+        "user_id": user_id,
+        "month": month,
+        "generated_from": "auto",
+        "budget_data": budget_data,
+        "closed_at": closed_at
+    }
+
+def user_spend(row, month):
+    """Category totals from a spend_by_user row, in the user's currency."""
+    profile = row["profile"][0] if row.get("profile") else {}
+    categories = [dict(item, month=month) for item in row["categories"]]
+    convert_totals(categories, currency_code(profile.get("currency")), amount="v")
+    spent = {}
+    for item in categories:
+        spent[item["k"]] = spent.get(item["k"], 0) + item["v"]
+    return spent
+
+# ---------------------- Job ---------------------- #
+
+def close_month(db, month, restart=False, batch_size=MONTH_CLOSE_BATCH_SIZE):
+    """Materialize monthly_budgets snapshots for every user with a budget.
+
+    Snapshots are upserted on (user_id, month), so re-running is idempotent. Progress is
+    checkpointed in job_runs after each batch and an interrupted run resumes after the
+    last user it wrote.
+    """
+    job_id = f"month_close:{month}"
+    checkpoint = db.job_runs.find_one({"_id": job_id})
+    if checkpoint and checkpoint.get("status") == "completed" and not restart:
+        print(f"{job_id} already completed")
+        return 0
+
+    after_user_id = None if restart or not checkpoint else checkpoint.get("last_user_id")
+    closed_at = datetime.datetime.now(datetime.timezone.utc)
+    db.job_runs.update_one(
+        {"_id": job_id},
+        {"$set": {"status": "running", "updated_at": closed_at}, "$setOnInsert": {"started_at": closed_at}},
+        upsert=True
+    )
+
+    budgets = db.budgets.aggregate(budgets_pipeline(after_user_id))
+
+    # Both cursors are ordered by user_id, so they are merge-joined without holding every user in memory
+    spend_cursor = spend_by_user(db, month, after_user_id)
+    current = next(spend_cursor, None)
+
+    operations = []
+    batch_users = []
+    written = 0
+    for budget in budgets:
+        user_id = budget["user_id"]
+        while current is not None and current["_id"] < user_id:
+            current = next(spend_cursor, None)
+        spent = {}
+        if current is not None and current["_id"] == user_id:
+            spent = user_spend(current, month)
+
+        expenses = budget.get("budget_data", {}).get("expenses", [])
+        catalog = profile_catalog(budget["profile"][0] if budget.get("profile") else None)
+        snapshot = build_snapshot(user_id, month, expenses, spent, closed_at, catalog)
+        operations.append(UpdateOne({"user_id": user_id, "month": month}, {"$set": snapshot}, upsert=True))
+        batch_users.append(user_id)
+
+        if len(operations) >= batch_size:
+            written += flush(db, job_id, operations, batch_users)
+            operations, batch_users = [], []
+
+    if operations:
+        written += flush(db, job_id, operations, batch_users)
+
+    db.job_runs.update_one(
+        {"_id": job_id},
+        {"$set": {"status": "completed", "updated_at": datetime.datetime.now(datetime.timezone.utc)}}
+    )
+    return written
+
+def flush(db, job_id, operations, user_ids):
+    db.monthly_budgets.bulk_write(operations, ordered=False)
+    bump_data_versions(db, user_ids)
+    db.job_runs.update_one(
+        {"_id": job_id},
+        {"$set": {"last_user_id": user_ids[-1], "updated_at": datetime.datetime.now(datetime.timezone.utc)}}
+    )
+    return len(operations)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Close a month and snapshot every user's budget vs. actual spend")
+    arg_parser.add_argument("--month", default=previous_month(), help="Month to close as YYYY-MM (default: last month)")
+    arg_parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and rebuild all snapshots")
+    args = arg_parser.parse_args()
+
+    client = MongoClient(MONGO_URI)
+    written = close_month(client['finance_ai'], args.month, restart=args.restart)
+    print(f"Wrote {written} monthly budget snapshots for {args.month}")
+    client.close()
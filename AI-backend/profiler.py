@@ -0,0 +1,196 @@
+import datetime
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Requests to profile: a random fraction, and any request carrying X-Profile: <PROFILE_TOKEN>
+# (the header is ignored when no token is configured)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+# Comma-separated path prefixes eligible for random sampling (empty = every path)
+PROFILE_PATHS = [path for path in os.environ.get("PROFILE_PATHS", "").split(",") if path]
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_FORMAT = os.environ.get("PROFILE_FORMAT", "speedscope")  # or "folded" for flamegraph.pl
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+# Guardrails: profiles running at once, how long one may sample, how many files are kept, and
+# how fast a randomly sampled request must be to be thrown away rather than written
+PROFILE_MAX_CONCURRENT = int(os.environ.get("PROFILE_MAX_CONCURRENT", 1))
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", 30))
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 100))
+PROFILE_MIN_MS = float(os.environ.get("PROFILE_MIN_MS", 500))
+MAX_STACK_DEPTH = 128
+
+_slots = threading.BoundedSemaphore(PROFILE_MAX_CONCURRENT)
+_stats = {"started": 0, "written": 0, "discarded": 0, "skipped_busy": 0}
+_stats_lock = threading.Lock()
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+def get_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+# ---------------------- Sampler ---------------------- #
+
+class Sampler:
+    """Samples one thread's Python stack every interval from a background thread.
+
+    Identical stacks share one entry, so memory stays bounded by the number of distinct code paths.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_MS / 1000, max_seconds=PROFILE_MAX_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = {}
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        deadline = self.started + self.max_seconds
+        last = self.started
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or now > deadline:
+                return
+            stack = self.stack(frame)
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + (now - last)
+            self.samples += 1
+            last = now
+
+    @staticmethod
+    def stack(frame):
+        """(file, first line, function) per frame, outermost first."""
+        frames = []
+        while frame is not None and len(frames) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            frames.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        return tuple(reversed(frames))
+
+# ---------------------- Output ---------------------- #
+
+def frame_label(frame):
+    filename, line, name = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+def speedscope(sampler, title):
+    """A speedscope.app 'sampled' profile; each distinct stack is one sample weighted by its time."""
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, seconds in sampler.stacks.items():
+        sample = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame[2], "file": frame[0], "line": frame[1]})
+            sample.append(index[frame])
+        samples.append(sample)
+        weights.append(round(seconds * 1000, 3))
+    return json.dumps({
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": title,
+        "exporter": "FinanceAI profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": title,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(sampler.elapsed * 1000, 3),
+            "samples": samples,
+            "weights": weights
+        }]
+    })
+
+def folded(sampler):
+    """Brendan Gregg's folded stacks (one 'a;b;c <microseconds>' line per stack) for flamegraph.pl."""
+    lines = [
+        ";".join(frame_label(frame).replace(";", ":") for frame in stack) + f" {int(seconds * 1_000_000)}"
+        for stack, seconds in sampler.stacks.items()
+    ]
+    return "\n".join(lines) + "\n"
+
+def prune(directory, keep=PROFILE_MAX_FILES):
+    paths = sorted((os.path.join(directory, name) for name in os.listdir(directory)), key=os.path.getmtime)
+    for path in paths[:max(len(paths) - keep, 0)]:
+        os.remove(path)
+
+def write_profile(sampler, method, path, status):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+    elapsed_ms = int(sampler.elapsed * 1000)
+    title = f"{method} {path} {status} {elapsed_ms}ms"
+    if PROFILE_FORMAT == "folded":
+        filename, body = f"{stamp}-{slug}-{elapsed_ms}ms.folded", folded(sampler)
+    else:
+        filename, body = f"{stamp}-{slug}-{elapsed_ms}ms.speedscope.json", speedscope(sampler, title)
+    with open(os.path.join(PROFILE_DIR, filename), "w", encoding="utf-8") as out:
+        out.write(body)
+    prune(PROFILE_DIR)
+    return filename
+
+# ---------------------- Request Hooks ---------------------- #
+
+def wanted(path, header):
+    """(profile this request?, was it asked for explicitly?)"""
+    if PROFILE_TOKEN and header == PROFILE_TOKEN:
+        return True, True
+    eligible = not PROFILE_PATHS or any(path.startswith(prefix) for prefix in PROFILE_PATHS)
+    return eligible and PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE, False
+
+def start(path, header=None):
+    """Start profiling the current thread if this request is selected; returns a handle for `finish`."""
+    selected, requested = wanted(path, header)
+    if not selected:
+        return None
+    if not _slots.acquire(blocking=False):
+        _count("skipped_busy")
+        return None
+    _count("started")
+    return {"sampler": Sampler(threading.get_ident()).start(), "requested": requested}
+
+def finish(handle, method, path, status):
+    """Stop the sampler and write the profile; returns the file name (None when discarded)."""
+    if handle is None or handle.get("finished"):
+        return None
+    handle["finished"] = True
+    sampler = handle["sampler"]
+    try:
+        sampler.stop()
+        if not handle["requested"] and sampler.elapsed * 1000 < PROFILE_MIN_MS:
+            _count("discarded")
+            return None
+        filename = write_profile(sampler, method, path, status)
+        _count("written")
+        return filename
+    except Exception as e:
+        print(f"Error writing profile: {e}")
+        return None
+    finally:
+        _slots.release()
@@ -7,8 +7,12 @@ class User(BaseModel):
 class ChatPrompt(BaseModel):
     user : User = None
     recent_messages : Optional[List[Dict[str,str]]] = None
-    user_expenses : Optional[List] = None
+    user_expenses : Optional[Dict[str,Any]] = None
     filename: str = "financial_analyst_prompt.md"
     
+class RecommendationPrompt(BaseModel):
+    user : User = None
+    filename: str = "recommendation_prompt.md"
+    
 class ReceiptPrompt(BaseModel):
     filename : str = "image_prompt.md"
\ No newline at end of file
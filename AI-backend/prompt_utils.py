@@ -1,11 +1,13 @@
 from jinja2 import Environment, FileSystemLoader
 from pydantic import BaseModel
 from pathlib import Path
+from tracing import traced
 
 env = Environment(
     loader=FileSystemLoader(Path(__file__).resolve().parent)
 )
 
+@traced()
 def prompt_render(prompt_obj: BaseModel) -> str:
     filename = getattr(prompt_obj, "filename", None)
     if not filename:
@@ -0,0 +1,345 @@
+# Every query shape the app sends to MongoDB, by name. check_query_plans.py explains each one
+# against a seeded database built with indexes.py and fails on collection scans, in-memory sorts
+# and queries that examine far more documents than they return. A new query goes in here too.
+#
+# Each builder takes the sample values the checker seeded (user ids, date ranges, ...) and returns
+# {"filter", "projection", "sort", "limit"} for a find, or {"pipeline"} for an aggregation.
+# Updates and deletes are registered by their filter. Aggregations are built with the same
+# *_pipeline functions the modules run, so a change to a pipeline is checked as it ships.
+
+from archive import cold_filter, fold_pipeline, spend_by_category_pipeline
+from export import export_query
+from financial_summary import category_totals_pipeline, debt_totals_pipeline, monthly_trends_pipeline, subscription_totals_pipeline
+from forecast import history_pipeline
+from month_close import budgets_pipeline, spend_by_user_pipeline
+
+MAX_EXAMINED_RATIO = 2.0
+
+QUERIES = {}
+
+def query(name, collection, source, full_scan=False, max_ratio=MAX_EXAMINED_RATIO):
+    """Register a query shape; `full_scan` marks batch reads meant to walk the whole collection."""
+    def register(build):
+        QUERIES[name] = {
+            "collection": collection,
+            "source": source,
+            "build": build,
+            "full_scan": full_scan,
+            "max_ratio": max_ratio,
+        }
+        return build
+    return register
+
+def stage(pipeline, operator):
+    return next(step[operator] for step in pipeline if operator in step)
+
+def union_pipeline(pipeline):
+    """The sub-pipeline of a pipeline's $unionWith stage, run against the other collection."""
+    return stage(pipeline, "$unionWith")["pipeline"]
+
+# ---------------------- Transactions ---------------------- #
+
+@query("transactions.list", "transactions", "api.transactions (archive.find_transactions)")
+def transactions_list(p):
+    return {"filter": {"user_id": p["user_id"]}, "projection": {"_id": 0, "user_id": 0}}
+
+@query("transactions.spend_by_category", "transactions", "archive.spend_by_category")
+def spend_by_category(p):
+    return {"pipeline": spend_by_category_pipeline(p["user_id"], p["month_start"], p["month_end"])}
+
+@query("transactions.spend_by_category_all_time", "transactions", "archive.spend_by_category")
+def spend_by_category_all_time(p):
+    return {"pipeline": spend_by_category_pipeline(p["user_id"])}
+
+@query("transactions.subscription_charges", "transactions", "api.charge_subscriptions")
+def subscription_charges(p):
+    return {
+        "filter": {
+            "user_id": p["user_id"],
+            "description": {"$in": p["subscription_descriptions"]},
+            "amount_type": "expense",
+            "transaction_date": {"$gte": p["month_first"], "$lt": p["next_month_first"]}
+        },
+        "projection": {"description": 1}
+    }
+
+@query("transactions.export", "transactions", "export.iter_batches (archive.find_transactions)")
+def export_transactions(p):
+    return {
+        "filter": export_query(p["user_id"], p["export_start"], p["export_end"]),
+        "sort": {"transaction_date": 1}
+    }
+
+@query("transactions.export_by_category", "transactions", "export.iter_batches (archive.find_transactions)")
+def export_by_category(p):
+    return {
+        "filter": export_query(p["user_id"], p["export_start"], p["export_end"], p["category_ids"]),
+        "sort": {"transaction_date": 1}
+    }
+
+@query("transactions.retrieval_load", "transactions", "retrieval.load_index")
+def retrieval_load(p):
+    return {"filter": {"user_id": p["user_id"]}, "sort": {"_id": 1}}
+
+@query("transactions.retrieval_catch_up", "transactions", "retrieval.load_index")
+def retrieval_catch_up(p):
+    return {"filter": {"user_id": p["user_id"], "_id": {"$gte": p["recent_transaction_id"]}}, "sort": {"_id": 1}}
+
+# count_documents, checking the index still matches the hot tier
+@query("transactions.retrieval_count", "transactions", "retrieval.load_index")
+def retrieval_count(p):
+    return {"filter": {"user_id": p["user_id"]}}
+
+@query("transactions.category_totals", "transactions", "financial_summary.category_totals")
+def category_totals(p):
+    return {"pipeline": category_totals_pipeline(p["user_id"], p["month_start"][:7])}
+
+@query("transactions.category_totals_partition", "transactions", "financial_summary.summarize_partition")
+def category_totals_partition(p):
+    return {"pipeline": category_totals_pipeline({"$gte": p["lower_user_id"], "$lt": p["upper_user_id"]}, p["month_start"][:7])}
+
+@query("transactions.monthly_trends", "transactions", "financial_summary.monthly_trends")
+def monthly_trends(p):
+    return {"pipeline": monthly_trends_pipeline(p["user_id"])}
+
+@query("transactions.forecast_history", "transactions", "forecast.load_inputs")
+def forecast_history(p):
+    return {"pipeline": history_pipeline(p["user_ids"], p["history_start"], p["month_start"])}
+
+@query("transactions.month_close", "transactions", "month_close.spend_by_user")
+def month_close_spend(p):
+    return {"pipeline": spend_by_user_pipeline(p["previous_month"], p["lower_user_id"])}
+
+# Each closed-month row looks up its user's profile by user_id
+@query("user_profiles.month_close_lookup", "user_profiles", "month_close.spend_by_user ($lookup)")
+def month_close_lookup(p):
+    lookup = stage(spend_by_user_pipeline(p["previous_month"], p["lower_user_id"]), "$lookup")
+    return {"pipeline": [{"$match": {lookup["foreignField"]: p["user_id"]}}] + lookup["pipeline"]}
+
+# Each budget looks up its user's category catalog by user_id
+@query("user_profiles.month_close_catalog", "user_profiles", "month_close.close_month ($lookup)")
+def month_close_catalog(p):
+    lookup = stage(budgets_pipeline(p["lower_user_id"]), "$lookup")
+    return {"pipeline": [{"$match": {lookup["foreignField"]: p["user_id"]}}] + lookup["pipeline"]}
+
+@query("transactions.legacy_categories", "transactions", "backfill_category_ids.legacy_transaction_categories", full_scan=True)
+def legacy_categories(p):
+    return {"pipeline": [
+        {"$match": {"category_id": {"$exists": False}, "category": {"$type": "string"}}},
+        {"$group": {"_id": {"user_id": "$user_id", "category": "$category"}}}
+    ]}
+
+@query("transactions.backfill_category_id", "transactions", "backfill_category_ids.backfill_user")
+def backfill_category_id(p):
+    return {"filter": {"user_id": p["user_id"], "category": p["legacy_category"], "category_id": {"$exists": False}}}
+
+@query("transactions.legacy_currency_users", "transactions", "backfill_currencies.legacy_users", full_scan=True)
+def legacy_currency_users(p):
+    return {"filter": {"currency": {"$in": [None, ""]}}, "projection": {"user_id": 1}}
+
+@query("transactions.backfill_currency", "transactions", "backfill_currencies.backfill_user")
+def backfill_currency(p):
+    return {"filter": {"user_id": p["user_id"], "currency": {"$in": [None, ""]}}}
+
+# ---------------------- Archive ---------------------- #
+
+@query("transactions.cold_users", "transactions", "archive.run_archive")
+def cold_users(p):
+    return {"filter": cold_filter(p["user_ids"], p["cold_cutoff"]), "projection": {"user_id": 1}}
+
+@query("transactions.cold_batch", "transactions", "archive.archive_user")
+def cold_batch(p):
+    return {
+        "filter": cold_filter([p["user_id"]], p["cold_cutoff"]),
+        "projection": {"_id": 1, "transaction_date": 1},
+        "limit": 5000
+    }
+
+@query("transactions.move_by_id", "transactions", "archive.archive_user")
+def move_by_id(p):
+    return {"pipeline": [{"$match": {"_id": {"$in": [p["recent_transaction_id"]]}}}]}
+
+@query("transactions_archive.list", "transactions_archive", "api.transactions (archive.find_transactions)")
+def archive_list(p):
+    return {"filter": {"user_id": p["user_id"]}, "projection": {"_id": 0, "user_id": 0}}
+
+@query("transactions_archive.export", "transactions_archive", "export.iter_batches (archive.find_transactions)")
+def archive_export(p):
+    return {
+        "filter": export_query(p["user_id"], p["archive_start"], p["archive_end"]),
+        "sort": {"transaction_date": 1}
+    }
+
+@query("transactions_archive.export_by_category", "transactions_archive", "export.iter_batches (archive.find_transactions)")
+def archive_export_by_category(p):
+    return {
+        "filter": export_query(p["user_id"], p["archive_start"], p["archive_end"], p["category_ids"]),
+        "sort": {"transaction_date": 1}
+    }
+
+@query("transactions_archive.fold", "transactions_archive", "archive.fold_months")
+def archive_fold(p):
+    return {"pipeline": fold_pipeline(p["user_id"], [p["archive_month_start"].strftime("%Y-%m")])}
+
+@query("transactions_archive.content_hashes", "transactions_archive", "archive.archived_hashes")
+def archive_content_hashes(p):
+    return {"filter": {"user_id": p["user_id"], "content_hash": {"$in": p["content_hashes"]}}, "projection": {"content_hash": 1}}
+
+@query("transactions_archive.legacy_currency_users", "transactions_archive", "backfill_currencies.legacy_users", full_scan=True)
+def archive_legacy_currency_users(p):
+    return {"filter": {"currency": {"$in": [None, ""]}}, "projection": {"user_id": 1}}
+
+@query("transactions_archive.backfill_currency", "transactions_archive", "backfill_currencies.backfill_user")
+def archive_backfill_currency(p):
+    return {"filter": {"user_id": p["user_id"], "currency": {"$in": [None, ""]}}}
+
+@query("monthly_aggregates.unstamped_months", "monthly_aggregates", "backfill_currencies.backfill_user")
+def aggregates_unstamped_months(p):
+    return {"filter": {"user_id": p["user_id"], "currency": ""}, "projection": {"month": 1}}
+
+@query("monthly_aggregates.spend_by_category", "monthly_aggregates", "archive.spend_by_category")
+def aggregates_spend_by_category(p):
+    # The $unionWith branch of archive.spend_by_category, over the archived months
+    return {"pipeline": union_pipeline(spend_by_category_pipeline(p["user_id"], p["archive_start"], p["archive_end"]))}
+
+@query("monthly_aggregates.spend_by_category_all_time", "monthly_aggregates", "archive.spend_by_category")
+def aggregates_spend_all_time(p):
+    return {"pipeline": union_pipeline(spend_by_category_pipeline(p["user_id"]))}
+
+# ---------------------- Budgets and Profiles ---------------------- #
+
+@query("budgets.by_user", "budgets", "api.budget, budget.get_user_budget, chat.get_full_user_profile, anomaly.record_expenses")
+def budget_by_user(p):
+    return {"filter": {"user_id": p["user_id"]}, "limit": 1}
+
+@query("budgets.month_close", "budgets", "month_close.close_month")
+def budgets_month_close(p):
+    return {"pipeline": budgets_pipeline(p["lower_user_id"])}
+
+@query("user_profiles.by_user", "user_profiles", "api.profile, categories.load_catalog, chat.get_full_user_profile")
+def profile_by_user(p):
+    return {"filter": {"user_id": p["user_id"]}, "limit": 1}
+
+@query("user_profiles.partition", "user_profiles", "financial_summary.summarize_partition")
+def profiles_partition(p):
+    return {"filter": {"user_id": {"$gte": p["lower_user_id"], "$lt": p["upper_user_id"]}}, "projection": {"user_id": 1}}
+
+@query("user_profiles.all_users", "user_profiles", "financial_summary.partition_bounds, forecast.stale_users")
+def profiles_all_users(p):
+    return {"filter": {"user_id": {"$type": "string"}}, "projection": {"user_id": 1, "_id": 0}, "sort": {"user_id": 1}}
+
+@query("user_profiles.batch", "user_profiles", "forecast.load_inputs")
+def profiles_batch(p):
+    return {"filter": {"user_id": {"$in": p["user_ids"]}}, "projection": {"user_id": 1, "cash_holdings": 1, "online_holdings": 1}}
+
+@query("monthly_budgets.by_user", "monthly_budgets", "api.monthly_budgets")
+def monthly_budgets_by_user(p):
+    return {"filter": {"user_id": p["user_id"]}, "projection": {"_id": 0}, "sort": {"month": -1}}
+
+@query("monthly_budgets.upsert", "monthly_budgets", "month_close.close_month")
+def monthly_budget_upsert(p):
+    return {"filter": {"user_id": p["user_id"], "month": p["previous_month"]}, "limit": 1}
+
+# ---------------------- Subscriptions and Debts ---------------------- #
+
+@query("subscriptions.by_user", "subscriptions", "api.subscriptions, api.charge_subscriptions, chat.get_full_user_profile")
+def subscriptions_by_user(p):
+    return {"filter": {"user_id": p["user_id"]}}
+
+@query("subscriptions.by_id", "subscriptions", "api.update_subscription, api.delete_subscription")
+def subscription_by_id(p):
+    return {"filter": {"_id": p["subscription_id"], "user_id": p["user_id"]}, "limit": 1}
+
+@query("subscriptions.totals", "subscriptions", "financial_summary.subscription_totals")
+def subscription_totals(p):
+    return {"pipeline": subscription_totals_pipeline({"$gte": p["lower_user_id"], "$lt": p["upper_user_id"]})}
+
+@query("subscriptions.batch", "subscriptions", "forecast.load_inputs")
+def subscriptions_batch(p):
+    return {"filter": {"user_id": {"$in": p["user_ids"]}}, "projection": {"_id": 0, "user_id": 1, "cost": 1}}
+
+@query("debts.by_user", "debts", "api.debts, chat.get_full_user_profile")
+def debts_by_user(p):
+    return {"filter": {"user_id": p["user_id"]}}
+
+@query("debts.payoff_order", "debts", "debt_payoff.user_payoff_plan")
+def debts_payoff_order(p):
+    return {"filter": {"user_id": p["user_id"]}, "projection": {"_id": 0, "user_id": 0}, "sort": {"created_at": 1}}
+
+@query("debts.totals", "debts", "financial_summary.debt_totals")
+def debt_totals(p):
+    return {"pipeline": debt_totals_pipeline(p["user_id"])}
+
+@query("debts.batch", "debts", "forecast.load_inputs")
+def debts_batch(p):
+    return {"filter": {"user_id": {"$in": p["user_ids"]}}, "projection": {"_id": 0, "user_id": 1, "amount": 1, "interest_rate": 1}}
+
+# ---------------------- Chat and Alerts ---------------------- #
+
+@query("chat_memory.recent", "chat_memory", "chat.get_recent_messages")
+def chat_recent(p):
+    return {"filter": {"user_id": p["user_id"]}, "sort": {"created_at": -1}, "limit": 10}
+
+@query("spend_alerts.recent", "spend_alerts", "api.alerts, anomaly.recent_alerts")
+def alerts_recent(p):
+    return {
+        "filter": {"user_id": p["user_id"], "dismissed": False, "created_at": {"$gte": p["alerts_since"]}},
+        "sort": {"created_at": -1},
+        "limit": 5
+    }
+
+@query("spend_alerts.dismiss", "spend_alerts", "api.dismiss_alert")
+def alert_dismiss(p):
+    return {"filter": {"_id": p["alert_id"], "user_id": p["user_id"]}, "limit": 1}
+
+@query("spend_stats.by_key", "spend_stats", "anomaly.update_stats")
+def spend_stats_by_key(p):
+    return {"filter": {"_id": p["spend_stats_id"]}, "limit": 1}
+
+# ---------------------- Derived Documents ---------------------- #
+
+@query("cash_flow_forecasts.by_user", "cash_flow_forecasts", "api.forecast, forecast.get_forecast")
+def forecast_by_user(p):
+    return {"filter": {"user_id": p["user_id"]}, "projection": {"_id": 0}, "limit": 1}
+
+@query("cash_flow_forecasts.all", "cash_flow_forecasts", "forecast.stale_users", full_scan=True)
+def forecasts_all(p):
+    return {"filter": {}, "projection": {"user_id": 1, "data_version": 1, "base_month": 1}}
+
+@query("financial_summaries.by_user", "financial_summaries", "financial_summary.get_financial_summary")
+def summary_by_user(p):
+    return {"filter": {"user_id": p["user_id"]}, "projection": {"summary": 1, "data_version": 1, "month": 1}, "limit": 1}
+
+@query("data_versions.by_user", "data_versions", "versioning.get_data_version, versioning.get_versions, versioning.bump_data_version")
+def version_by_user(p):
+    return {"filter": {"_id": p["user_id"]}, "limit": 1}
+
+@query("data_versions.batch", "data_versions", "financial_summary.summarize_partition")
+def versions_batch(p):
+    return {"filter": {"_id": {"$in": p["user_ids"]}}}
+
+@query("data_versions.all", "data_versions", "forecast.stale_users", full_scan=True)
+def versions_all(p):
+    return {"filter": {}, "projection": {"version": 1}}
+
+@query("recommendations.by_user", "recommendations", "recommender.get_recommendations")
+def recommendations_by_user(p):
+    return {"filter": {"_id": p["user_id"]}, "limit": 1}
+
+@query("categorizer_models.by_user", "categorizer_models", "categorizer.load_model")
+def categorizer_model_by_user(p):
+    return {"filter": {"_id": p["user_id"]}, "limit": 1}
+
+@query("job_runs.by_id", "job_runs", "month_close.close_month")
+def job_run_by_id(p):
+    return {"filter": {"_id": p["job_id"]}, "limit": 1}
+
+# ---------------------- Sign-in (Frontend/app.py) ---------------------- #
+
+@query("users.by_username", "users", "Frontend app.register_user, app.login_user")
+def user_by_username(p):
+    return {"filter": {"username": p["username"]}, "limit": 1}
+
+@query("users.by_id", "users", "Frontend app.collect_initial_financial_info")
+def user_by_id(p):
+    return {"filter": {"_id": p["user_object_id"]}, "limit": 1}
@@ -2,9 +2,16 @@ from prompt_utils import prompt_render
 from prompt_schema import ReceiptPrompt
 from pymongo import MongoClient
 from groq import Groq
+from llm_gateway import gateway, estimate_tokens, request_key, groq_usage
+from tracing import traced
 import os
 from dotenv import load_dotenv
 import json
+from versioning import bump_data_version
+from categories import resolve_category_ids, load_catalog, category_names
+import categorizer
+from anomaly import record_expenses
+from currency import user_currency
 
 load_dotenv()
 
@@ -12,41 +19,66 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME")
 MONGO_URI = os.getenv("MONGO_URI")
 
+@traced()
 def receipt_model(image_url):
-    llm = Groq(api_key=GROQ_API_KEY)
+    llm = Groq(api_key=GROQ_API_KEY, max_retries=0)
     image_prompt = prompt_render(ReceiptPrompt())
-    response = llm.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
-            {
-                "role":"user",
-                "content" : [
-                    {"type":"text","text":image_prompt},
-                    {"type":"image_url","image_url":{"url":image_url}}
-                ]
-            },
-            
-        ],
+    messages = [
+        {
+            "role":"user",
+            "content" : [
+                {"type":"text","text":image_prompt},
+                {"type":"image_url","image_url":{"url":image_url}}
+            ]
+        },
+    ]
+    response = gateway.invoke(
+        lambda: llm.chat.completions.create(model=MODEL_NAME, messages=messages),
+        key=request_key(MODEL_NAME, messages),
+        estimated_tokens=estimate_tokens(image_prompt, images=1),
+        usage=groq_usage,
+        model=MODEL_NAME
     )
     return response.choices[0].message.content
     
-def save_receipt_in_mongodb(user_id, llm_response, date, category):
+@traced()
+def save_receipt_in_mongodb(user_id, llm_response, date, category=None):
+    """Store each receipt line; with no category (or "auto") every item is categorized locally."""
     client = MongoClient(MONGO_URI)
     db = client['finance_ai']
     collection = db['transactions']
     data = json.loads(llm_response)
+    names = [item['name'] for item in data['products']]
+    if category and category.lower() != "auto":
+        category_id = resolve_category_ids(db, user_id, [category])[category]
+        item_ids = [category_id] * len(names)
+        # An explicit category is a label for every item on the receipt
+        categorizer.learn(db, user_id, names, item_ids)
+        display = {category_id: category}
+    else:
+        item_ids = categorizer.categorize(db, user_id, names)
+        display = category_names(load_catalog(db, user_id))
+    # Receipts are recorded in the user's currency
+    currency = user_currency(db, user_id)
     document = []
-    for item in data['products']:
+    for item, item_id in zip(data['products'], item_ids):
         doc = {
             "user_id":user_id,
             "transaction_date":date,
             "amount":item['price'],
+            "currency":currency,
             "amount_type":"debit",
-            "category":category,
+            "category":display.get(item_id, item_id.replace("_", " ").title()),
+            "category_id":item_id,
             "description":item['name']
         }
         document.append(doc)
-    if document:
-        collection.insert_many(document)
-        return True
-    return False
\ No newline at end of file
+    try:
+        if document:
+            collection.insert_many(document)
+            record_expenses(db, user_id, document)
+            bump_data_version(db, user_id)
+            return True
+        return False
+    finally:
+        client.close()
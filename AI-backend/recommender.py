@@ -0,0 +1,156 @@
+import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from langchain_groq import ChatGroq
+from langchain_core.messages import HumanMessage
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
+from chat import get_full_user_profile
+from llm_gateway import LLMUnavailableError, gateway, estimate_tokens, request_key, langchain_usage
+from prompt_schema import RecommendationPrompt, User
+from prompt_utils import prompt_render
+from versioning import get_data_version
+
+load_dotenv()
+
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+RECOMMENDATION_MODEL = os.environ.get('RECOMMENDATION_MODEL', "meta-llama/llama-4-maverick-17b-128e-instruct")
+RECOMMENDATION_WORKERS = int(os.environ.get('RECOMMENDATION_WORKERS', 2))
+# A refresh holds this lease so only one process regenerates a user's recommendations at a time
+REFRESH_LEASE_SECONDS = 180
+# After a failed refresh no new one starts until the backoff (doubling per consecutive failure) passes
+REFRESH_BACKOFF_SECONDS = float(os.environ.get('RECOMMENDATION_BACKOFF_SECONDS', 60))
+REFRESH_BACKOFF_MAX_SECONDS = float(os.environ.get('RECOMMENDATION_BACKOFF_MAX_SECONDS', 3600))
+# Consecutive failures after which a user with nothing cached gets an error instead of "pending"
+REFRESH_MAX_FAILURES = int(os.environ.get('RECOMMENDATION_MAX_FAILURES', 3))
+
+_executor = ThreadPoolExecutor(max_workers=RECOMMENDATION_WORKERS, thread_name_prefix="recommendations")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# ---------------------- Generation ---------------------- #
+
+def generate_recommendations(user_id):
+    llm = ChatGroq(model=RECOMMENDATION_MODEL, api_key=GROQ_API_KEY, max_retries=0)
+    profile = get_full_user_profile(user_id=user_id)
+    if profile is None:
+        raise ValueError(f"No financial profile for user {user_id}")
+    prompt = prompt_render(RecommendationPrompt(user=User(data=profile)))
+    messages = [HumanMessage(content=prompt)]
+    response = gateway.invoke(
+        lambda: llm.invoke(messages),
+        key=request_key(RECOMMENDATION_MODEL, prompt),
+        estimated_tokens=estimate_tokens(prompt),
+        usage=langchain_usage,
+        model=RECOMMENDATION_MODEL
+    )
+    return response.content
+
+# ---------------------- Background Refresh ---------------------- #
+
+def acquire_lease(db, user_id, now):
+    """Claim the refresh lease (cross-process single flight); False if another refresh holds it."""
+    try:
+        db.recommendations.update_one(
+            {"_id": user_id, "$or": [{"refresh_lease": {"$exists": False}}, {"refresh_lease": {"$lt": now}}]},
+            {"$set": {"refresh_lease": now + datetime.timedelta(seconds=REFRESH_LEASE_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The document exists with a live lease, so the upsert tried to insert a second one
+        return False
+
+def refresh(user_id):
+    client = MongoClient(MONGO_URI)
+    db = client['finance_ai']
+    try:
+        if not acquire_lease(db, user_id, datetime.datetime.now(datetime.timezone.utc)):
+            return
+        # Read the version first: a write during generation leaves the result marked stale
+        version = get_data_version(db, user_id)
+        try:
+            content = generate_recommendations(user_id)
+        except Exception as e:
+            print(f"Recommendation refresh failed for {user_id}: {e}")
+            db.recommendations.update_one(
+                {"_id": user_id},
+                {
+                    "$set": {"last_error": str(e), "last_error_at": datetime.datetime.now(datetime.timezone.utc)},
+                    "$inc": {"failures": 1},
+                    "$unset": {"refresh_lease": ""}
+                }
+            )
+            return
+        db.recommendations.update_one(
+            {"_id": user_id},
+            {
+                "$set": {
+                    "content": content,
+                    "data_version": version,
+                    "generated_at": datetime.datetime.now(datetime.timezone.utc)
+                },
+                "$unset": {"refresh_lease": "", "failures": "", "last_error": "", "last_error_at": ""}
+            }
+        )
+    finally:
+        client.close()
+        with _refreshing_lock:
+            _refreshing.discard(user_id)
+
+def schedule_refresh(user_id):
+    with _refreshing_lock:
+        if user_id in _refreshing:
+            return
+        _refreshing.add(user_id)
+    _executor.submit(refresh, user_id)
+
+def backoff_remaining(doc, now):
+    """Seconds until another refresh may start after the last failures (0 when none are pending)."""
+    failures = (doc or {}).get("failures", 0)
+    last_error_at = (doc or {}).get("last_error_at")
+    if not failures or last_error_at is None:
+        return 0.0
+    if last_error_at.tzinfo is None:
+        last_error_at = last_error_at.replace(tzinfo=datetime.timezone.utc)
+    backoff = min(REFRESH_BACKOFF_MAX_SECONDS, REFRESH_BACKOFF_SECONDS * 2 ** (failures - 1))
+    return max(0.0, backoff - (now - last_error_at).total_seconds())
+
+# ---------------------- Public API ---------------------- #
+
+def get_recommendations(user_id):
+    """Cached recommendations, served immediately and refreshed in the background when stale.
+
+    Returns None when nothing has been generated yet (a refresh has been started). Raises
+    LLMUnavailableError when nothing is cached and refreshes keep failing.
+    """
+    client = MongoClient(MONGO_URI)
+    db = client['finance_ai']
+    try:
+        version = get_data_version(db, user_id)
+        doc = db.recommendations.find_one(
+            {"_id": user_id},
+            {"content": 1, "data_version": 1, "generated_at": 1, "failures": 1, "last_error": 1, "last_error_at": 1}
+        )
+    finally:
+        client.close()
+
+    stale = not doc or doc.get("data_version") != version
+    wait = backoff_remaining(doc, datetime.datetime.now(datetime.timezone.utc))
+    if stale and not wait:
+        schedule_refresh(user_id)
+    if not doc or "content" not in doc:
+        if doc and doc.get("failures", 0) >= REFRESH_MAX_FAILURES:
+            raise LLMUnavailableError(
+                f"Recommendations could not be generated: {doc.get('last_error')}",
+                retry_after=wait or None
+            )
+        return None
+    return {
+        "recommendations": doc["content"],
+        "stale": stale,
+        "generated_at": doc["generated_at"].isoformat()
+    }
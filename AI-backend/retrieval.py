@@ -0,0 +1,289 @@
+import calendar
+import datetime
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from categorizer import BIAS_FEATURE, N_FEATURES, description_features
+from currency import convert, user_currency
+from versioning import get_versions
+from tracing import traced
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', 15))
+INDEX_CACHE_SIZE = int(os.environ.get('RETRIEVAL_INDEX_CACHE_SIZE', 64))
+
+# ObjectIds are generated by the writing process, so a row inserted concurrently elsewhere can
+# carry an id slightly older than the newest one indexed; every catch-up re-reads this window.
+CATCH_UP_OVERLAP = datetime.timedelta(minutes=2)
+
+INDEX_FIELDS = {
+    "transaction_date": 1, "amount": 1, "currency": 1, "amount_type": 1,
+    "category": 1, "category_id": 1, "transaction_mode": 1, "description": 1
+}
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTH_PATTERN = re.compile(r"\b(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b(?:\s+(\d{4}))?")
+RELATIVE_PATTERN = re.compile(r"\b(?:last|past|previous)\s+(\d+)\s+(day|week|month|year)s?\b")
+YEAR_PATTERN = re.compile(r"\b(20\d{2})\b")
+# "may" is usually the verb; only read it as the month after a preposition
+MAY_CONTEXT = re.compile(r"\b(?:in|during|for|of|since)\s+$")
+
+# ---------------------- Time Ranges ---------------------- #
+
+def month_range(year, month):
+    return datetime.date(year, month, 1), datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+def shift_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    return day.replace(year=year, month=month + 1, day=min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+def detect_time_range(query, today=None):
+    """Return (start, end, label) for the period a question is about, or None if it names none."""
+    today = today or datetime.date.today()
+    text = query.lower()
+
+    if "today" in text:
+        return today, today, "today"
+    if "yesterday" in text:
+        day = today - datetime.timedelta(days=1)
+        return day, day, "yesterday"
+    week_start = today - datetime.timedelta(days=today.weekday())
+    if "last week" in text or "previous week" in text:
+        return week_start - datetime.timedelta(days=7), week_start - datetime.timedelta(days=1), "last week"
+    if "this week" in text:
+        return week_start, today, "this week"
+    if "last month" in text or "previous month" in text:
+        last = today.replace(day=1) - datetime.timedelta(days=1)
+        return last.replace(day=1), last, "last month"
+    if "this month" in text:
+        return today.replace(day=1), today, "this month"
+    if "last year" in text or "previous year" in text:
+        return datetime.date(today.year - 1, 1, 1), datetime.date(today.year - 1, 12, 31), "last year"
+    if "this year" in text:
+        return datetime.date(today.year, 1, 1), today, "this year"
+
+    match = RELATIVE_PATTERN.search(text)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        if unit == "day":
+            start = today - datetime.timedelta(days=count)
+        elif unit == "week":
+            start = today - datetime.timedelta(weeks=count)
+        elif unit == "month":
+            start = shift_months(today, -count)
+        else:
+            start = shift_months(today, -12 * count)
+        return start, today, match.group(0)
+
+    match = next((m for m in MONTH_PATTERN.finditer(text) if m.group(1) != "may" or m.group(2) or MAY_CONTEXT.search(text[:m.start()])), None)
+    if match:
+        month = MONTHS[match.group(1)]
+        # Without a year, a month name means its most recent occurrence
+        year = int(match.group(2)) if match.group(2) else (today.year if month <= today.month else today.year - 1)
+        start, end = month_range(year, month)
+        return start, end, f"{calendar.month_name[month]} {year}"
+
+    match = YEAR_PATTERN.search(text)
+    if match:
+        year = int(match.group(1))
+        return datetime.date(year, 1, 1), datetime.date(year, 12, 31), str(year)
+    return None
+
+# ---------------------- Index ---------------------- #
+
+def transaction_text(doc):
+    kind = "income credit received" if doc.get("amount_type") == "credit" else "expense debit spent"
+    parts = [doc.get("description"), doc.get("category"), doc.get("transaction_mode"), kind]
+    return " ".join(str(part) for part in parts if part)
+
+def transaction_day(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return np.datetime64(value.strftime("%Y-%m-%d"), "D")
+    try:
+        return np.datetime64(str(value)[:10], "D")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+class TransactionIndex:
+    """Hashed TF-IDF index over one user's transactions, kept as CSR arrays and grown by appending."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.rewrites = None
+        self.newest = None
+        self.ids = set()
+        self.rows = []
+        self.dates = np.empty(0, dtype="datetime64[D]")
+        self.amounts = np.empty(0, dtype=np.float64)
+        self.currencies = np.empty(0, dtype=object)
+        self.credit = np.empty(0, dtype=bool)
+        self.categories = np.empty(0, dtype=object)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.weights = np.empty(0, dtype=np.float32)
+        self.doc_freq = np.zeros(N_FEATURES + 1, dtype=np.int64)
+
+    def add(self, docs):
+        docs = [doc for doc in docs if doc["_id"] not in self.ids]
+        if not docs:
+            return 0
+        indptr, indices, weights, seen = [], [], [], []
+        offset = len(self.indices)
+        for doc in docs:
+            counts = Counter(description_features(transaction_text(doc)))
+            norm = math.sqrt(sum((1 + math.log(count)) ** 2 for count in counts.values())) or 1.0
+            # The bias entry (weight 0) keeps every row non-empty for np.add.reduceat
+            indices.append(BIAS_FEATURE)
+            weights.append(0.0)
+            for feature, count in counts.items():
+                indices.append(feature)
+                weights.append((1 + math.log(count)) / norm)
+            seen.extend(counts)
+            indptr.append(offset + len(indices))
+            self.ids.add(doc["_id"])
+            self.rows.append({
+                "date": str(doc.get("transaction_date"))[:10],
+                "amount": doc.get("amount"),
+                "currency": doc.get("currency"),
+                "amount_type": doc.get("amount_type"),
+                "category": doc.get("category"),
+                "description": doc.get("description")
+            })
+
+        self.indptr = np.concatenate([self.indptr, np.asarray(indptr, dtype=np.int64)])
+        self.indices = np.concatenate([self.indices, np.asarray(indices, dtype=np.int64)])
+        self.weights = np.concatenate([self.weights, np.asarray(weights, dtype=np.float32)])
+        np.add.at(self.doc_freq, np.asarray(seen, dtype=np.int64), 1)
+        self.dates = np.concatenate([self.dates, np.array([transaction_day(doc.get("transaction_date")) for doc in docs], dtype="datetime64[D]")])
+        self.amounts = np.concatenate([self.amounts, np.array([float(doc.get("amount") or 0) for doc in docs])])
+        self.currencies = np.concatenate([self.currencies, np.array([doc.get("currency") for doc in docs], dtype=object)])
+        self.credit = np.concatenate([self.credit, np.array([doc.get("amount_type") == "credit" for doc in docs], dtype=bool)])
+        self.categories = np.concatenate([self.categories, np.array([doc.get("category_id") or "uncategorized" for doc in docs], dtype=object)])
+        newest = max(doc["_id"].generation_time for doc in docs)
+        self.newest = max(self.newest, newest) if self.newest else newest
+        return len(docs)
+
+    def in_range(self, start=None, end=None):
+        mask = np.ones(len(self.rows), dtype=bool)
+        if start is not None:
+            mask &= self.dates >= np.datetime64(start, "D")
+        if end is not None:
+            mask &= self.dates <= np.datetime64(end, "D")
+        return mask
+
+    def search(self, query, mask, k=RETRIEVAL_TOP_K):
+        """Indices of the k rows in `mask` most similar to the query; ties and misses go to the newest rows."""
+        if not mask.any():
+            return np.empty(0, dtype=np.int64)
+        idf = np.log((1 + len(self.rows)) / (1 + self.doc_freq)) + 1
+        query_weights = np.zeros(N_FEATURES + 1, dtype=np.float32)
+        features = description_features(query)
+        np.add.at(query_weights, np.asarray(features, dtype=np.int64), 1)
+        query_weights *= idf.astype(np.float32)
+        query_weights[BIAS_FEATURE] = 0.0
+
+        scores = np.add.reduceat(self.weights * query_weights[self.indices], self.indptr[:-1])
+        candidates = np.flatnonzero(mask)
+        # Sort by score, then by date so the fallback for unmatched questions is "most recent"
+        dates = self.dates[candidates]
+        age = np.where(np.isnat(dates), 0, -dates.astype(np.int64))
+        order = np.lexsort((age, -scores[candidates]))
+        return candidates[order[:k]]
+
+    def aggregate(self, mask, currency=None):
+        """Totals over the rows in `mask`, converted to `currency` (when given) at each row's date."""
+        amounts = np.zeros(len(self.rows))
+        amounts[mask] = self.amounts[mask]
+        if currency:
+            amounts[mask] = convert(self.amounts[mask], self.currencies[mask], self.dates[mask], currency)
+        categories, inverse = np.unique(self.categories[mask & ~self.credit], return_inverse=True)
+        spend = np.bincount(inverse, weights=amounts[mask & ~self.credit], minlength=len(categories))
+        by_category = sorted(zip(categories.tolist(), spend.round(2).tolist()), key=lambda item: -item[1])
+        return {
+            "transactions": int(mask.sum()),
+            "currency": currency,
+            "total_income": round(float(amounts[mask & self.credit].sum()), 2),
+            "total_expense": round(float(amounts[mask & ~self.credit].sum()), 2),
+            "expense_by_category": dict(by_category)
+        }
+
+# ---------------------- Index Cache ---------------------- #
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def load_index(db, user_id):
+    """Return the user's index, reading only transactions newer than the last catch-up.
+
+    Appending only covers inserts: when transactions were changed or removed (edits, backfills,
+    archiving), or the hot tier's count no longer matches the index, it is rebuilt from scratch.
+    """
+    version, rewrites = get_versions(db, user_id)
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None or (index.version is not None and index.rewrites != rewrites):
+            index = _indexes[user_id] = TransactionIndex()
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+
+    with index.lock:
+        if index.version is not None and version == index.version:
+            return index
+        query = {"user_id": user_id}
+        if index.newest is not None:
+            query["_id"] = {"$gte": ObjectId.from_datetime(index.newest - CATCH_UP_OVERLAP)}
+        index.add(db.transactions.find(query, INDEX_FIELDS).sort("_id", 1))
+        if db.transactions.count_documents({"user_id": user_id}) != len(index.rows):
+            rebuilt = TransactionIndex()
+            rebuilt.add(db.transactions.find({"user_id": user_id}, INDEX_FIELDS).sort("_id", 1))
+            rebuilt.version, rebuilt.rewrites = version, rewrites
+            with _indexes_lock:
+                if _indexes.get(user_id) is index:
+                    _indexes[user_id] = rebuilt
+            return rebuilt
+        index.version, index.rewrites = version, rewrites
+    return index
+
+# ---------------------- Chat Context ---------------------- #
+
+@traced()
+def transaction_context(user_id, query, k=RETRIEVAL_TOP_K, today=None):
+    """Top-k transactions relevant to the question plus totals for the period it asks about.
+
+    Without an explicit period the rows come from the whole history and the totals cover the current month.
+    """
+    today = today or datetime.date.today()
+    detected = detect_time_range(query, today)
+    client = MongoClient(MONGO_URI)
+    try:
+        index = load_index(client['finance_ai'], user_id)
+        currency = user_currency(client['finance_ai'], user_id)
+        with index.lock:
+            if detected:
+                start, end, label = detected
+                search_mask = totals_mask = index.in_range(start, end)
+            else:
+                start, end, label = today.replace(day=1), today, "this month"
+                search_mask = index.in_range()
+                totals_mask = index.in_range(start, end)
+            top = index.search(query, search_mask, k)
+            return {
+                "period": {"label": label, "start": start.isoformat(), "end": end.isoformat()},
+                "totals": index.aggregate(totals_mask, currency),
+                "relevant_transactions": [index.rows[i] for i in top]
+            }
+    finally:
+        client.close()
@@ -0,0 +1,272 @@
+import codecs
+import csv
+import datetime
+import hashlib
+import os
+import re
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from categories import resolve_category_ids, load_catalog, category_names
+import categorizer
+from versioning import bump_data_version
+from archive import archived_hashes
+from currency import convert, currency_code, user_currency
+
+load_dotenv()
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Header names we recognise for each transaction field (compared lower-cased)
+DEFAULT_COLUMNS = {
+    "date": ["date", "transaction date", "txn date", "value date", "posting date", "posted date"],
+    "description": ["description", "narration", "details", "particulars", "memo", "payee", "name"],
+    "amount": ["amount", "transaction amount", "amt"],
+    "debit": ["debit", "withdrawal", "withdrawal amt.", "withdrawal amount", "debit amount", "paid out"],
+    "credit": ["credit", "deposit", "deposit amt.", "deposit amount", "credit amount", "paid in"],
+    "category": ["category"],
+}
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%b-%Y", "%d %b %Y", "%Y%m%d"]
+
+OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+# ---------------------- Field Parsing ---------------------- #
+
+def parse_date(value, date_format=None):
+    value = value.strip()
+    formats = [date_format] if date_format else DATE_FORMATS
+    for fmt in formats:
+        try:
+            return datetime.datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value!r}")
+
+def parse_amount(value):
+    value = (value or "").strip().replace(",", "")
+    if not value:
+        return 0.0
+    # Bank exports write negatives as "(12.50)" or "12.50 DR"
+    negative = value.startswith("(") or value.upper().endswith("DR") or value.startswith("-")
+    number = float(re.sub(r"[^0-9.]", "", value) or 0)
+    return -number if negative else number
+
+def resolve_columns(header, mapping=None):
+    """Map our field names to column positions using an explicit mapping first, then known header names."""
+    lowered = [name.strip().lower() for name in header]
+    columns = {}
+    for field, candidates in DEFAULT_COLUMNS.items():
+        wanted = (mapping or {}).get(field)
+        names = [wanted.strip().lower()] if wanted else candidates
+        for name in names:
+            if name in lowered:
+                columns[field] = lowered.index(name)
+                break
+    if "date" not in columns or not ({"amount", "debit", "credit"} & set(columns)):
+        raise ValueError("Statement needs a date column and an amount (or debit/credit) column")
+    return columns
+
+# ---------------------- Readers ---------------------- #
+
+def iter_csv_rows(stream, mapping=None, date_format=None):
+    """Yield one parsed transaction per CSV line, reading the upload incrementally."""
+    reader = csv.reader(codecs.getreader("utf-8-sig")(stream, errors="replace"))
+    columns = resolve_columns(next(reader), mapping)
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index] if index is not None and index < len(row) else ""
+
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        try:
+            if "amount" in columns:
+                amount = parse_amount(cell(row, "amount"))
+            else:
+                amount = parse_amount(cell(row, "credit")) - abs(parse_amount(cell(row, "debit")))
+            yield {
+                "transaction_date": parse_date(cell(row, "date"), date_format),
+                "amount": amount,
+                "description": cell(row, "description").strip(),
+                "category": cell(row, "category").strip() or None,
+                "external_id": None
+            }
+        except ValueError:
+            yield None
+
+def iter_ofx_rows(stream, chunk_size=64 * 1024):
+    """Yield one parsed transaction per <STMTTRN> block; handles SGML (OFX 1.x) and XML (OFX 2.x)."""
+    reader = codecs.getreader("utf-8")(stream, errors="replace")
+    buffer = ""
+    current = None
+
+    def handle(text):
+        nonlocal current
+        for closing, tag, value in OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if not closing:
+                    current = {}
+                elif current is not None:
+                    yield current
+                    current = None
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+    while True:
+        chunk = reader.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        # Only parse up to the last tag start; its value may continue in the next chunk
+        cut = buffer.rfind("<")
+        text, buffer = buffer[:cut], buffer[cut:]
+        yield from (ofx_transaction(raw) for raw in handle(text))
+    yield from (ofx_transaction(raw) for raw in handle(buffer))
+
+def ofx_transaction(raw):
+    try:
+        return {
+            "transaction_date": parse_date(raw.get("DTPOSTED", "")[:8], "%Y%m%d"),
+            "amount": parse_amount(raw.get("TRNAMT")),
+            "description": (raw.get("NAME") or raw.get("MEMO") or "").strip(),
+            "category": None,
+            "external_id": raw.get("FITID")
+        }
+    except ValueError:
+        return None
+
+# ---------------------- Import ---------------------- #
+
+def content_hash(user_id, row, occurrence):
+    if row["external_id"]:
+        key = f"{user_id}|fitid|{row['external_id']}"
+    else:
+        description = " ".join(row["description"].lower().split())
+        # occurrence keeps genuinely repeated lines (two identical coffees on one day) apart
+        key = f"{user_id}|{row['transaction_date']}|{row['amount']:.2f}|{description}|{occurrence}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def ensure_import_index(db):
+    db.transactions.create_index(
+        [("user_id", 1), ("content_hash", 1)],
+        unique=True,
+        partialFilterExpression={"content_hash": {"$exists": True}}
+    )
+
+def import_statement(user_id, stream, fmt, mapping=None, date_format=None, currency=None):
+    """Stream a CSV/OFX statement into transactions in unordered batches.
+
+    Rows already imported (same content hash) are skipped via the unique index, and the
+    online balance is adjusted once at the end by the net of the rows actually inserted.
+    Rows are recorded in `currency` (default: the user's own).
+    """
+    if fmt == "csv":
+        rows = iter_csv_rows(stream, mapping, date_format)
+    elif fmt in ("ofx", "qfx"):
+        rows = iter_ofx_rows(stream)
+    else:
+        raise ValueError(f"Unsupported statement format: {fmt}")
+
+    client = MongoClient(MONGO_URI)
+    db = client['finance_ai']
+    try:
+        ensure_import_index(db)
+        reporting = user_currency(db, user_id)
+        currency = currency_code(currency) if currency else reporting
+        result = {"inserted": 0, "duplicates": 0, "invalid": 0}
+        net_change = 0.0
+        occurrences = {}
+        batch = []
+
+        def flush():
+            nonlocal net_change
+            inserted, duplicates = insert_batch(db, user_id, batch, currency)
+            result["inserted"] += len(inserted)
+            result["duplicates"] += duplicates
+            # The balance is kept in the user's currency
+            signed = [doc["amount"] if doc["amount_type"] == "credit" else -doc["amount"] for doc in inserted]
+            net_change += float(convert(signed, [currency] * len(signed), [doc["transaction_date"] for doc in inserted], reporting).sum())
+
+        for row in rows:
+            if row is None:
+                result["invalid"] += 1
+                continue
+            base = (row["transaction_date"], round(row["amount"], 2), row["description"].lower())
+            occurrences[base] = occurrences.get(base, 0) + 1
+            batch.append((row, content_hash(user_id, row, occurrences[base])))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+                batch = []
+        if batch:
+            flush()
+
+        if result["inserted"]:
+            db.user_profiles.update_one(
+                {"user_id": user_id},
+                [{"$set": {"online_holdings": {"$max": [0, {"$add": [{"$ifNull": ["$online_holdings", 0]}, net_change]}]}}}]
+            )
+            bump_data_version(db, user_id)
+        return result
+    finally:
+        client.close()
+
+def insert_batch(db, user_id, batch, currency):
+    # The unique index only covers the hot tier; rows imported before and since archived are skipped here
+    archived = archived_hashes(db, user_id, [row_hash for _, row_hash in batch])
+    batch = [(row, row_hash) for row, row_hash in batch if row_hash not in archived]
+    if not batch:
+        return [], len(archived)
+    labelled = [row for row, _ in batch if row["category"]]
+    unlabelled = [row for row, _ in batch if not row["category"]]
+    category_ids = resolve_category_ids(db, user_id, [row["category"] for row in labelled]) if labelled else {}
+
+    # Rows the statement left uncategorized are classified locally in one vectorized pass
+    predicted = iter(categorizer.categorize(db, user_id, [row["description"] for row in unlabelled]))
+    names = category_names(load_catalog(db, user_id)) if unlabelled else {}
+
+    documents = []
+    for row, row_hash in batch:
+        if row["category"]:
+            cid, name = category_ids[row["category"]], row["category"]
+        else:
+            cid = next(predicted)
+            name = names.get(cid, cid.replace("_", " ").title())
+        documents.append({
+            "user_id": user_id,
+            "transaction_date": row["transaction_date"],
+            "amount": abs(row["amount"]),
+            "currency": currency,
+            "amount_type": "credit" if row["amount"] > 0 else "debit",
+            "category": name,
+            "category_id": cid,
+            "transaction_mode": "online",
+            "description": row["description"],
+            "type": "import",
+            "content_hash": row_hash
+        })
+
+    failed = set()
+    try:
+        db.transactions.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        failed = {error["index"] for error in errors}
+    inserted = [doc for index, doc in enumerate(documents) if index not in failed]
+
+    # Categories that came with the statement train the user's categorizer (new rows only)
+    labels = [
+        (doc["description"], doc["category_id"])
+        for index, (doc, (row, _)) in enumerate(zip(documents, batch))
+        if row["category"] and index not in failed
+    ]
+    if labels:
+        categorizer.learn(db, user_id, *zip(*labels))
+    return inserted, len(failed) + len(archived)
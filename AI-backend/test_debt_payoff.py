@@ -0,0 +1,23 @@
+import datetime
+from debt_payoff import payoff_plan, payoff_summary
+
+TODAY = datetime.date(2026, 1, 15)
+
+def test_summary_is_none_when_every_debt_is_zero():
+    debts = [{"name": "a", "amount": 0.0, "interest_rate": 5.0}, {"name": "b", "amount": 0.0, "interest_rate": 12.0}]
+    assert payoff_summary(debts) is None
+    assert payoff_summary(debts, 5000) is None
+
+def test_summary_ignores_paid_off_debts():
+    debts = [
+        {"name": "paid", "amount": 0.0, "interest_rate": 20.0},
+        {"name": "car", "amount": 12000.0, "interest_rate": 9.0},
+    ]
+    summary = payoff_summary(debts, 1000)
+    assert summary["monthly_payment"] == 1000
+    assert summary["avalanche"]["months"] == summary["snowball"]["months"] == 13
+    assert summary["avalanche"]["total_interest"] > 0
+
+def test_plan_has_no_strategies_for_paid_off_debts():
+    plan = payoff_plan([{"name": "a", "amount": 0.0, "interest_rate": 5.0}], 1000, today=TODAY)
+    assert plan == {"strategies": {}, "sweep": [], "minimum_payment": 0.0}
@@ -0,0 +1,265 @@
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+import requests
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+load_dotenv()
+
+# W3C trace context: the frontend sends `traceparent` with every backend call, each route runs in a
+# server span under it, and Mongo commands and LLM calls become child spans. Finished spans are
+# exported as OTLP/JSON, either appended to TRACE_FILE (one export request per line, readable by
+# the OpenTelemetry Collector's otlpjsonfile receiver) or posted to an OTLP/HTTP collector.
+TRACE_EXPORT = os.environ.get("TRACE_EXPORT", "")  # "file", "otlp", or empty to disable
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "finance-ai-backend")
+# Applies to traces started here; a caller's traceparent decides for its own trace
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 1.0))
+TRACE_BATCH_SIZE = 256
+TRACE_FLUSH_SECONDS = 2.0
+# Spans waiting for export; more are dropped rather than slowing requests down
+TRACE_QUEUE_SIZE = 10000
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_ERROR = 2
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+RemoteParent = namedtuple("RemoteParent", ["trace_id", "span_id", "sampled"])
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+# ---------------------- Spans ---------------------- #
+
+class Span:
+    def __init__(self, name, trace_id, parent_id, sampled, kind=KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.kind = kind
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.status = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def fail(self, message):
+        self.status = (STATUS_ERROR, message)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.sampled and TRACE_EXPORT:
+                exporter.submit(self)
+
+def current():
+    return _current.get()
+
+def parse_traceparent(header):
+    match = TRACEPARENT.match((header or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return RemoteParent(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+
+def traceparent(span):
+    return f"00-{span.trace_id}-{span.span_id}-{'01' if span.sampled else '00'}"
+
+def start_span(name, kind=KIND_INTERNAL, attributes=None, parent=None):
+    """A span under `parent` (a Span or RemoteParent; default the current span), or a new trace."""
+    parent = parent or current()
+    if parent is None:
+        return Span(name, os.urandom(16).hex(), None, random.random() < TRACE_SAMPLE_RATE, kind, attributes)
+    return Span(name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+
+@contextmanager
+def span(name, kind=KIND_INTERNAL, **attributes):
+    """Run the block in a child span of the current one."""
+    active = start_span(name, kind, attributes)
+    token = _current.set(active)
+    try:
+        yield active
+    except Exception as e:
+        active.fail(str(e))
+        raise
+    finally:
+        _current.reset(token)
+        active.end()
+
+def traced(name=None):
+    """Decorator running a function in its own span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ---------------------- Requests ---------------------- #
+
+def begin_request(header, name, attributes=None):
+    """Open the server span for an incoming request; returns the handle for `end_request`."""
+    active = start_span(name, KIND_SERVER, attributes, parent=parse_traceparent(header))
+    return active, _current.set(active)
+
+def end_request(handle, status_code=None, error=None):
+    active, token = handle
+    active.set("http.response.status_code", status_code)
+    if error is not None:
+        active.fail(str(error))
+    elif status_code is not None and status_code >= 500:
+        active.fail(f"HTTP {status_code}")
+    _current.reset(token)
+    active.end()
+
+# ---------------------- Mongo Commands ---------------------- #
+
+class MongoSpans(monitoring.CommandListener):
+    """A client span per command issued inside a traced request or span."""
+
+    def __init__(self):
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        parent = current()
+        if not TRACE_EXPORT or parent is None or not parent.sampled:
+            return
+        target = event.command.get(event.command_name)
+        child = start_span(f"mongodb {event.command_name}", KIND_CLIENT, {
+            "db.system": "mongodb",
+            "db.namespace": event.database_name,
+            "db.operation.name": event.command_name,
+            "db.collection.name": target if isinstance(target, str) else None,
+        }, parent=parent)
+        with self._lock:
+            self._open[(event.request_id, event.connection_id)] = child
+
+    def succeeded(self, event):
+        self.finish(event)
+
+    def failed(self, event):
+        self.finish(event, error=event.failure)
+
+    def finish(self, event, error=None):
+        with self._lock:
+            child = self._open.pop((event.request_id, event.connection_id), None)
+        if child is None:
+            return
+        if error is not None:
+            child.fail(str(error.get("errmsg", error)) if isinstance(error, dict) else str(error))
+        child.end()
+
+monitoring.register(MongoSpans())
+
+# ---------------------- Export ---------------------- #
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_span(item):
+    encoded = {
+        "traceId": item.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": item.kind,
+        "startTimeUnixNano": str(item.start_ns),
+        "endTimeUnixNano": str(item.end_ns),
+        "attributes": [{"key": key, "value": otlp_value(value)} for key, value in item.attributes.items()],
+    }
+    if item.parent_id:
+        encoded["parentSpanId"] = item.parent_id
+    if item.status:
+        encoded["status"] = {"code": item.status[0], "message": item.status[1]}
+    return encoded
+
+def otlp_request(spans, service_name=TRACE_SERVICE_NAME):
+    """An OTLP/JSON ExportTraceServiceRequest."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "finance-ai"}, "spans": [otlp_span(item) for item in spans]}]
+    }]}
+
+class Exporter:
+    """Batches finished spans on a background thread so requests never wait on export."""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"exported": 0, "dropped": 0, "export_errors": 0}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def submit(self, item):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._count("dropped")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + TRACE_FLUSH_SECONDS
+            while len(batch) < TRACE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.export(batch)
+                self._count("exported", len(batch))
+            except Exception as e:
+                self._count("export_errors")
+                print(f"Error exporting spans: {e}")
+
+    @staticmethod
+    def export(batch):
+        body = json.dumps(otlp_request(batch), separators=(",", ":"))
+        if TRACE_EXPORT == "otlp":
+            response = requests.post(TRACE_OTLP_ENDPOINT, data=body, headers={"Content-Type": "application/json"}, timeout=5)
+            response.raise_for_status()
+        else:
+            with open(TRACE_FILE, "a", encoding="utf-8") as out:
+                out.write(body + "\n")
+
+exporter = Exporter()
+
+def get_stats():
+    return exporter.get_stats()
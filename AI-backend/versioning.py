@@ -0,0 +1,29 @@
+from pymongo import ReturnDocument, UpdateOne
+
+# Every write to a user's data bumps data_versions.<user_id>; caches on both the
+# backend and the Streamlit frontend key on this number. Writes that change or remove existing
+# transactions (rather than only adding new ones) also bump `rewrites`, so caches that catch up
+# on inserts alone know to rebuild.
+
+def get_data_version(db, user_id):
+    doc = db.data_versions.find_one({"_id": user_id})
+    return doc.get("version", 0) if doc else 0
+
+def get_versions(db, user_id):
+    """(version, rewrites) for the user."""
+    doc = db.data_versions.find_one({"_id": user_id}) or {}
+    return doc.get("version", 0), doc.get("rewrites", 0)
+
+def version_increment(rewrite):
+    return {"version": 1, "rewrites": 1} if rewrite else {"version": 1}
+
+def bump_data_version(db, user_id, rewrite=False):
+    doc = db.data_versions.find_one_and_update(
+        {"_id": user_id}, {"$inc": version_increment(rewrite)}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return doc["version"]
+
+def bump_data_versions(db, user_ids, rewrite=False):
+    operations = [UpdateOne({"_id": user_id}, {"$inc": version_increment(rewrite)}, upsert=True) for user_id in set(user_ids)]
+    if operations:
+        db.data_versions.bulk_write(operations, ordered=False)
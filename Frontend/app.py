@@ -1,9 +1,8 @@
 import streamlit as st
-from pymongo import MongoClient
 import re
 import bcrypt
 from datetime import datetime
-from db import create_mongodb_structure
+from db import create_mongodb_structure, get_database
 from home import home_page
 from budgets import budget_planning_page
 from debts import debts_page
@@ -11,21 +10,18 @@ from subscriptions import subscription_page
 from dashboard import render_dashboard
 from chatbot import chatbot
 from bson import ObjectId
-
-MONGO_URI = st.secrets["MONGO_URI"]
+from utils.api import api_write
+from utils import instrumentation, tracing
+from utils.categories import PREDEFINED_CATEGORIES
+from utils.currency import CURRENCY_OPTIONS
 
 # Initialize MongoDB client
 try:
-    client = MongoClient(MONGO_URI)
-    db = client["finance_ai"]
+    db = get_database()
     
     # Get collections
+    # Accounts stay here; everything else about a user is read and written through the backend
     users_collection = db["users"]
-    transactions_collection = db["transactions"]
-    subscriptions_collection = db["subscriptions"]
-    debts_collection = db["debts"]
-    budgets_collection = db["budgets"]
-    user_profiles_collection = db["user_profiles"]
 except Exception as e:
     st.error(f"Failed to connect to MongoDB: {e}")
     st.stop()
@@ -123,7 +119,7 @@ def collect_initial_financial_info(user_id):
     with st.form("initial_financial_form"):
         curr = st.selectbox(
             "💱 Currency",
-            ["INR - Indian Rupee", "USD - US Dollar", "EUR - Euro", "GBP - British Pound", "JPY - Japanese Yen"],
+            CURRENCY_OPTIONS,
             index=0
         )
         cash = st.number_input("💵 Current Cash Holdings", min_value=0.0)
@@ -131,10 +127,7 @@ def collect_initial_financial_info(user_id):
         stocks = st.number_input("📈 Investments in Stocks", min_value=0.0)
         savings = st.number_input("💰 Total Savings till now", min_value=0.0)
         # Predefined categories
-        predefined_categories = [
-            "Food", "Travel", "Rent", "Salary", "Shopping",
-            "Healthcare", "Utilities", "Miscellaneous", "Savings"
-        ]
+        predefined_categories = PREDEFINED_CATEGORIES
 
         selected_categories = st.multiselect(
             "📂 Choose the Categories you want to track",
@@ -151,17 +144,14 @@ def collect_initial_financial_info(user_id):
                 final_categories = list(set(selected_categories + custom_categories))
 
                 data = {
-                    "user_id": user_id,
                     "currency":curr,
                     "cash_holdings": cash,
                     "online_holdings": online,
                     "stock_investments": stocks,
                     "savings": savings,
-                    "total_savings": savings + stocks,
-                    "custom_categories": final_categories,  # 👈 store all selected+custom
-                    "created_at": datetime.now()
+                    "custom_categories": final_categories  # 👈 store all selected+custom (the backend builds the catalog)
                 }
-                user_profiles_collection.insert_one(data)
+                api_write("PUT", user_id, "profile", data)
                 st.success("Information saved successfully!")
                 st.session_state.authenticated = True
                 st.session_state.user = {
@@ -235,64 +225,66 @@ def main():
         else:
             st.info("Please sign in to access all features")
     
-    # Main content
-    if st.session_state.authenticated:
-        if st.session_state.current_page == "Home":
-            home_page(st.session_state.user["id"])
-        elif st.session_state.current_page == "chatbot":
-            chatbot(st.session_state.user["id"])
-        elif st.session_state.current_page == "Budget Planning":
-            budget_planning_page(st.session_state.user["id"])
-        elif st.session_state.current_page == "Debt Management":
-            debts_page(st.session_state.user["id"])
-        elif st.session_state.current_page == "Subscription Manager":
-            subscription_page(st.session_state.user["id"])
-        elif st.session_state.current_page == "Dashboard":
-            render_dashboard(st.session_state.user["id"])
-    else:
-        st.title("Welcome to Finance AI")
+    # Main content (traced per rerun; timed when instrumentation is enabled)
+    page = st.session_state.current_page if st.session_state.authenticated else "Sign In"
+    with tracing.trace(f"page {page}", page=page), instrumentation.rerun(page):
+        if st.session_state.authenticated:
+            if st.session_state.current_page == "Home":
+                home_page(st.session_state.user["id"])
+            elif st.session_state.current_page == "chatbot":
+                chatbot(st.session_state.user["id"])
+            elif st.session_state.current_page == "Budget Planning":
+                budget_planning_page(st.session_state.user["id"])
+            elif st.session_state.current_page == "Debt Management":
+                debts_page(st.session_state.user["id"])
+            elif st.session_state.current_page == "Subscription Manager":
+                subscription_page(st.session_state.user["id"])
+            elif st.session_state.current_page == "Dashboard":
+                render_dashboard(st.session_state.user["id"])
+        else:
+            st.title("Welcome to Finance AI")
         
-        tab1, tab2 = st.tabs(["Sign In", "Create Account"])
+            tab1, tab2 = st.tabs(["Sign In", "Create Account"])
         
-        if st.session_state.auth_tab == "Sign In":
-            st.query_params['tab'] = "sign-in"
-            tab = tab1
-        else:
-            st.query_params['tab'] = "create-account"
-            tab = tab2
+            if st.session_state.auth_tab == "Sign In":
+                st.query_params['tab'] = "sign-in"
+                tab = tab1
+            else:
+                st.query_params['tab'] = "create-account"
+                tab = tab2
         
-        with tab1:
-            with st.form("login_form"):
-                email = st.text_input("Email", key="login_email")
-                password = st.text_input("Password", type="password", key="login_password")
-                submit = st.form_submit_button("Sign In")
-                if submit:
-                    success, response = login_user(email, password)
-                    if success:
-                        st.success("Login successful!")
-                        st.session_state.current_page = "Home"
-                        st.rerun()
-                    else:
-                        st.error(response)
-            if st.button("Forgot Password?"):
-                st.session_state.show_reset = True
-                st.rerun()
+            with tab1:
+                with st.form("login_form"):
+                    email = st.text_input("Email", key="login_email")
+                    password = st.text_input("Password", type="password", key="login_password")
+                    submit = st.form_submit_button("Sign In")
+                    if submit:
+                        success, response = login_user(email, password)
+                        if success:
+                            st.success("Login successful!")
+                            st.session_state.current_page = "Home"
+                            st.rerun()
+                        else:
+                            st.error(response)
+                if st.button("Forgot Password?"):
+                    st.session_state.show_reset = True
+                    st.rerun()
         
-        with tab2:
-            with st.form("register_form"):
-                email = st.text_input("Email", key="register_email")
-                password = st.text_input("Password", type="password", key="register_password")
-                st.caption("Password must be at least 8 characters with uppercase, lowercase, and numbers")
-                confirm_password = st.text_input("Confirm Password", type="password", key="confirm_password")
-                submit = st.form_submit_button("Create Account")
-                if submit:
-                    success, msg = register_user(email, password, confirm_password)
-                    if success:
-                        st.success(msg)
-                        st.session_state.auth_tab = "Sign In"
-                        st.rerun()
-                    else:
-                        st.error(msg)
+            with tab2:
+                with st.form("register_form"):
+                    email = st.text_input("Email", key="register_email")
+                    password = st.text_input("Password", type="password", key="register_password")
+                    st.caption("Password must be at least 8 characters with uppercase, lowercase, and numbers")
+                    confirm_password = st.text_input("Confirm Password", type="password", key="confirm_password")
+                    submit = st.form_submit_button("Create Account")
+                    if submit:
+                        success, msg = register_user(email, password, confirm_password)
+                        if success:
+                            st.success(msg)
+                            st.session_state.auth_tab = "Sign In"
+                            st.rerun()
+                        else:
+                            st.error(msg)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,39 +1,57 @@
 import streamlit as st
-from pymongo import MongoClient , DESCENDING
 import pandas as pd
-import requests
 from datetime import datetime
-from dateutil import parser
-
+from utils.api import api_write, set_data_version
+from utils import backend_client
+from utils.cache import get_profile, get_budget, get_spend_by_category, get_monthly_budgets
+from utils.categories import category_names, get_catalog, resolve_category_id
+from utils.currency import currency_symbol
+from utils.instrumentation import timed
+
+WEEKS_PER_MONTH = 52 / 12
+FREQUENCIES = ["Weekly", "Monthly"]
+
+def expenses_frame(expenses, catalog):
+    df = pd.DataFrame(expenses, columns=["category", "category_id", "allocated_amount", "frequency"])
+    # Resolved through the catalog like transactions are, so aliases (Groceries -> food) line up
+    # with actual spend; older lines may carry no id or a plain slug
+    df["category_id"] = df["category"].map(lambda name: resolve_category_id(catalog, name))
+    df["allocated_amount"] = df["allocated_amount"].fillna(0.0).astype(float)
+    df["frequency"] = df["frequency"].fillna("Monthly")
+    # Weekly allocations are compared against monthly spend, so normalise them once here
+    df["monthly_amount"] = df["allocated_amount"] * df["frequency"].map({"Weekly": WEEKS_PER_MONTH}).fillna(1.0)
+    return df
+
+def build_budget_changes(stored_df, edited_df):
+    """Diff the edited grid against the stored expenses; the backend applies the changes in one bulk_write."""
+    merged = edited_df.merge(
+        stored_df[["category", "allocated_amount", "frequency"]],
+        on="category", how="left", suffixes=("", "_stored"), indicator=True
+    )
+    is_new = merged["_merge"] == "left_only"
+    changed = (merged["allocated_amount"] != merged["allocated_amount_stored"]) | (merged["frequency"] != merged["frequency_stored"])
+
+    selected = merged.assign(new=is_new)[(is_new & (merged["allocated_amount"] > 0)) | (~is_new & changed)]
+    return [
+        {
+            "category": row.category,
+            "allocated_amount": float(row.allocated_amount),
+            "frequency": row.frequency,
+            "new": bool(row.new)
+        }
+        for row in selected.itertuples(index=False)
+    ]
+
+@timed()
 def budget_planning_page(user_id):
     
-    BACKEND_URL = st.secrets["BACKEND_URL"]
-    
     st.title("Budget Planning")
 
-    # MongoDB connection
-    client = MongoClient(st.secrets["MONGO_URI"])
-    db = client['finance_ai']
-    budgets_collection = db['budgets']
-    transactions_collection = db['transactions']
-    user_profiles_collection = db['user_profiles']
-    monthly_budgets_collection = db['monthly_budgets']
-    
-    categories = user_profiles_collection.find_one({"user_id": user_id}).get("custom_categories", [])
-    currecy = user_profiles_collection.find_one({"user_id": user_id}).get("currency", "")
-    symbol = ""
-    if currecy == "INR - Indian Rupee":
-        symbol = "₹"
-    elif currecy == "USD - US Dollar":
-        symbol = "$"
-    elif currecy == "EUR - Euro":
-        symbol = "€"
-    elif currecy == "GBP - British Pound":
-        symbol = "£"
-    elif currecy == "JPY - Japanese Yen":
-        symbol = "¥"
+    profile = get_profile(user_id) or {}
+    categories = profile.get("custom_categories", [])
+    symbol = currency_symbol(user_id)
     with st.expander("🧠 Generate Budget from Prompt"):
-        prompt = st.text_area(f"Describe your budgeting needs", placeholder="e.g. I earn {symbol}50000 per month and want to save {symbol}10000. Allocate the rest across housing, food, travel, and fun.")
+        prompt = st.text_area(f"Describe your budgeting needs", placeholder=f"e.g. I earn {symbol}50000 per month and want to save {symbol}10000. Allocate the rest across housing, food, travel, and fun.")
         if st.button("🪄 Generate Budget from AI"):
             if prompt.strip() != "":
                 payload = {
@@ -41,8 +59,9 @@ def budget_planning_page(user_id):
                     "description": prompt
                 }
                 try:
-                    response = requests.post(f"{BACKEND_URL}/generate-budget", json=payload)
+                    response = backend_client.post("/generate-budget", json_body=payload)
                     if response.status_code == 200:
+                        set_data_version(user_id)
                         st.success("🎯 Budget generated successfully using AI!")
                         st.rerun()
                     else:
@@ -52,19 +71,8 @@ def budget_planning_page(user_id):
             else:
                 st.warning("✍️ Please enter a description prompt.")
 
-    user_budget = budgets_collection.find_one({"user_id": user_id})
-
-    # Initialize budget data if not present
-    if not user_budget:
-        budgets_collection.insert_one({
-            "user_id": user_id,
-            "budget_data": {
-                "income": 0,
-                "savings": 0,
-                "expenses": []
-            }
-        })
-        user_budget = budgets_collection.find_one({"user_id": user_id})
+    # An empty budget when the user has none yet; the first save creates it
+    user_budget = get_budget(user_id)
 
     # Set income and savings
     income = st.number_input(
@@ -84,99 +92,66 @@ def budget_planning_page(user_id):
     )
 
     if st.button("Save Income & Savings"):
-        budgets_collection.update_one(
-            {"user_id": user_id},
-            {"$set": {
-                "budget_data.income": income,
-                "budget_data.savings": savings
-            }}
-        )
+        api_write("PATCH", user_id, "budget", {"income": income, "savings": savings})
         st.success("Income and savings updated successfully.")
     
     with st.expander("## 💸 Set Allocated Budgets for Each Category", expanded=True):
-        if categories:
-            for category in categories:
-                # Check if category exists in current budget
-                existing_alloc = next(
-                    (item for item in user_budget["budget_data"]["expenses"] if item["category"] == category),
-                    None
+        stored_df = expenses_frame(user_budget["budget_data"].get("expenses", []), get_catalog(user_id))
+        # Every tracked category, plus any category already in the budget (e.g. AI generated)
+        editor_categories = list(dict.fromkeys(categories + stored_df["category"].tolist()))
+
+        if editor_categories:
+            editor_df = pd.DataFrame({"category": editor_categories}).merge(
+                stored_df[["category", "allocated_amount", "frequency"]], on="category", how="left"
+            )
+            editor_df["allocated_amount"] = editor_df["allocated_amount"].fillna(0.0)
+            editor_df["frequency"] = editor_df["frequency"].fillna("Monthly")
+
+            with st.form("bulk_budget_form"):
+                edited_df = st.data_editor(
+                    editor_df,
+                    column_config={
+                        "category": st.column_config.TextColumn("Category", disabled=True),
+                        "allocated_amount": st.column_config.NumberColumn(
+                            f"Budget ({symbol})", min_value=0.0, step=100.0, format="%.2f", required=True
+                        ),
+                        "frequency": st.column_config.SelectboxColumn("Frequency", options=FREQUENCIES, required=True)
+                    },
+                    hide_index=True,
+                    num_rows="fixed",
+                    use_container_width=True,
+                    key="budget_editor"
                 )
-
-                default_val = existing_alloc.get("allocated_amount", 0.0) if existing_alloc else 0.0
-                default_freq = existing_alloc.get("frequency", "Monthly") if existing_alloc else "Monthly"
-
-                st.markdown(f"#### {category}")
-                col1, col2 = st.columns([2, 1])
-                with col1:
-                    amount = st.number_input(
-                        f"Budget for {category}",
-                        min_value=0.0,
-                        step=100.0,
-                        format="%.2f",
-                        value=float(default_val),
-                        key=f"amount_{category}"
-                    )
-                with col2:
-                    frequency = st.selectbox(
-                        "Frequency",
-                        ["Weekly", "Monthly"],
-                        index=0 if default_freq == "Weekly" else 1,
-                        key=f"freq_{category}"
-                    )
-
-                if st.button(f"💾 Save Budget for {category}", key=f"save_{category}"):
-                    # Try to update existing
-                    update_result = budgets_collection.update_one(
-                        {"user_id": user_id, "budget_data.expenses.category": category},
-                        {
-                            "$set": {
-                                "budget_data.expenses.$.allocated_amount": amount,
-                                "budget_data.expenses.$.frequency": frequency
-                            }
-                        }
-                    )
-
-                    # If not updated, it means the category wasn't found, so insert it
-                    if update_result.modified_count == 0:
-                        budgets_collection.update_one(
-                            {"user_id": user_id},
-                            {
-                                "$push": {
-                                    "budget_data.expenses": {
-                                        "category": category,
-                                        "allocated_amount": amount,
-                                        "frequency": frequency
-                                    }
-                                }
-                            }
-                        )
-
-                    st.success(f"✅ Saved {symbol}{amount:.2f} for '{category}' ({frequency})")
+                submitted = st.form_submit_button("💾 Save All Budgets")
+
+            if submitted:
+                changes = build_budget_changes(stored_df, edited_df)
+                if changes:
+                    api_write("POST", user_id, "budget/expenses", {"changes": changes})
+                    st.success(f"✅ Saved {len(changes)} budget change(s)")
+                else:
+                    st.info("No budget changes to save.")
         else:
             st.warning("No custom categories found. Please add them in your profile.")
 
     # View Current Budget
     st.subheader("View Your Budget Plan")
 
-    user_budget = budgets_collection.find_one({"user_id": user_id})  # Re-fetch after updates
-    budget_df = pd.DataFrame(user_budget['budget_data']['expenses'])
-    if not budget_df.empty:
-        budget_df.rename(columns={"category": "Category", "allocated_amount": f"Budget ({symbol})"}, inplace=True)
-        st.write(f"**Income:** {symbol}{user_budget['budget_data']['income']:.2f}")
-        st.write(f"**Savings Goal:** {symbol}{user_budget['budget_data']['savings']:.2f}")
+    user_budget = get_budget(user_id)  # Re-fetch after updates (new data version)
+    plan_df = expenses_frame(user_budget['budget_data'].get('expenses', []), get_catalog(user_id))
+    if not plan_df.empty:
+        budget_df = plan_df.rename(columns={
+            "category": "Category",
+            "allocated_amount": f"Budget ({symbol})",
+            "frequency": "Frequency",
+            "monthly_amount": f"Monthly Equivalent ({symbol})"
+        })
+        st.write(f"**Income:** {symbol}{user_budget['budget_data'].get('income', 0):.2f}")
+        st.write(f"**Savings Goal:** {symbol}{user_budget['budget_data'].get('savings', 0):.2f}")
         st.dataframe(budget_df)
     else:
         st.info("No budget allocations yet.")
     
-    # Get current month and year
-    now = datetime.now()
-    start_of_month = datetime(now.year, now.month, 1).strftime("%Y-%m-%d")
-
-    # Optional: define start_of_next_month to be exclusive filter
-    if now.month == 12:
-        start_of_next_month = datetime(now.year + 1, 1, 1).strftime("%Y-%m-%d")
-    else:
-        start_of_next_month = datetime(now.year, now.month + 1, 1).strftime("%Y-%m-%d")
     st.subheader("📊 Budget vs. Expenses (This Month Only)")
 
     # Define start and end of current month
@@ -187,40 +162,27 @@ def budget_planning_page(user_id):
     else:
         start_of_next_month = datetime(today.year, today.month + 1, 1)
 
-    # Step 1: Fetch all debit transactions for the user
-    transactions = list(transactions_collection.find({
-        'user_id': user_id,
-        'amount_type': 'debit'
-    }))
-
-    # Step 2: Filter transactions for current month based on string date parsing
-    monthly_transactions = []
-    for tx in transactions:
-        try:
-            tx_date = parser.parse(tx['transaction_date'])  # Parses string to datetime
-            if start_of_month <= tx_date < start_of_next_month:
-                monthly_transactions.append(tx)
-        except:
-            continue  # Skip invalid date formats
-
-    expenses_df = pd.DataFrame(monthly_transactions)
-
-    if not expenses_df.empty:
-        # Normalize categories
-        expenses_df['category'] = expenses_df['category'].str.strip().str.capitalize()
-
-        # Aggregate monthly expenses by category
-        total_exp = expenses_df.groupby('category')['amount'].sum().abs().reset_index(name=f'Actual Expense ({symbol})')
+    # Debit totals per category id for the current month, grouped in the database
+    # (dates are stored as YYYY-MM-DD strings)
+    spend_df = get_spend_by_category(
+        user_id,
+        start_of_month.strftime("%Y-%m-%d"),
+        start_of_next_month.strftime("%Y-%m-%d")
+    )
 
-        # Load user budget
-        user_budget = budgets_collection.find_one({"user_id": user_id})
-        budget_df = pd.DataFrame(user_budget['budget_data']['expenses']) if user_budget else pd.DataFrame()
+    if not spend_df.empty:
+        total_exp = spend_df.assign(amount=spend_df["amount"].abs()).rename(columns={"amount": f'Actual Expense ({symbol})'})
 
-        if not budget_df.empty:
-            budget_df.rename(columns={"category": "category", "allocated_amount": f"Budget ({symbol})"}, inplace=True)
+        if not plan_df.empty:
+            budget_df = plan_df[["category_id", "category", "monthly_amount"]].rename(columns={"monthly_amount": f"Budget ({symbol})"})
 
-            # Merge budget with actuals
-            comparison = pd.merge(budget_df, total_exp, on='category', how='outer').fillna(0)
+            # Merge budget with actuals on the category id
+            comparison = pd.merge(budget_df, total_exp, on='category_id', how='outer')
+            names = category_names(user_id)
+            comparison['category'] = comparison['category'].fillna(
+                comparison['category_id'].map(lambda cid: names.get(cid, cid or "Uncategorized"))
+            )
+            comparison = comparison.drop(columns='category_id').fillna(0)
             comparison[f'Remaining ({symbol})'] = comparison[f'Budget ({symbol})'] - comparison[f'Actual Expense ({symbol})']
             comparison['Status'] = comparison[f'Remaining ({symbol})'].apply(lambda x: "Over Budget" if x < 0 else "Within Budget")
 
@@ -234,7 +196,7 @@ def budget_planning_page(user_id):
     st.subheader("📅 Previous Monthly Budgets")
 
     # Fetch monthly budgets for the user, sorted by month descending
-    monthly_docs = list(monthly_budgets_collection.find({"user_id": user_id}).sort("month", DESCENDING))
+    monthly_docs = get_monthly_budgets(user_id)
 
     if monthly_docs:
         for doc in monthly_docs:
@@ -245,20 +207,21 @@ def budget_planning_page(user_id):
             df = pd.DataFrame(doc['budget_data'])
 
             if not df.empty:
-                df = df[["category", "allocated_amount", "frequency", "actual_spent"]]
-                df.columns = ["Category", f"Allocated ({symbol})", "Frequency", f"Spent ({symbol})"]
-                df[f"Remaining ({symbol})"] = df[f"Allocated ({symbol})"] - df[f"Spent ({symbol})"]
+                # Snapshots from before weekly lines were normalised carry no monthly_amount
+                if "monthly_amount" not in df:
+                    df["monthly_amount"] = df["allocated_amount"]
+                df = df[["category", "allocated_amount", "frequency", "monthly_amount", "actual_spent"]]
+                df.columns = ["Category", f"Allocated ({symbol})", "Frequency", f"Monthly Equivalent ({symbol})", f"Spent ({symbol})"]
+                df[f"Remaining ({symbol})"] = df[f"Monthly Equivalent ({symbol})"] - df[f"Spent ({symbol})"]
                 df["Status"] = df[f"Remaining ({symbol})"].apply(lambda x: "Over Budget" if x < 0 else "Within Budget")
 
                 st.dataframe(df, use_container_width=True)
 
-                total_allocated = df[f"Allocated ({symbol})"].sum()
+                total_allocated = df[f"Monthly Equivalent ({symbol})"].sum()
                 total_spent = df[f"Spent ({symbol})"].sum()
                 st.markdown(f"**💰 Total Allocated**: {symbol}{total_allocated:.2f} | **📉 Total Spent**: {symbol}{total_spent:.2f}")
                 st.divider()
             else:
                 st.info("No categories in this month's budget.")
     else:
-        st.info("No previous monthly budgets available.")
-
-    client.close()
\ No newline at end of file
+        st.info("No previous monthly budgets available.")
\ No newline at end of file
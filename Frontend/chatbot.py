@@ -1,8 +1,8 @@
 import streamlit as st
 import requests
 import time
-
-API_ENDPOINT = st.secrets["BACKEND_URL"]
+from utils import backend_client
+from utils.instrumentation import timed
 
 def typewriter_effect(text, delay=0.005, is_markdown=True):
     placeholder = st.empty()
@@ -15,6 +15,7 @@ def typewriter_effect(text, delay=0.005, is_markdown=True):
             placeholder.write(typed_text)
         time.sleep(delay)
 
+@timed()
 def chatbot(user_id):
 
     # Set the app title
@@ -38,10 +39,7 @@ def chatbot(user_id):
         st.chat_message("user").markdown(prompt)
         
         try:
-            response = requests.post(
-                f"{API_ENDPOINT}/chat",
-                json={"user_id": user_id, "query": prompt}
-            )
+            response = backend_client.post("/chat", json_body={"user_id": user_id, "query": prompt})
             
             if response.status_code == 200:
                 api_response = response.json()
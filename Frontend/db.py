@@ -1,5 +1,14 @@
 from pymongo import MongoClient
 import streamlit as st
+from utils.instrumentation import command_timer
+
+@st.cache_resource
+def get_client():
+    """Shared MongoClient (and connection pool) for the whole Streamlit process"""
+    return MongoClient(st.secrets["MONGO_URI"], event_listeners=[command_timer])
+
+def get_database():
+    return get_client()["finance_ai"]
 
 @st.cache_resource
 def create_mongodb_structure():
@@ -12,25 +21,9 @@ def create_mongodb_structure():
         # Create or access the database
         db = client["finance_ai"]
         
-        # Create collections (equivalent to tables in SQL)
-        users_collection = db["users"]
-        transactions_collection = db["transactions"]
-        subscriptions_collection = db["subscriptions"]
-        debts_collection = db["debts"]
-        budgets_collection = db["budgets"]
-        user_profiles_collection = db["user_profiles"]
-        monthly_budgets_collection = db["monthly_budgets"]
-        chat_memory_collection = db["chat_memory"]
-        
-        # Create indexes for faster queries
-        users_collection.create_index("username", unique=True)
-        transactions_collection.create_index("user_id")
-        subscriptions_collection.create_index("user_id")
-        debts_collection.create_index("user_id")
-        budgets_collection.create_index("user_id", unique=True)
-        user_profiles_collection.create_index("user_id", unique=True)
-        monthly_budgets_collection.create_index("user_id", unique=True)
-        chat_memory_collection.create_index("user_id")
+        # Sign-in is the only collection the frontend reads directly; the backend creates every
+        # other index at startup (AI-backend/indexes.py)
+        db["users"].create_index("username", unique=True)
         
         print("MongoDB database and collections created successfully")
         return db
@@ -1,22 +1,87 @@
 import streamlit as st
-from pymongo import MongoClient
 import pandas as pd
-from datetime import datetime
+import plotly.express as px
+from utils.api import api_write, get_data_version
+from utils import backend_client
+from utils.cache import get_debts
+from utils.currency import currency_symbol, format_amount
+from utils.instrumentation import timed
 
+# ------------------ Payoff Planner ------------------
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def fetch_payoff_plan(user_id, version, monthly_payment, custom_order):
+    response = backend_client.post(
+        "/debt-payoff",
+        json_body={"user_id": user_id, "monthly_payment": monthly_payment, "custom_order": list(custom_order)},
+        idempotent=True
+    )
+    response.raise_for_status()
+    return response.json()
+
+@timed()
+def payoff_planner(user_id, debts):
+    st.subheader("📉 Payoff Planner")
+    total = sum(float(d.get("amount", 0)) for d in debts)
+    symbol = currency_symbol(user_id)
+    monthly_payment = st.number_input(
+        f"Monthly amount for debt repayment ({symbol})", min_value=0.0, step=500.0,
+        value=float(round(total * 0.05, -2)), format="%.2f"
+    )
+    custom_order = st.multiselect(
+        "Custom order (pay these first, in this order)", [d["name"] for d in debts],
+        help="Debts you leave out follow by priority, then interest rate."
+    )
+    try:
+        plan = fetch_payoff_plan(user_id, get_data_version(user_id), monthly_payment, tuple(custom_order))
+    except Exception as e:
+        st.error(f"⚠️ Could not compute a payoff plan: {e}")
+        return
+
+    strategies = plan["strategies"]
+    if not strategies:
+        st.success("🎉 All your debts are paid off.")
+        return
+
+    if monthly_payment < plan["minimum_payment"]:
+        st.warning(f"This is below the minimum due this month ({format_amount(symbol, plan['minimum_payment'])}); balances may never clear.")
+
+    columns = st.columns(len(strategies))
+    for column, (name, result) in zip(columns, strategies.items()):
+        with column:
+            st.metric(f"{name.title()}", result["payoff_date"] or "Never", f"{format_amount(symbol, result['total_interest'], 0)} interest", delta_color="off")
+            st.caption(" → ".join(result["order"]))
+
+    schedules = pd.concat(
+        [pd.DataFrame(result["schedule"]).assign(strategy=name.title()) for name, result in strategies.items() if result["schedule"]],
+        ignore_index=True
+    )
+    if not schedules.empty:
+        st.plotly_chart(px.line(schedules, x="month", y="balance", color="strategy", title="Remaining balance"), use_container_width=True)
+
+    sweep = pd.DataFrame(plan["sweep"])
+    if not sweep.empty:
+        melted = sweep.melt(
+            id_vars="monthly_payment",
+            value_vars=[f"{name}_interest" for name in strategies],
+            var_name="strategy", value_name="total_interest"
+        )
+        melted["strategy"] = melted["strategy"].str.replace("_interest", "").str.title()
+        st.plotly_chart(
+            px.line(melted, x="monthly_payment", y="total_interest", color="strategy", title="Total interest by monthly payment"),
+            use_container_width=True
+        )
+
+@timed()
 def debts_page(user_id):
     st.title("Debt & Loan Tracker")
 
-    # MongoDB connection
-    client = MongoClient(st.secrets["MONGO_URI"])
-    db = client["finance_ai"]
-    debts_collection = db["debts"]
-
     # --- Add New Debt ---
     st.subheader("Add a New Debt or Loan")
+    symbol = currency_symbol(user_id)
 
     with st.form("add_debt_form"):
         name = st.text_input("Debt/Loan Name", placeholder="e.g., Car Loan")
-        amount = st.number_input("Loan Amount (₹)", min_value=0.0, step=100.0, format="%.2f")
+        amount = st.number_input(f"Loan Amount ({symbol})", min_value=0.0, step=100.0, format="%.2f")
         interest_rate = st.number_input("Interest Rate (%)", min_value=0.0, step=0.1, format="%.2f")
         priority = st.selectbox("Priority", options=["High", "Medium", "Low"])
         submitted = st.form_submit_button("Add Debt")
@@ -26,31 +91,28 @@ def debts_page(user_id):
                 st.warning("Please enter a name for the debt.")
             else:
                 debt_doc = {
-                    "user_id": user_id,
                     "name": name.strip(),
                     "amount": amount,
                     "interest_rate": interest_rate,
-                    "priority": priority,
-                    "created_at": datetime.now()
+                    "priority": priority
                 }
-                debts_collection.insert_one(debt_doc)
+                api_write("POST", user_id, "debts", debt_doc)
                 st.success(f"Added '{name}' to your debt records!")
 
     # --- View Existing Debts ---
     st.subheader("Your Existing Debts & Loans")
-    debts = list(debts_collection.find({"user_id": user_id}))
+    debts = get_debts(user_id)
     if debts:
         debt_df = pd.DataFrame(debts)
         debt_df.drop(columns=["_id", "user_id"], inplace=True, errors="ignore")
         debt_df = debt_df.rename(columns={
             "name": "Debt Name",
-            "amount": "Amount (₹)",
+            "amount": f"Amount ({symbol})",
             "interest_rate": "Interest Rate (%)",
             "priority": "Priority",
             "created_at": "Created At"
         })
         st.dataframe(debt_df)
+        payoff_planner(user_id, debts)
     else:
-        st.info("You have not recorded any debts or loans yet.")
-
-    client.close()
\ No newline at end of file
+        st.info("You have not recorded any debts or loans yet.")
\ No newline at end of file
@@ -1,103 +1,95 @@
 import streamlit as st
-from pymongo import MongoClient
-from datetime import datetime
+from datetime import datetime, timedelta
 import pandas as pd
-import requests
-import base64
 import json
-from bson import ObjectId
+import os
+import tempfile
 import time
-from utils.categories import get_user_categories, add_custom_category
-
-BACKEND_URL = st.secrets["BACKEND_URL"]
-
-# ------------------ MongoDB Utilities ------------------
-def get_db():
-    client = MongoClient(st.secrets["MONGO_URI"])
-    db = client['finance_ai']
-    return db, client
-
-def add_transaction(transactions):
-    client = MongoClient(st.secrets["MONGO_URI"])
-    db = client['finance_ai']
-    collection = db['transactions']
-    collection.insert_one(transactions)
-    client.close()
-
-def get_transactions(user_id):
-    client = MongoClient(st.secrets["MONGO_URI"])
-    db = client['finance_ai']
-    collection = db['transactions']
-    transactions = list(collection.find({"user_id": user_id}))
-    client.close()
-    return transactions
-
+from utils.categories import PREDEFINED_CATEGORIES, get_user_categories, add_custom_category, category_names
+from utils.api import api_write, get_data_version, set_data_version
+from utils import backend_client
+from utils.cache import get_transactions_frame
+from utils.anomaly import get_alerts, dismiss_alert
+from utils.currency import CURRENCY_SYMBOLS, user_currency
+from utils.instrumentation import timed
+
+AUTO_CATEGORY = "✨ Auto-detect"
+EXPORT_CHUNK_BYTES = 1 << 20
+
+# ------------------ Backend Writes ------------------
+def add_transaction(user_id, transaction):
+    """The backend stores it, updates spend alerts and moves the matching holdings"""
+    api_write("POST", user_id, "transactions", transaction)
+
+@timed()
 def auto_add_subscriptions(user_id):
-    client = MongoClient(st.secrets["MONGO_URI"])
-    db = client['finance_ai']
-    subscriptions = db['subscriptions']
-    transactions = db['transactions']
-
-    today = datetime.utcnow()
-    start_date = datetime(today.year, today.month, 1)
-
-    # Get first day of next month
-    if today.month == 12:
-        end_date = datetime(today.year + 1, 1, 1)
-    else:
-        end_date = datetime(today.year, today.month + 1, 1)
-
-    subs = list(subscriptions.find({"user_id": user_id}))
-
-    for sub in subs:
-        sub_name = sub['name']
-        sub_cost = sub['cost']
-
-        existing_expense = transactions.find_one({
-            "user_id": user_id,
-            "description": f"Subscription: {sub_name}",
-            "amount_type": "expense",
-            "transaction_date": {
-                "$gte": start_date,
-                "$lt": end_date
-            }
-        })
-
-        if not existing_expense:
-            new_expense = {
-                "user_id": user_id,
-                "amount": sub_cost,
-                "amount_type": "expense",
-                "category": "Subscription",
-                "description": f"Subscription: {sub_name}",
-                "transaction_date": today
-            }
-            transactions.insert_one(new_expense)
+    # Only re-check when the month or the user's data changed since this session last checked
+    check_key = (datetime.utcnow().strftime("%Y-%m"), get_data_version(user_id))
+    if st.session_state.get(f"subscriptions_checked_{user_id}") == check_key:
+        return
 
-    client.close()
+    api_write("POST", user_id, "subscription-charges")
+    st.session_state[f"subscriptions_checked_{user_id}"] = (check_key[0], get_data_version(user_id))
     
-# ------------------ Get Recommendations ------------------
-class MongoJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
+# ------------------ Export ------------------
+def clear_export():
+    export = st.session_state.pop("export_file", None)
+    if export and os.path.exists(export["path"]):
+        os.remove(export["path"])
+
+def prepare_export(params, file_name):
+    """Stream the export into a temp file chunk by chunk; only the path is kept in the session."""
+    clear_export()
+    with backend_client.get("/export-transactions", params=params, stream=True) as response:
+        if response.status_code != 200:
+            raise RuntimeError(response.json().get("error", response.text))
+        with tempfile.NamedTemporaryFile("wb", suffix=os.path.splitext(file_name)[1], delete=False) as handle:
+            try:
+                for chunk in response.iter_content(EXPORT_CHUNK_BYTES):
+                    handle.write(chunk)
+            except Exception:
+                handle.close()
+                os.remove(handle.name)
+                raise
+    st.session_state["export_file"] = {
+        "params": params, "path": handle.name, "file_name": file_name,
+        "mime": response.headers.get("Content-Type")
+    }
 
+# ------------------ Get Recommendations ------------------
 def fetch_recommendations(user_id):
+    """Cached recommendations from the backend; it answers at once and refreshes stale ones in the background"""
     try:
-        response = requests.post(
-            url=f"{BACKEND_URL}/get-recommendations",
-            json={"user_id": user_id},
-            timeout=60
-        )
+        # Only reads the cached result, so it is safe to retry
+        response = backend_client.post("/get-recommendations", json_body={"user_id": user_id}, idempotent=True)
         if response.status_code == 200:
             return response.json()
+        elif response.status_code == 202:
+            return {"pending": True}
         else:
             return {"error": response.json().get("error", "Unknown error")}
     except Exception as e:
         return {"error": str(e)}
+
+@timed()
+def show_recommendations(user_id):
+    with st.expander("🧠 Personalized Recommendations"):
+        result = fetch_recommendations(user_id)
+        if result.get("pending"):
+            st.info("⏳ Your recommendations are being prepared. Check back in a moment.")
+            st.button("🔄 Check again", key="refresh_recommendations")
+        elif result.get("error"):
+            st.error(f"⚠️ Could not load recommendations: {result['error']}")
+        else:
+            content = result["recommendations"]
+            # Animate only the first time a given set of recommendations is shown
+            if st.session_state.get("shown_recommendations") != content:
+                typewriter_effect(content)
+                st.session_state["shown_recommendations"] = content
+            else:
+                st.markdown(content, unsafe_allow_html=True)
+            if result.get("stale"):
+                st.caption("Updating with your latest activity; refresh the page shortly to see it.")
     
 # Typing animation function
 def typewriter_effect(text, delay=0.005, is_markdown=True):
@@ -111,68 +103,55 @@ def typewriter_effect(text, delay=0.005, is_markdown=True):
             placeholder.write(typed_text)
         time.sleep(delay)
 
-def update_user_profile(user_id, amount, amount_type, transaction_mode, category=None):
-    db, client = get_db()
-    profile = db['user_profiles'].find_one({"user_id": user_id})
-    if not profile:
-        client.close()
-        return
-
-    cash = float(profile.get("cash_holdings", 0))
-    online = float(profile.get("online_holdings", 0))
-    stock = float(profile.get("stock_investments", 0))
-    savings = float(profile.get("savings", 0))
-    total_savings = float(profile.get("total_savings", 0))
-
-    if transaction_mode == "cash" and category != "Savings":
-        if amount_type == "credit":
-            cash += amount
-        else:
-            cash = max(0, cash - amount)
-
-    elif transaction_mode == "online":
-        if amount_type == "credit":
-            online += amount
-        else:
-            online = max(0, online - amount)
-
-    elif transaction_mode == "stock":
-        if amount_type == "debit":
-            stock += amount
-            online = max(0, online - amount)
-        else:
-            online += amount
-            stock = max(0, stock - amount)
-
-    elif category == "Savings" and transaction_mode == "cash":
-        savings += amount
-        
-    total_savings = stock + savings
+# ------------------ Categorizer ------------------
+def suggest_category(user_id, description):
+    """Category name predicted by the backend's local categorizer (None if unavailable)"""
+    try:
+        response = backend_client.post("/categorize", json_body={"user_id": user_id, "descriptions": [description]}, idempotent=True)
+        response.raise_for_status()
+        category_id = response.json()["category_ids"][0]
+    except Exception as e:
+        print(f"Categorizer unavailable: {e}")
+        return None
+    return category_names(user_id).get(category_id, category_id.replace("_", " ").title())
 
-    db['user_profiles'].update_one(
-        {"user_id": user_id},
-        {"$set": {
-            "cash_holdings": cash,
-            "online_holdings": online,
-            "stock_investments": stock,
-            "savings": savings,
-            "total_savings": total_savings
-        }}
-    )
-    client.close()
+def send_category_feedback(user_id, description, category):
+    try:
+        backend_client.post(
+            "/categorizer-feedback",
+            json_body={"user_id": user_id, "descriptions": [description], "categories": [category]}
+        )
+    except Exception as e:
+        print(f"Could not send category feedback: {e}")
 
 # ------------------ Main Page ------------------
+# ------------------ Spending Alerts ------------------
+ALERT_ICONS = {"anomaly": "🔎", "burn_rate": "⏱️", "over_budget": "🚨"}
+
+@timed()
+def show_alerts(user_id):
+    alerts = get_alerts(user_id)
+    if not alerts:
+        return
+    st.markdown("### 🔔 Spending Alerts")
+    for alert in alerts:
+        col1, col2 = st.columns([6, 1])
+        col1.warning(f"{ALERT_ICONS.get(alert['kind'], '⚠️')} {alert['message']}")
+        if col2.button("Dismiss", key=f"dismiss_alert_{alert['_id']}"):
+            dismiss_alert(user_id, alert["_id"])
+            st.rerun()
+
+@timed()
 def home_page(user_id):
     st.title("💰 Personal Finance Tracker")
+    show_alerts(user_id)
+    show_recommendations(user_id)
 
     with st.expander("➕ Add New Transaction", expanded=True):
         # Step 1: Fetch categories for current user
         all_categories = get_user_categories(user_id)
         if not all_categories:
-            all_categories = [
-                "Food", "Travel", "Rent", "Salary", "Shopping",
-                "Healthcare", "Utilities", "Miscellaneous", "Savings"
-            ]
+            all_categories = PREDEFINED_CATEGORIES
 
         # Step 2: Show Add Custom Category Form
         with st.form("add_custom_category_form"):
@@ -197,51 +176,60 @@ def home_page(user_id):
         col1, col2 = st.columns(2)
         with col1:
             date = st.date_input("📅 Date", value=datetime.today())
-            category = st.selectbox("📂 Category", all_categories)
+            category = st.selectbox("📂 Category", [AUTO_CATEGORY] + list(all_categories))
         with col2:
             amount = st.number_input("💸 Amount", min_value=0.0, format="%.2f")
             amount_type = st.radio("📈 Type", ["Income", "Expense"], horizontal=True)
+        # Recorded as made; totals and charts convert to your profile currency
+        currency_codes = list(CURRENCY_SYMBOLS)
+        default_currency = user_currency(user_id)
+        currency_index = currency_codes.index(default_currency) if default_currency in currency_codes else 0
+        currency = st.selectbox("💱 Currency", currency_codes, index=currency_index)
 
         transaction_mode = st.selectbox("💳 Transaction Mode", ["cash", "online", "stock"])
         description = st.text_input("📝 Description")
 
         if st.button("✅ Add Transaction"):
             trans_type = "credit" if amount_type == "Income" else "debit"
+            if category == AUTO_CATEGORY:
+                category = (description and suggest_category(user_id, description)) or "Miscellaneous"
+            elif description:
+                # A category picked by hand is a training label for the categorizer
+                send_category_feedback(user_id, description, category)
             transaction = {
-                "user_id": user_id,
                 "transaction_date": date.strftime("%Y-%m-%d"),
                 "amount": amount,
+                "currency": currency,
                 "amount_type": trans_type,
                 "category": category,
                 "transaction_mode": transaction_mode,
                 "description": description,
                 "type": "manual"
             }
-            add_transaction(transaction)
-            update_user_profile(user_id, amount, trans_type, transaction_mode, category=category)
-            st.success("🎉 Transaction added successfully!")
+            add_transaction(user_id, transaction)
+            st.success(f"🎉 Transaction added successfully under {category}!")
             
     # ========== Section 2: Upload Receipt ==========
     with st.expander("📸 Upload and Parse Receipt"):
         uploaded_file = st.file_uploader("Upload receipt image", type=["png", "jpg", "jpeg"])
-        category = st.selectbox("Select receipt category", ["Groceries", "Bills", "Utilities", "Shopping", "Others"])
+        category = st.selectbox("Select receipt category", [AUTO_CATEGORY, "Groceries", "Bills", "Utilities", "Shopping", "Others"])
 
         if st.button("📤 Parse Receipt"):
             if uploaded_file is not None:
-                # Convert image to base64
-                image_bytes = uploaded_file.read()
-                base64_image = base64.b64encode(image_bytes).decode('utf-8')
-                image_url = f"data:image/jpeg;base64,{base64_image}"
-
-                payload = {
-                    "image_url": image_url,
+                # Sent as a raw multipart upload (no base64 inflation)
+                form = {
                     "user_id": user_id,
-                    "category": category.lower()
+                    "category": "auto" if category == AUTO_CATEGORY else category.lower()
                 }
 
                 try:
-                    response = requests.post(f"{BACKEND_URL}/parse-receipt", json=payload)
+                    response = backend_client.post(
+                        "/parse-receipt",
+                        files={"image": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type or "image/jpeg")},
+                        data=form
+                    )
                     if response.status_code == 200:
+                        set_data_version(user_id)
                         st.success("🧾 Receipt parsed and transaction added successfully!")
                     else:
                         st.error(f"❌ Error: {response.json().get('error')}")
@@ -250,17 +238,87 @@ def home_page(user_id):
             else:
                 st.warning("📎 Please upload a receipt image first.")
 
+    # ========== Section 3: Import Bank Statement ==========
+    with st.expander("🏦 Import Bank Statement (CSV / OFX)"):
+        statement_file = st.file_uploader("Upload statement", type=["csv", "ofx", "qfx"], key="statement_file")
+        st.caption("Column names are detected automatically. Fill these in only if your bank uses different headers.")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            date_column = st.text_input("Date column", key="statement_date_column")
+        with col2:
+            description_column = st.text_input("Description column", key="statement_description_column")
+        with col3:
+            amount_column = st.text_input("Amount column", key="statement_amount_column")
+        statement_currency = st.selectbox("Statement currency", currency_codes, index=currency_index, key="statement_currency")
+
+        if st.button("📥 Import Statement"):
+            if statement_file is not None:
+                mapping = {
+                    field: column.strip()
+                    for field, column in [("date", date_column), ("description", description_column), ("amount", amount_column)]
+                    if column.strip()
+                }
+                try:
+                    response = backend_client.post(
+                        "/import-statement",
+                        files={"file": (statement_file.name, statement_file, "application/octet-stream")},
+                        data={"user_id": user_id, "column_mapping": json.dumps(mapping), "currency": statement_currency}
+                    )
+                    if response.status_code == 200:
+                        result = response.json()
+                        set_data_version(user_id)
+                        st.success(
+                            f"🎉 Imported {result['inserted']} transactions "
+                            f"({result['duplicates']} already imported, {result['invalid']} unreadable rows skipped)"
+                        )
+                    else:
+                        st.error(f"❌ Error: {response.json().get('error')}")
+                except Exception as e:
+                    st.error(f"⚠️ API call failed: {str(e)}")
+            else:
+                st.warning("📎 Please upload a statement file first.")
+
+    # ========== Section 4: Export Transactions ==========
+    with st.expander("📤 Export Transactions"):
+        col1, col2 = st.columns(2)
+        with col1:
+            export_start = st.date_input("From", value=None, key="export_start")
+        with col2:
+            export_end = st.date_input("To", value=None, key="export_end")
+        names = category_names(user_id)
+        export_categories = st.multiselect("Categories (leave empty for all)", sorted(names, key=names.get), format_func=names.get)
+        export_format = st.radio("Format", ["csv", "parquet"], horizontal=True, format_func=str.upper)
+
+        # Fetched server-side for the signed-in user, so the browser never needs the backend
+        # URL and cannot ask for another user's export
+        params = [("user_id", user_id), ("format", export_format)]
+        if export_start:
+            params.append(("start", export_start.strftime("%Y-%m-%d")))
+        if export_end:
+            # The backend end bound is exclusive; "To" includes its day
+            params.append(("end", (export_end + timedelta(days=1)).strftime("%Y-%m-%d")))
+        params += [("category", cid) for cid in export_categories]
+        # A prepared file only matches the filters it was fetched with
+        if st.session_state.get("export_file", {}).get("params") != params:
+            clear_export()
+        if st.button("📦 Prepare Export"):
+            try:
+                prepare_export(params, f"transactions.{export_format}")
+            except Exception as e:
+                st.error(f"❌ Export failed: {str(e)}")
+        export = st.session_state.get("export_file")
+        if export:
+            with open(export["path"], "rb") as handle:
+                st.download_button("⬇️ Download Export", handle, file_name=export["file_name"], mime=export["mime"])
+
     # ------------------ Transaction History ------------------
     st.subheader("📊 Transaction History")
 
-    transactions = get_transactions(user_id)
+    df = get_transactions_frame(user_id)
     
     auto_add_subscriptions(user_id)
 
-    if transactions:
-        # Convert to DataFrame for formatting
-        df = pd.DataFrame(transactions)
-        df = df.drop(columns=["_id", "user_id"])
+    if not df.empty:
 
         df["transaction_date"] = pd.to_datetime(df["transaction_date"])
         
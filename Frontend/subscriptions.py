@@ -1,39 +1,35 @@
 import streamlit as st
-from pymongo import MongoClient
-from datetime import datetime
-from bson import ObjectId
+from utils.api import api_write
+from utils.cache import get_subscriptions
+from utils.currency import currency_symbol, format_amount
+from utils.instrumentation import timed
 
+@timed()
 def subscription_page(user_id):
     st.title("📅 Subscription Manager")
 
-    # MongoDB connection
-    client = MongoClient(st.secrets["MONGO_URI"])
-    db = client['finance_ai']
-    subscriptions_collection = db['subscriptions']
-
     # Add Subscription
     st.subheader("➕ Add New Subscription")
+    symbol = currency_symbol(user_id)
     name = st.text_input("Subscription Name")
-    cost = st.number_input("Monthly Cost (₹)", min_value=0.0, step=1.0, format="%.2f", key="new_cost")
+    cost = st.number_input(f"Monthly Cost ({symbol})", min_value=0.0, step=1.0, format="%.2f", key="new_cost")
     usage = st.selectbox("Usage Frequency", ["Daily", "Weekly", "Monthly", "Occasionally"], key="new_usage")
     priority = st.selectbox("Priority Level", ["High", "Medium", "Low"], key="new_priority")
 
     if st.button("Add Subscription"):
         new_sub = {
-            "user_id": user_id,
             "name": name,
             "cost": cost,
             "usage": usage,
-            "priority": priority,
-            "created_at": datetime.now()
+            "priority": priority
         }
-        subscriptions_collection.insert_one(new_sub)
+        api_write("POST", user_id, "subscriptions", new_sub)
         st.success(f"Subscription to {name} added!")
         st.rerun()
 
     # View Subscriptions
     st.subheader("📋 Your Subscriptions")
-    subs = list(subscriptions_collection.find({"user_id": user_id}))
+    subs = get_subscriptions(user_id)
 
     if 'edit_id' not in st.session_state:
         st.session_state.edit_id = None
@@ -51,14 +47,11 @@ def subscription_page(user_id):
                     updated_usage = st.selectbox("Usage", ["Daily", "Weekly", "Monthly", "Occasionally"], index=["Daily", "Weekly", "Monthly", "Occasionally"].index(sub['usage']), key=f"usage_{sub_id}")
 
                     if st.button("Save", key=f"save_{sub_id}"):
-                        subscriptions_collection.update_one(
-                            {"_id": ObjectId(sub_id)},
-                            {"$set": {
-                                "cost": updated_cost,
-                                "priority": updated_priority,
-                                "usage": updated_usage
-                            }}
-                        )
+                        api_write("PATCH", user_id, f"subscriptions/{sub_id}", {
+                            "cost": updated_cost,
+                            "priority": updated_priority,
+                            "usage": updated_usage
+                        })
                         st.success(f"{sub['name']} updated.")
                         st.session_state.edit_id = None
                         st.rerun()
@@ -69,7 +62,7 @@ def subscription_page(user_id):
                 else:
                     # Normal view
                     st.markdown(f"**Name:** {sub['name']}")
-                    st.markdown(f"**Cost:** ₹{sub['cost']}")
+                    st.markdown(f"**Cost:** {format_amount(symbol, float(sub['cost']))}")
                     st.markdown(f"**Usage:** {sub['usage']}")
                     st.markdown(f"**Priority:** {sub['priority']}")
                     st.markdown(f"**Created At:** {sub['created_at']}")
@@ -79,12 +72,10 @@ def subscription_page(user_id):
                     st.session_state.edit_id = sub_id
 
                 if st.button("Cancel Subscription", key=f"delete_{sub_id}"):
-                    subscriptions_collection.delete_one({"_id": ObjectId(sub_id)})
+                    api_write("DELETE", user_id, f"subscriptions/{sub_id}")
                     st.warning(f"{sub['name']} subscription cancelled.")
                     if st.session_state.edit_id == sub_id:
                         st.session_state.edit_id = None
                     st.rerun()
     else:
-        st.info("No subscriptions found.")
-
-    client.close()
\ No newline at end of file
+        st.info("No subscriptions found.")
\ No newline at end of file
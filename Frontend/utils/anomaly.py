@@ -0,0 +1,15 @@
+# utils/anomaly.py
+import streamlit as st
+from utils.api import api_get, api_write, get_data_version
+
+# Spending alerts are raised by the backend when transactions are written (AI-backend/anomaly.py)
+
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def _load_alerts(user_id, version, limit, days):
+    return api_get(user_id, "alerts", {"limit": limit, "days": days})
+
+def get_alerts(user_id, limit=5, days=30):
+    return _load_alerts(user_id, get_data_version(user_id), limit, days)
+
+def dismiss_alert(user_id, alert_id):
+    api_write("POST", user_id, f"alerts/{alert_id}/dismiss")
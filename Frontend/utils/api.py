@@ -0,0 +1,92 @@
+# utils/api.py
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+from utils import backend_client
+
+# Last body and ETag per resource URL, revalidated with If-None-Match
+ETAG_MAX_ENTRIES = 256
+# How long a known data version is trusted before it is re-read (picks up writes from other processes)
+VERSION_REFRESH_SECONDS = 60
+
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+_versions = {}
+_versions_lock = threading.Lock()
+
+class APIError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+# ------------------ Requests ------------------
+def resource_path(user_id, resource):
+    return f"/api/users/{quote(str(user_id), safe='')}/{resource}"
+
+def endpoint_name(method, resource):
+    """Metrics label without user or document ids: 'GET /api/users/:id/subscriptions'"""
+    return f"{method} /api/users/:id/{resource.split('/')[0]}"
+
+def check(response):
+    if response.status_code >= 400:
+        try:
+            message = response.json().get("error", response.text)
+        except ValueError:
+            message = response.text
+        raise APIError(message, response.status_code)
+
+def api_get(user_id, resource, params=None):
+    """GET a user resource, reusing the last body when the backend answers 304 Not Modified"""
+    path = resource_path(user_id, resource)
+    params = {key: value for key, value in (params or {}).items() if value is not None}
+    key = (path, tuple(sorted(params.items())))
+    with _responses_lock:
+        cached = _responses.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+
+    response = backend_client.get(path, params=params, headers=headers, endpoint=endpoint_name("GET", resource))
+    if response.status_code == 304 and cached:
+        with _responses_lock:
+            _responses.move_to_end(key)
+        return cached[1]
+    check(response)
+    body = response.json()
+    etag = response.headers.get("ETag")
+    if etag:
+        with _responses_lock:
+            _responses[key] = (etag, body)
+            _responses.move_to_end(key)
+            while len(_responses) > ETAG_MAX_ENTRIES:
+                _responses.popitem(last=False)
+    return body
+
+def api_write(method, user_id, resource, payload=None):
+    """Send a write; the backend answers with the user's new data version"""
+    response = backend_client.request(method, resource_path(user_id, resource), json_body=payload, endpoint=endpoint_name(method, resource))
+    check(response)
+    body = response.json()
+    set_data_version(user_id, body.get("version"))
+    return body
+
+# ------------------ Data Versions ------------------
+def get_data_version(user_id):
+    with _versions_lock:
+        known = _versions.get(user_id)
+    if known and time.monotonic() - known[1] < VERSION_REFRESH_SECONDS:
+        return known[0]
+
+    response = backend_client.get(resource_path(user_id, "version"), endpoint=endpoint_name("GET", "version"))
+    check(response)
+    version = response.json()["version"]
+    with _versions_lock:
+        _versions[user_id] = (version, time.monotonic())
+    return version
+
+def set_data_version(user_id, version=None):
+    """Record the version a write returned, or forget it (None) after a write made elsewhere in the backend"""
+    with _versions_lock:
+        if version is None:
+            _versions.pop(user_id, None)
+        else:
+            _versions[user_id] = (version, time.monotonic())
@@ -0,0 +1,137 @@
+# utils/backend_client.py
+import gzip
+import json
+import threading
+import time
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from utils import instrumentation, tracing
+
+BACKEND_URL = st.secrets["BACKEND_URL"]
+# Sent as a bearer token; the backend's /api/users routes refuse requests without it
+API_SECRET = st.secrets.get("API_SECRET", "")
+POOL_SIZE = 16
+# JSON bodies at least this large are sent gzip-compressed (the backend inflates them)
+GZIP_MIN_BYTES = 1024
+MAX_RETRIES = 2
+BACKOFF_SECONDS = 0.3
+# A Retry-After longer than this is not waited out; the error goes back to the page instead
+MAX_RETRY_AFTER_SECONDS = 5
+RETRY_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+# (connect, read) timeouts in seconds, by path prefix; LLM-backed calls get longer reads
+DEFAULT_TIMEOUT = (3.05, 10)
+TIMEOUTS = {
+    "/chat": (3.05, 90),
+    "/parse-receipt": (3.05, 90),
+    "/generate-budget": (3.05, 60),
+    "/import-statement": (3.05, 120),
+    "/export-transactions": (3.05, 120),
+    "/debt-payoff": (3.05, 15),
+    "/categorize": (3.05, 5),
+    "/categorizer-feedback": (3.05, 5),
+}
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+# ------------------ Session ------------------
+@st.cache_resource
+def get_session():
+    """One keep-alive connection pool to the backend for the whole Streamlit process"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def endpoint_timeout(path):
+    for prefix, timeout in TIMEOUTS.items():
+        if path.startswith(prefix):
+            return timeout
+    return DEFAULT_TIMEOUT
+
+# ------------------ Metrics ------------------
+def record(endpoint, elapsed, status, retried=False):
+    with _metrics_lock:
+        entry = _metrics.setdefault(endpoint, {"calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+        entry["calls"] += 1
+        entry["retries"] += int(retried)
+        entry["errors"] += int(status is None or status >= 500)
+        entry["total_ms"] += elapsed * 1000
+        entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+
+def get_metrics():
+    """Per-endpoint call counts, errors, retries and latency (mean/max ms) since the process started"""
+    with _metrics_lock:
+        return {
+            endpoint: dict(entry, mean_ms=round(entry["total_ms"] / entry["calls"], 1))
+            for endpoint, entry in _metrics.items()
+        }
+
+# ------------------ Requests ------------------
+def request(method, path, json_body=None, data=None, files=None, params=None, headers=None,
+            timeout=None, idempotent=None, endpoint=None, stream=False):
+    """Call the backend through the pooled session.
+
+    Idempotent calls (GET/PUT/DELETE, or idempotent=True) are retried with exponential backoff
+    on connection errors, timeouts and 502/503/504. `endpoint` names the call in the metrics
+    (defaults to the method and path). With `stream` the body is left unread for iter_content;
+    close the response when done.
+    """
+    method = method.upper()
+    endpoint = endpoint or f"{method} {path}"
+    headers = dict(headers or {})
+    if API_SECRET:
+        headers["Authorization"] = f"Bearer {API_SECRET}"
+    if json_body is not None:
+        data = json.dumps(json_body, separators=(",", ":")).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+        if len(data) >= GZIP_MIN_BYTES:
+            data = gzip.compress(data, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    idempotent = method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+    attempts = MAX_RETRIES + 1 if idempotent else 1
+
+    for attempt in range(attempts):
+        last_attempt = attempt + 1 == attempts
+        span = tracing.start_client_span(endpoint, {"http.request.method": method, "url.path": path, "http.request.resend_count": attempt or None})
+        if span is not None:
+            headers["traceparent"] = tracing.traceparent(span)
+        start = time.perf_counter()
+        try:
+            response = get_session().request(
+                method, f"{BACKEND_URL}{path}", data=data, files=files, params=params, headers=headers,
+                timeout=timeout or endpoint_timeout(path), stream=stream
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            record(endpoint, time.perf_counter() - start, None, retried=attempt > 0)
+            instrumentation.record_backend_call(endpoint, time.perf_counter() - start, None)
+            if span is not None:
+                tracing.end_span(span, error=type(e).__name__)
+            if last_attempt:
+                raise
+            delay = BACKOFF_SECONDS * 2 ** attempt
+        else:
+            elapsed = time.perf_counter() - start
+            record(endpoint, elapsed, response.status_code, retried=attempt > 0)
+            instrumentation.record_backend_call(endpoint, elapsed, response.status_code, response.headers.get("Server-Timing"))
+            if span is not None:
+                span["attributes"]["http.response.status_code"] = response.status_code
+                tracing.end_span(span, error=f"HTTP {response.status_code}" if response.status_code >= 500 else None)
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else BACKOFF_SECONDS * 2 ** attempt
+            if delay > MAX_RETRY_AFTER_SECONDS:
+                return response
+            response.close()
+        time.sleep(delay)
+
+def get(path, **kwargs):
+    return request("GET", path, **kwargs)
+
+def post(path, **kwargs):
+    return request("POST", path, **kwargs)
@@ -0,0 +1,142 @@
+# utils/cache.py
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+from utils.api import api_get, get_data_version
+
+# Cached entries are keyed by (user_id, data_version); old versions age out through these limits.
+# A miss revalidates with the backend's ETag, so an unchanged resource costs a 304.
+CACHE_TTL_SECONDS = 3600
+CACHE_MAX_ENTRIES = 128
+FIGURE_MAX_ENTRIES = 64
+FORECAST_TTL_SECONDS = 900
+
+# ------------------ Cached Queries ------------------
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _load_profile(user_id, version):
+    return api_get(user_id, "profile")
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _load_budget(user_id, version):
+    return api_get(user_id, "budget")
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _load_transactions(user_id, version):
+    return pd.DataFrame(api_get(user_id, "transactions"))
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _load_spend_by_category(user_id, version, start_date=None, end_date=None):
+    rows = api_get(user_id, "spend-by-category", {"start": start_date, "end": end_date})
+    return pd.DataFrame(rows, columns=["category_id", "amount"])
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _load_monthly_budgets(user_id, version):
+    return api_get(user_id, "monthly-budgets")
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _load_debts(user_id, version):
+    return api_get(user_id, "debts")
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _load_subscriptions(user_id, version):
+    return api_get(user_id, "subscriptions")
+
+# Forecasts are rewritten by the nightly batch without a version bump, so they also expire on time
+@st.cache_data(ttl=FORECAST_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _load_forecast(user_id, version):
+    return api_get(user_id, "forecast")
+
+def get_profile(user_id):
+    return _load_profile(user_id, get_data_version(user_id))
+
+def get_budget(user_id):
+    return _load_budget(user_id, get_data_version(user_id))
+
+def get_transactions_frame(user_id):
+    return _load_transactions(user_id, get_data_version(user_id))
+
+def get_spend_by_category(user_id, start_date=None, end_date=None):
+    """Debit totals per category id, grouped by the backend (optionally for [start_date, end_date))"""
+    return _load_spend_by_category(user_id, get_data_version(user_id), start_date, end_date)
+
+def get_monthly_budgets(user_id):
+    return _load_monthly_budgets(user_id, get_data_version(user_id))
+
+def get_debts(user_id):
+    return _load_debts(user_id, get_data_version(user_id))
+
+def get_subscriptions(user_id):
+    return _load_subscriptions(user_id, get_data_version(user_id))
+
+def get_forecast(user_id):
+    return _load_forecast(user_id, get_data_version(user_id))
+
+# ------------------ Cached Figures ------------------
+def display_name(category_id):
+    return str(category_id or "uncategorized").replace("_", " ").title()
+
+def catalog_names(profile):
+    return {entry["id"]: entry["name"] for entry in (profile or {}).get("category_catalog", [])}
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=FIGURE_MAX_ENTRIES, show_spinner=False)
+def _build_dashboard(user_id, version):
+    df = _load_transactions(user_id, version)
+    if df.empty:
+        return None
+
+    df = df.copy()
+    df["amount"] = df["amount"].astype(float)
+    df["transaction_date"] = pd.to_datetime(df["transaction_date"])
+
+    income_df = df[df["amount_type"] == "credit"]
+    expense_df = df[df["amount_type"] == "debit"]
+
+    names = catalog_names(_load_profile(user_id, version))
+    spend = _load_spend_by_category(user_id, version)
+    category_expense = (
+        spend.assign(category=spend["category_id"].map(lambda cid: names.get(cid) or display_name(cid)))
+        .groupby("category")["amount"].sum()
+        .sort_values(ascending=False)
+    )
+    category_figure = px.bar(
+        category_expense,
+        x=category_expense.index,
+        y=category_expense.values,
+        labels={"x": "Category", "y": "Total Spent"},
+        title="Expenses by Category",
+        color=category_expense.values,
+        color_continuous_scale="reds"
+    )
+
+    # Group income and expense by date
+    income_by_date = income_df.groupby("transaction_date")["amount"].sum().rename("credit")
+    expense_by_date = expense_df.groupby("transaction_date")["amount"].sum().rename("debit")
+
+    # Merge them on date
+    timeline_df = pd.concat([income_by_date, expense_by_date], axis=1).fillna(0).reset_index()
+
+    # Melt for Plotly
+    timeline_df_melted = timeline_df.melt(
+        id_vars="transaction_date",
+        value_vars=["credit", "debit"],
+        var_name="Transaction Type",
+        value_name="Amount"
+    )
+    timeline_figure = px.line(
+        timeline_df_melted,
+        x="transaction_date",
+        y="Amount",
+        color="Transaction Type",
+        labels={"transaction_date": "Date"},
+        title="📅 Income vs Expenses Over Time"
+    )
+
+    return {
+        "total_income": income_df["amount"].sum(),
+        "total_expense": expense_df["amount"].sum(),
+        "category_figure": category_figure,
+        "timeline_figure": timeline_figure
+    }
+
+def get_dashboard(user_id):
+    return _build_dashboard(user_id, get_data_version(user_id))
@@ -1,32 +1,70 @@
 # utils/categories.py
-from pymongo import MongoClient
-import streamlit as st
-
-MONGO_URI = st.secrets["MONGO_URI"]
-
-client = MongoClient(MONGO_URI)  # or your connection
-db = client["finance_ai"]
-user_profiles_collection = db["user_profiles"]
+import re
+from utils.api import APIError, api_write
+from utils.cache import get_profile
 
+# Kept identical to AI-backend/categories.py
 PREDEFINED_CATEGORIES = [
     "Food", "Travel", "Rent", "Salary", "Shopping",
-    "Healthcare", "Utilities", "Miscellaneous", "Savings"
+    "Healthcare", "Utilities", "Miscellaneous", "Savings", "Subscription"
 ]
 
+BUILTIN_ALIASES = {
+    "groceries": "food",
+    "grocery": "food",
+    "others": "miscellaneous",
+    "other": "miscellaneous",
+    "misc": "miscellaneous",
+    "bills": "utilities",
+    "medical": "healthcare",
+    "subscriptions": "subscription",
+}
+
+# ------------------ Category Catalog ------------------
+def category_id(name):
+    """Stable id for a category name: 'Eating Out ' -> 'eating_out'"""
+    return re.sub(r"[^a-z0-9]+", "_", str(name or "").lower()).strip("_") or "uncategorized"
+
+def catalog_entry(name):
+    return {"id": category_id(name), "name": str(name).strip(), "aliases": []}
+
+def get_catalog(user_id):
+    """{id: entry} for the predefined categories plus everything stored on the user's profile"""
+    catalog = {category_id(name): catalog_entry(name) for name in PREDEFINED_CATEGORIES}
+    profile = get_profile(user_id) or {}
+    for entry in profile.get("category_catalog", []):
+        catalog[entry["id"]] = entry
+    return catalog
+
+def resolve_category_id(catalog, name):
+    """The id the backend's resolve_category_ids gives `name`: a catalog id or alias, else its slug"""
+    key = category_id(name)
+    if key in catalog:
+        return key
+    for entry in catalog.values():
+        if key in entry.get("aliases", []):
+            return entry["id"]
+    return BUILTIN_ALIASES.get(key, key)
+
+def category_names(user_id):
+    return {cid: entry["name"] for cid, entry in get_catalog(user_id).items()}
+
+# ------------------ Tracked Categories ------------------
 def get_user_categories(user_id):
-    profile = user_profiles_collection.find_one({"user_id": user_id})
+    profile = get_profile(user_id)
     return profile.get("custom_categories", []) if profile else []
 
 def add_custom_category(user_id, category):
     if not category:
         return "empty"
-    profile = user_profiles_collection.find_one({"user_id": user_id})
+    profile = get_profile(user_id)
     existing = profile.get("custom_categories", []) if profile else []
-    if category in existing:
+    if category_id(category) in {category_id(name) for name in existing}:
         return "duplicate"
-    user_profiles_collection.update_one(
-        {"user_id": user_id},
-        {"$addToSet": {"custom_categories": category}},
-        upsert=True
-    )
-    return "success"
\ No newline at end of file
+    try:
+        api_write("POST", user_id, "categories", {"name": category})
+    except APIError as e:
+        if e.status_code == 409:
+            return "duplicate"
+        raise
+    return "success"
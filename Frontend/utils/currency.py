@@ -0,0 +1,23 @@
+# utils/currency.py
+from utils.cache import get_profile
+
+# Profiles store the label picked at onboarding ("INR - Indian Rupee"); amounts the backend
+# returns are already converted to that currency, so pages only need its symbol.
+CURRENCY_OPTIONS = ["INR - Indian Rupee", "USD - US Dollar", "EUR - Euro", "GBP - British Pound", "JPY - Japanese Yen"]
+CURRENCY_SYMBOLS = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥"}
+DEFAULT_CURRENCY = "INR"
+
+# ------------------ Currency Codes ------------------
+def currency_code(label):
+    """'INR - Indian Rupee' -> 'INR'"""
+    return str(label or "").split(" - ")[0].strip().upper() or DEFAULT_CURRENCY
+
+def user_currency(user_id):
+    return currency_code((get_profile(user_id) or {}).get("currency"))
+
+def currency_symbol(user_id):
+    code = user_currency(user_id)
+    return CURRENCY_SYMBOLS.get(code, f"{code} ")
+
+def format_amount(symbol, amount, decimals=2):
+    return f"{symbol}{amount:,.{decimals}f}"
@@ -0,0 +1,167 @@
+# utils/instrumentation.py
+import datetime
+import functools
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+import streamlit as st
+from pymongo import monitoring
+
+# Opt-in per-rerun performance stats: time spent in the page and its sections, Mongo commands issued
+# by this process, and backend calls (with the Mongo work the backend reports in Server-Timing).
+# Enable with DEBUG_INSTRUMENTATION = true in secrets.toml or ?debug=1 in the URL.
+
+SERVER_TIMING_ENTRY = re.compile(r'\s*([\w-]+)((?:\s*;\s*\w+=(?:"[^"]*"|[^,;]*))*)')
+SERVER_TIMING_PARAM = re.compile(r'(\w+)=(?:"([^"]*)"|([^,;]*))')
+
+_local = threading.local()
+
+def enabled():
+    return bool(st.secrets.get("DEBUG_INSTRUMENTATION", False)) or st.query_params.get("debug") == "1"
+
+def current():
+    """Stats for the rerun running on this thread (None when instrumentation is off)"""
+    return getattr(_local, "stats", None)
+
+# ------------------ Mongo Commands ------------------
+class CommandTimer(monitoring.CommandListener):
+    """Counts and times every command issued from the thread running an instrumented rerun"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.record(event)
+
+    def failed(self, event):
+        self.record(event)
+
+    @staticmethod
+    def record(event):
+        stats = current()
+        if stats is None:
+            return
+        mongo = stats["mongo"]
+        mongo["count"] += 1
+        mongo["ms"] += event.duration_micros / 1000
+        mongo["commands"][event.command_name] = mongo["commands"].get(event.command_name, 0) + 1
+
+command_timer = CommandTimer()
+
+# ------------------ Backend Calls ------------------
+def parse_server_timing(header):
+    """{name: {"dur": ms, "desc": text}} from a Server-Timing header"""
+    metrics = {}
+    for entry in (header or "").split(","):
+        match = SERVER_TIMING_ENTRY.match(entry)
+        if not match:
+            continue
+        params = {key: quoted if quoted else plain.strip() for key, quoted, plain in SERVER_TIMING_PARAM.findall(match.group(2))}
+        metrics[match.group(1)] = params
+    return metrics
+
+def record_backend_call(endpoint, elapsed, status, server_timing=None):
+    stats = current()
+    if stats is None:
+        return
+    db = parse_server_timing(server_timing).get("db", {})
+    count = re.match(r"\d+", db.get("desc", ""))
+    db_commands = int(count.group()) if count else 0
+    backend = stats["backend"]
+    entry = backend["by_endpoint"].setdefault(endpoint, {"calls": 0, "ms": 0.0, "db_commands": 0, "db_ms": 0.0, "statuses": []})
+    for target in (backend, entry):
+        target["calls"] += 1
+        target["ms"] += elapsed * 1000
+        target["db_commands"] += db_commands
+        target["db_ms"] += float(db.get("dur") or 0)
+    entry["statuses"].append(status)
+
+# ------------------ Page and Section Timers ------------------
+@contextmanager
+def section(name):
+    stats = current()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats["sections"][name] = stats["sections"].get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+def timed(name=None):
+    """Decorator timing a page function or section helper as a named section"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with section(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def rerun(page):
+    """Collect stats for one script run; shows the debug panel and logs one JSON line at the end"""
+    if not enabled():
+        yield
+        return
+    _local.stats = {
+        "page": page,
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "sections": {},
+        "mongo": {"count": 0, "ms": 0.0, "commands": {}},
+        "backend": {"calls": 0, "ms": 0.0, "db_commands": 0, "db_ms": 0.0, "by_endpoint": {}},
+    }
+    start = time.perf_counter()
+    completed = False
+    try:
+        yield
+        completed = True
+    finally:
+        stats = _local.stats
+        _local.stats = None
+        stats["total_ms"] = (time.perf_counter() - start) * 1000
+        # st.rerun()/st.stop() end a run early by raising; the stats are still logged
+        stats["completed"] = completed
+        log_rerun(stats)
+        if completed:
+            render_panel(stats)
+
+# ------------------ Output ------------------
+def log_rerun(stats):
+    line = json.dumps(stats, default=str)
+    path = st.secrets.get("INSTRUMENTATION_LOG")
+    if path:
+        with open(path, "a", encoding="utf-8") as log:
+            log.write(line + "\n")
+    else:
+        print(line)
+
+def render_panel(stats):
+    with st.sidebar.expander("🛠️ Performance (this run)", expanded=False):
+        st.metric("Render time", f"{stats['total_ms']:.0f} ms")
+        backend = stats["backend"]
+        st.caption(
+            f"Backend: {backend['calls']} calls, {backend['ms']:.0f} ms, "
+            f"{backend['db_commands']} Mongo commands ({backend['db_ms']:.0f} ms)"
+        )
+        st.caption(f"Local Mongo: {stats['mongo']['count']} commands, {stats['mongo']['ms']:.0f} ms")
+        if stats["sections"]:
+            st.markdown("**Sections (ms)**")
+            st.dataframe(
+                [{"section": name, "ms": round(ms, 1)} for name, ms in sorted(stats["sections"].items(), key=lambda item: -item[1])],
+                hide_index=True, use_container_width=True
+            )
+        if backend["by_endpoint"]:
+            st.markdown("**Backend calls**")
+            st.dataframe(
+                [
+                    {"endpoint": endpoint, "calls": entry["calls"], "ms": round(entry["ms"], 1),
+                     "db commands": entry["db_commands"], "db ms": round(entry["db_ms"], 1)}
+                    for endpoint, entry in backend["by_endpoint"].items()
+                ],
+                hide_index=True, use_container_width=True
+            )
+        st.json(stats, expanded=False)
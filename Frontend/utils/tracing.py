@@ -0,0 +1,131 @@
+# utils/tracing.py
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import requests
+import streamlit as st
+
+# Each rerun is a trace: a root span for the page plus a client span per backend call, whose
+# `traceparent` header makes the backend's route, Mongo and LLM spans children of it. Spans are
+# exported at the end of the rerun in the same OTLP/JSON format as AI-backend/tracing.py.
+# Configure with TRACE_EXPORT ("file" or "otlp"), TRACE_FILE, TRACE_OTLP_ENDPOINT and
+# TRACE_SAMPLE_RATE in secrets.toml; the trace id is propagated even when nothing is exported.
+
+SERVICE_NAME = "finance-ai-frontend"
+KIND_INTERNAL, KIND_CLIENT = 1, 3
+STATUS_ERROR = 2
+
+_local = threading.local()
+
+def setting(name, default):
+    return st.secrets.get(name, default)
+
+def current():
+    """(trace, root span) for the rerun running on this thread, or None"""
+    return getattr(_local, "trace", None)
+
+def new_span(trace_id, parent_id, name, kind, attributes=None):
+    return {
+        "traceId": trace_id,
+        "spanId": os.urandom(8).hex(),
+        "parentSpanId": parent_id,
+        "name": name,
+        "kind": kind,
+        "start": time.time_ns(),
+        "attributes": dict(attributes or {}),
+    }
+
+def end_span(span, error=None):
+    span["end"] = time.time_ns()
+    if error:
+        span["status"] = {"code": STATUS_ERROR, "message": error}
+
+# ------------------ Reruns ------------------
+@contextmanager
+def trace(name, **attributes):
+    """Trace one script run of a page."""
+    trace_id = os.urandom(16).hex()
+    sampled = random.random() < float(setting("TRACE_SAMPLE_RATE", 1.0))
+    root = new_span(trace_id, None, name, KIND_INTERNAL, attributes)
+    _local.trace = {"trace_id": trace_id, "sampled": sampled, "root": root, "spans": [root]}
+    try:
+        yield
+    except Exception as e:
+        # st.rerun()/st.stop() also raise; only real errors mark the span as failed
+        if not type(e).__name__.endswith(("RerunException", "StopException")):
+            root["status"] = {"code": STATUS_ERROR, "message": str(e)}
+        raise
+    finally:
+        active = _local.trace
+        _local.trace = None
+        end_span(root, root.get("status", {}).get("message"))
+        if active["sampled"] and setting("TRACE_EXPORT", ""):
+            export(active["spans"])
+
+# ------------------ Backend Calls ------------------
+def start_client_span(name, attributes=None):
+    """A child span of the rerun for one backend call (None outside a traced rerun)"""
+    active = current()
+    if active is None:
+        return None
+    span = new_span(active["trace_id"], active["root"]["spanId"], name, KIND_CLIENT, attributes)
+    active["spans"].append(span)
+    return span
+
+def traceparent(span):
+    flags = "01" if current()["sampled"] else "00"
+    return f"00-{span['traceId']}-{span['spanId']}-{flags}"
+
+# ------------------ Export ------------------
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_request(spans):
+    encoded = []
+    for span in spans:
+        item = {
+            "traceId": span["traceId"],
+            "spanId": span["spanId"],
+            "name": span["name"],
+            "kind": span["kind"],
+            "startTimeUnixNano": str(span["start"]),
+            "endTimeUnixNano": str(span.get("end") or time.time_ns()),
+            "attributes": [{"key": key, "value": otlp_value(value)} for key, value in span["attributes"].items() if value is not None],
+        }
+        if span["parentSpanId"]:
+            item["parentSpanId"] = span["parentSpanId"]
+        if "status" in span:
+            item["status"] = span["status"]
+        encoded.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "finance-ai"}, "spans": encoded}]
+    }]}
+
+def export(spans):
+    body = json.dumps(otlp_request(spans), separators=(",", ":"))
+    if setting("TRACE_EXPORT", "") == "otlp":
+        endpoint = setting("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        # Posted off the script thread so a slow collector never delays the page
+        threading.Thread(target=post_spans, args=(endpoint, body), daemon=True).start()
+    else:
+        try:
+            with open(setting("TRACE_FILE", "traces.jsonl"), "a", encoding="utf-8") as out:
+                out.write(body + "\n")
+        except OSError as e:
+            print(f"Error exporting spans: {e}")
+
+def post_spans(endpoint, body):
+    try:
+        requests.post(endpoint, data=body, headers={"Content-Type": "application/json"}, timeout=5).raise_for_status()
+    except requests.RequestException as e:
+        print(f"Error exporting spans: {e}")